@@ -1,12 +1,24 @@
+import os
 import streamlit as st
 import folium
-from streamlit_folium import folium_static
-import json
+from streamlit_folium import folium_static, st_folium
 import pandas as pd
-from folium.plugins import MarkerCluster
-import numpy as np
-import unicodedata
-import altair as alt
+import streamlit.components.v1 as components
+from station_map import COVERAGE_CAP_KM, coverage_layer, create_base_map, create_map, create_route_map, render_map_html, viewport_layer
+from clustering import GridClusterIndex, bounds_for_view, parse_leaflet_bounds
+from spatial_index import RouteSegmentIndex, StationSpatialIndex, nearest_stations, stations_along_route, stations_within
+from station_data import CHARGING_POINTS_OPTIONS, POWER_PER_POINT_CATEGORIES, POWER_RANGES, current_dataset_version, dataset_file, load_connectors, load_stations
+from connectors import CONNECTOR_OPTIONS
+from route_files import ROUTE_FILE_TYPES, read_route
+from station_db import DB_FILE, StationDatabase, database_version
+from filter_index import StationFilterIndex
+from analytics_cube import StationCube
+from coverage import CoverageGrid
+from chart_specs import detailed_chart_specs
+from map_cache import MapHtmlCache
+import instrumentation
+import refresh_scheduler
+import shared_data
 
 # Page configuration
 st.set_page_config(
@@ -133,6 +145,10 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# The Diagnostics page is only listed when the instrumentation is on (EV_MAP_DIAGNOSTICS)
+if not instrumentation.ENABLED:
+    st.markdown(instrumentation.HIDE_DIAGNOSTICS_LINK_CSS, unsafe_allow_html=True)
+
 # Custom color scheme (adjusted for dark mode popups / specific elements)
 COLORS = {
     'black': '#FFFFFF', # White text for popups
@@ -143,101 +159,25 @@ COLORS = {
 # Application title
 st.title("🔌 EV Charging Stations Map - Portugal")
 
-# Function to normalize city names
-def normalize_city_name(city):
-    if pd.isna(city):
-        return 'Not specified'
-    
-    # Dictionary of known variations
-    city_variations = {
-        'lisbon': 'Lisboa',
-        'ponte lima': 'Ponte de Lima',
-        'vila real sto antonio': 'Vila Real de Santo António',
-        'vr sto antonio': 'Vila Real de Santo António',
-        'vrsa': 'Vila Real de Santo António',
-        'vfxira': 'Vila Franca de Xira',
-        'vila franca xira': 'Vila Franca de Xira',
-        'povo': 'Póvoa de Varzim',
-        'povoa varzim': 'Póvoa de Varzim',
-        'pdv': 'Póvoa de Varzim',
-        'vngaia': 'Vila Nova de Gaia',
-        'vn gaia': 'Vila Nova de Gaia',
-        'gaia': 'Vila Nova de Gaia',
-    }
-    
-    # Convert to string, normalize accents and convert to lowercase
-    normalized = str(city).lower()
-    normalized = ''.join(c for c in unicodedata.normalize('NFD', normalized)
-                        if unicodedata.category(c) != 'Mn')
-    
-    # Check if the normalized name is in our variations dictionary
-    for variant, correct_name in city_variations.items():
-        if variant in normalized:
-            return correct_name
-    
-    # If not in variations, capitalize each word
-    return ' '.join(word.capitalize() for word in normalized.split())
-
-# Function to get power range label
-def get_power_range(power):
-    if power <= 50:
-        return '0-50'
-    elif power <= 100:
-        return '51-100'
-    else:
-        return '100+'
-
-# Function to get charging points label
-def get_charging_points_label(points):
-    if points == 1:
-        return '1 point'
-    elif points == 2:
-        return '2 points'
-    elif points <= 4:
-        return '3-4 points'
-    else:
-        return '5+ points'
-
-# Function to get power per point category
-def get_power_per_point_category(power_per_point):
-    if pd.isna(power_per_point) or power_per_point == np.inf:
-        return 'N/A'
-    elif power_per_point < 7:
-        return '< 7 kW'
-    elif power_per_point <= 22:
-        return '7-22 kW (AC Normal/Fast)'
-    elif power_per_point <= 50:
-        return '23-50 kW (DC Fast)'
-    else:
-        return '> 50 kW (DC Ultra-Fast)'
+# Dataset versions whose tables and indexes stay cached: the current one and the previous
+# one, still used by sessions that started their rerun before a refresh swapped versions
+DATASET_VERSIONS_CACHED = 2
 
-# Function to load data
-@st.cache_data
-def load_data():
+# Cache for the station tables: shared read-only by all sessions of the process in
+# shared-dataset mode (the default, see shared_data.py), otherwise a pickled copy per call
+def dataset_cache(**kwargs):
+    return st.cache_resource(**kwargs) if shared_data.ENABLED else st.cache_data(**kwargs)
+
+# Function to load data (data_version only keys the cache, so a rewritten file is reloaded)
+@instrumentation.track_cache('load_data', dataset_cache(max_entries=DATASET_VERSIONS_CACHED))
+def load_data(data_version=None):
     try:
         # Determine the correct path relative to the script location or workspace root
         # Assuming the script runs from the workspace root and data is in 'data/'
-        data_file_path = 'data/postos_carregamento.json'
-        with open(data_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Convert to DataFrame early to calculate Power per Point
-        df = pd.DataFrame(data)
-        
-        # Data Cleaning: Ensure numeric types where necessary
-        numeric_cols = ['Número de Pontos', 'Potência Total (kW)', 'Latitude', 'Longitude']
-        for col in numeric_cols:
-             if col in df.columns:
-                 df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # Calculate Power per Point, handle division by zero and NaN in Number of Points
-        df['Potência por Ponto (kW)'] = (df['Potência Total (kW)'] / df['Número de Pontos']).replace([np.inf, -np.inf], np.nan)
-        df.dropna(subset=['Latitude', 'Longitude'], inplace=True) # Drop rows with invalid coordinates
-
-        # Fill NaN operators with 'Unknown' for charting
-        df['Operador'] = df['Operador'].fillna('Unknown')
-
-        return df
+        # (the folder of the published version when the refresh scheduler has published one)
+        data_file_path = dataset_file(data_version)
+        # Cleaning, city normalization and bucket columns all happen here, once per dataset version
+        return shared_data.freeze_frame(load_stations(data_file_path))
     
     except FileNotFoundError:
         st.error(f"File '{data_file_path}' not found! Please ensure it's in the 'data' subfolder.")
@@ -246,105 +186,236 @@ def load_data():
         st.error(f"Error loading or processing data: {e}")
         return None
 
-# Function to create map
-def create_map(df, center_lat=39.5, center_lon=-8.0, zoom=7):
-    portugal_bounds = [
-        [36.8, -9.5],  # Southwest corner
-        [42.2, -6.1]   # Northeast corner
-    ]
-    m = folium.Map(
-        location=[center_lat, center_lon],
-        zoom_start=zoom,
-        tiles="OpenStreetMap"
-    )
-    m.fit_bounds(portugal_bounds)
-    
-    marker_cluster = MarkerCluster(
-        name='Stations',
-        icon_create_function="""
-        function(cluster) {
-            return L.divIcon({
-                html: '<div style="background-color: #00C0F3; color: black; width: 30px; height: 30px; border-radius: 15px; display: flex; align-items: center; justify-content: center; border: 2px solid white;">' + cluster.getChildCount() + '</div>',
-                className: 'marker-cluster-custom',
-                iconSize: L.point(30, 30)
-            });
-        }
-        """
-    ).add_to(m)
-    
-    for idx, station in df.iterrows():
-        # Check again for NaN just before creating marker
-        if pd.notna(station['Latitude']) and pd.notna(station['Longitude']):
-            power_per_point_str = f"{station['Potência por Ponto (kW)']:.2f}" if pd.notna(station['Potência por Ponto (kW)']) else 'N/A'
-            num_points_str = f"{int(station['Número de Pontos'])}" if pd.notna(station['Número de Pontos']) else 'N/A'
-            total_power_str = f"{station['Potência Total (kW)']}" if pd.notna(station['Potência Total (kW)']) else 'N/A'
-            html = f"""
-                <div>
-                    <h4>{station['Nome']}</h4>
-                    <b>Operator:</b> {station['Operador'] or 'Not available'}<br>
-                    <b>Address:</b> {station['Endereço'] or 'Not available'}<br>
-                    <b>City:</b> {station['Cidade']}<br>
-                    <b>Postal Code:</b> {station['Código Postal'] or 'Not available'}<br>
-                    <b>Latitude:</b> {station['Latitude']:.5f}<br>
-                    <b>Longitude:</b> {station['Longitude']:.5f}<br>
-                    <b>Number of Charging Points:</b> {num_points_str}<br>
-                    <b>Total Power:</b> {total_power_str} kW<br>
-                    <b>Power per Point:</b> {power_per_point_str} kW<br> 
-                    <b>Last Update:</b> {station['Data Atualização']}<br>
-                </div>
-            """
-            folium.Marker(
-                location=[station['Latitude'], station['Longitude']],
-                popup=folium.Popup(html, max_width=350),
-                icon=folium.Icon(color='blue', icon_color='#00C0F3', icon='plug', prefix='fa'),
-                tooltip=station['Nome']
-            ).add_to(marker_cluster)
-            
-    return m
+# Rendered map HTML shared by all sessions of this server process
+@st.cache_resource
+def get_map_cache():
+    return MapHtmlCache()
+
+# Bitmap filter index and per-cell partial sums, built once per dataset version
+@instrumentation.track_cache('filter_index', st.cache_resource(max_entries=DATASET_VERSIONS_CACHED))
+def get_filter_index(data_version):
+    return StationFilterIndex(load_data(data_version))
+
+# Read-only connection pool to the SQLite store, shared by all sessions
+@st.cache_resource
+def get_station_db():
+    return StationDatabase(DB_FILE)
+
+# Function to list the cities in the SQLite store
+@instrumentation.track_cache('db_cities', st.cache_data)
+def load_db_cities(data_version):
+    return get_station_db().cities()
+
+# Function to read only the stations matching the filters from the SQLite store
+@instrumentation.track_cache('db_stations', dataset_cache(max_entries=32))
+def load_db_stations(data_version, city, power_ranges, charging_points, connectors):
+    return shared_data.freeze_frame(get_station_db().stations(city, power_ranges, charging_points, connectors))
+
+# Pre-aggregated counts and sums answering every metric and chart, built once per dataset
+# version (aggregated by SQLite when reading from the database)
+@instrumentation.track_cache('cube', st.cache_resource(max_entries=DATASET_VERSIONS_CACHED))
+def get_cube(data_version, from_db):
+    if from_db:
+        return StationCube(get_station_db().cube_cells())
+    return StationCube.from_frame(load_data(data_version))
+
+# Function to build the Detailed Charts' Vega-Lite specs for a filter combination (memoized)
+@instrumentation.track_cache('chart_specs', st.cache_data(max_entries=64))
+def get_chart_specs(data_version, from_db, filter_key):
+    return detailed_chart_specs(get_cube(data_version, from_db), filter_key, COLORS['blue'])
+
+# Per-connector table (type, current, power, quantity of every connector), built once per
+# dataset version, for per-station aggregates such as the max DC power
+@instrumentation.track_cache('connectors', st.cache_resource(max_entries=DATASET_VERSIONS_CACHED))
+def get_connector_table(data_version, from_db):
+    if from_db:
+        return get_station_db().connector_table()
+    return load_connectors(dataset_file(data_version))
+
+# Server-side cluster hierarchy per filter combination (the most recent ones are kept);
+# _stations is the already filtered table and is not hashed
+@instrumentation.track_cache('cluster_index', st.cache_resource(max_entries=16))
+def get_cluster_index(data_version, city, power_ranges, charging_points, connectors, _stations):
+    return GridClusterIndex(_stations['Latitude'], _stations['Longitude'])
+
+# Spatial grid index over all stations, built once per dataset version
+@instrumentation.track_cache('spatial_index', st.cache_resource(max_entries=DATASET_VERSIONS_CACHED))
+def get_spatial_index(data_version):
+    return StationSpatialIndex.from_frame(load_data(data_version))
+
+# Distance from every land cell of a hexagonal grid over the mainland to the nearest station and
+# the nearest fast station (the charging gaps layer), computed once per dataset version
+@instrumentation.track_cache('coverage', st.cache_resource(max_entries=DATASET_VERSIONS_CACHED))
+def get_coverage(data_version, from_db):
+    return CoverageGrid.from_frame(get_station_db().stations() if from_db else load_data(data_version))
+
+# Function to read an uploaded route file and index its segments by the grid cells within
+# width_km of them (the most recent routes and widths are kept)
+@instrumentation.track_cache('route_index', st.cache_resource(max_entries=16))
+def get_route_index(route_bytes, file_name, width_km):
+    lats, lons = read_route(route_bytes, file_name)
+    return RouteSegmentIndex(lats, lons, width_km)
+
+# Function to build the caches of a new dataset version before the refresh scheduler publishes
+# it (runs in the scheduler's thread), so the first rerun after the swap does not stall
+def warm_caches(version):
+    if os.path.exists(DB_FILE):
+        db_version = database_version(DB_FILE)
+        load_db_cities(db_version)
+        get_cube(db_version, True)
+        get_coverage(db_version, True)
+    else:
+        load_data(version)
+        get_filter_index(version)
+        get_cube(version, False)
+        get_coverage(version, False)
+
+# Background refresh every EV_MAP_REFRESH_HOURS hours (off unless set): download, new dataset
+# version, SQLite load, cache warm-up, then the version pointer swap; one per server process
+@st.cache_resource
+def get_refresh_scheduler():
+    interval = refresh_scheduler.interval_from_env()
+    if interval is None:
+        return None
+    db_file = DB_FILE if os.path.exists(DB_FILE) else None
+    return refresh_scheduler.RefreshScheduler(interval, db_file=db_file, warm=warm_caches).start()
+
+# Function to show the viewport-driven map: only the clusters/stations inside the
+# current view are sent, and the layer is replaced as the user pans or zooms
+def show_viewport_map(filtered_df, cluster_index, center_lat, center_lon, zoom, state_key, coverage=None,
+                      coverage_fast=False):
+    view = st.session_state.get(state_key) or {}
+    bounds = parse_leaflet_bounds(view.get('bounds')) or bounds_for_view(center_lat, center_lon, zoom)
+    view_zoom = view.get('zoom') or zoom
+    with instrumentation.stage('cluster_query'):
+        clusters, rows = cluster_index.query(bounds, view_zoom)
+    instrumentation.gauge('map_markers', len(clusters) + len(rows), mode='viewport')
+    instrumentation.count('markers_emitted', len(clusters) + len(rows), mode='viewport')
+    m = create_base_map(center_lat, center_lon, zoom, fit_portugal=False)
+    if coverage is not None:
+        coverage_layer(coverage, coverage_fast).add_to(m)
+    with instrumentation.stage('st_folium'):
+        st_folium(
+            m,
+            key=state_key,
+            feature_group_to_add=viewport_layer(filtered_df, clusters, rows),
+            height=700,
+            use_container_width=True,
+            returned_objects=['bounds', 'zoom']
+        )
+
+# Function to build and render the full map (on a map cache miss), timing both steps
+def render_full_map(filtered_df, center_lat, center_lon, zoom, coverage=None, coverage_fast=False):
+    with instrumentation.stage('create_map'):
+        m = create_map(filtered_df, center_lat, center_lon, zoom, coverage=coverage, coverage_fast=coverage_fast)
+    instrumentation.count('markers_emitted', len(filtered_df), mode='all')
+    with instrumentation.stage('render_map_html'):
+        return render_map_html(m)
 
 # --- Main Application Flow ---
 
-df = load_data()
+# Opt-in timers and counters, shown on the Diagnostics page (and served as Prometheus
+# text when EV_MAP_METRICS_PORT is set)
+instrumentation.start_metrics_server()
+instrumentation.register_collector('map_cache', get_map_cache().stats)
+scheduler = get_refresh_scheduler()
+if scheduler is not None:
+    instrumentation.register_collector('refresh', scheduler.stats)
+instrumentation.count('script_runs')
 
-if df is not None and not df.empty:
-    
-    # --- Data Preprocessing --- 
-    df['Cidade'] = df['Cidade'].apply(normalize_city_name)
-    df['Power Range'] = df['Potência Total (kW)'].apply(get_power_range)
-    df['Charging Points Category'] = df['Número de Pontos'].apply(get_charging_points_label)
-    df['Power per Point Category'] = df['Potência por Ponto (kW)'].apply(get_power_per_point_category)
+# Use the indexed SQLite store built by create_db.py when present: filters run as SQL
+# and only the matching stations are read. Otherwise the JSON file is loaded whole.
+use_db = os.path.exists(DB_FILE)
+if use_db:
+    data_version = database_version(DB_FILE)
+    unique_cities = load_db_cities(data_version)
+    has_data = bool(get_cube(data_version, use_db).stats()['total_stations'])
+else:
+    # Published version (swapped atomically by the refresh scheduler) or the plain data file
+    data_version = current_dataset_version()
+    df = load_data(data_version)
+    has_data = df is not None and not df.empty
+    if has_data:
+        unique_cities = sorted(df['Cidade'].unique())
+
+if has_data:
     
     # --- Sidebar Filters --- 
     st.sidebar.header("Filters")
-    unique_cities = sorted([city for city in df['Cidade'].unique() if city != 'Not specified'])
+    unique_cities = [city for city in unique_cities if city != 'Not specified']
     selected_city = st.sidebar.selectbox(
         "Select a city:",
         options=['All'] + unique_cities,
         key='city_selector'
     )
     
-    power_ranges = ['0-50', '51-100', '100+']
+    power_ranges = POWER_RANGES
     selected_power_ranges = st.sidebar.multiselect(
         "Select Total Power ranges (kW):",
         options=power_ranges,
         default=power_ranges
     )
     
-    charging_points_options = ['1 point', '2 points', '3-4 points', '5+ points']
+    charging_points_options = CHARGING_POINTS_OPTIONS
     selected_charging_points = st.sidebar.multiselect(
         "Select number of points:",
         options=charging_points_options,
         default=charging_points_options
     )
+
+    selected_connectors = st.sidebar.multiselect(
+        "Has a connector:",
+        options=CONNECTOR_OPTIONS,
+        help="Only stations with at least one connector of any of the selected kinds (no selection: all stations)."
+    )
+
+    viewport_mode = 'Viewport (server clustering)'
+    map_mode = st.sidebar.radio(
+        "Map loading:",
+        options=['All stations', viewport_mode],
+        help="Viewport mode clusters stations on the server and only sends what is visible; more is fetched as you pan or zoom."
+    )
+
+    gaps_options = ['Off', 'Any station', 'Fast station (≥ 50 kW)']
+    gaps_layer = st.sidebar.selectbox(
+        "Charging gaps layer:",
+        options=gaps_options,
+        help=f"Heatmap of the distance from each ~10 km² cell of the mainland to the nearest station (of any kind, "
+             f"or fast only), over all stations; full intensity from {COVERAGE_CAP_KM} km."
+    )
+    coverage_fast = gaps_layer == gaps_options[2]
+    coverage = None
+    if gaps_layer != 'Off':
+        with instrumentation.stage('coverage'):
+            coverage = get_coverage(data_version, use_db)
+        st.sidebar.caption(f"{coverage.share_beyond(10, coverage_fast):.0%} of the mainland is more than 10 km "
+                           f"from the nearest {'fast ' if coverage_fast else ''}station.")
+
+    if scheduler is not None:
+        # Refreshed data shows up on the next rerun after a refresh publishes it
+        if scheduler.last_error:
+            st.sidebar.caption(f"Last data refresh failed ({scheduler.last_error}); showing the previous data.")
+        elif scheduler.last_success is not None:
+            refreshed = pd.Timestamp(scheduler.last_success, unit='s', tz='UTC').strftime('%Y-%m-%d %H:%M UTC')
+            st.sidebar.caption(f"Data refreshed every {scheduler.interval_seconds / 3600:g} h, last at {refreshed}.")
     
     # --- Apply Filters --- 
-    filtered_df = df.copy()
-    if selected_city != 'All':
-        filtered_df = filtered_df[filtered_df['Cidade'] == selected_city]
-    if selected_power_ranges:
-        filtered_df = filtered_df[filtered_df['Power Range'].isin(selected_power_ranges)]
-    if selected_charging_points:
-        filtered_df = filtered_df[filtered_df['Charging Points Category'].isin(selected_charging_points)]
+    filter_key = (selected_city, tuple(sorted(selected_power_ranges)), tuple(sorted(selected_charging_points)),
+                  tuple(sorted(selected_connectors)))
+    with instrumentation.stage('filter'):
+        if use_db:
+            filtered_df = load_db_stations(data_version, *filter_key)
+        else:
+            # Bitmap intersection from the prebuilt index; only the selected rows are materialized
+            # (as this session's own copy; with no filter it is the shared table itself)
+            filter_index = get_filter_index(data_version)
+            mask = filter_index.mask(selected_city, selected_power_ranges, selected_charging_points, selected_connectors)
+            filtered_df = df if mask.all() else df[mask]
+    instrumentation.gauge('filtered_rows', len(filtered_df))
+    # Metrics and charts are summed from the cube's cells instead of re-scanning filtered_df
+    cube = get_cube(data_version, use_db)
+    with instrumentation.stage('stats'):
+        stats = cube.stats(*filter_key)
 
     # --- Main Layout: Top Section (Stats + Map) --- 
     col1, col2 = st.columns([1, 2]) 
@@ -358,11 +429,11 @@ if df is not None and not df.empty:
             else:
                 st.write("_Showing overall stats for Portugal_")
             
-            total_stations = len(filtered_df)
-            total_points = int(filtered_df['Número de Pontos'].sum())
-            total_power = filtered_df['Potência Total (kW)'].sum()
-            avg_power_station = filtered_df['Potência Total (kW)'].mean()
-            avg_power_point = filtered_df['Potência por Ponto (kW)'].mean()
+            total_stations = stats['total_stations']
+            total_points = stats['total_points']
+            total_power = stats['total_power']
+            avg_power_station = stats['avg_power_station']
+            avg_power_point = stats['avg_power_point']
             
             # Add icons (emojis) to labels
             st.metric(label="📍 Total Stations", value=f"{total_stations:,}")
@@ -387,94 +458,155 @@ if df is not None and not df.empty:
                 center_lon = -8.0
                 zoom = 7
             
-            m = create_map(filtered_df, center_lat, center_lon, zoom)
-            folium_static(m, width=None, height=700) # Increased map height
+            if map_mode == viewport_mode:
+                cluster_index = get_cluster_index(data_version, *filter_key, filtered_df)
+                show_viewport_map(filtered_df, cluster_index, center_lat, center_lon, zoom,
+                                  state_key=f"viewport_map_{selected_city}", coverage=coverage,
+                                  coverage_fast=coverage_fast)
+            else:
+                map_key = MapHtmlCache.make_key(selected_city, selected_power_ranges, selected_charging_points, data_version,
+                                                selected_connectors, gaps_layer)
+                map_html = get_map_cache().get_or_render(
+                    map_key,
+                    lambda: render_full_map(filtered_df, center_lat, center_lon, zoom, coverage, coverage_fast)
+                )
+                instrumentation.gauge('map_markers', len(filtered_df), mode='all')
+                instrumentation.gauge('map_html_bytes', len(map_html))
+                instrumentation.count('html_bytes_sent', len(map_html))
+                with instrumentation.stage('map_component'):
+                    components.html(map_html, height=710) # Increased map height
         else:
             # Display empty map centered on Portugal if no results
             m = folium.Map(location=[39.5, -8.0], zoom_start=7, tiles="OpenStreetMap")
-            folium_static(m, width=None, height=700)
+            with instrumentation.stage('folium_static'):
+                folium_static(m, width=None, height=700)
+
+
+    # --- Nearest Chargers (spatial queries over all stations) --- 
+    st.write("--- ") # Separator
+    st.subheader("Nearest Chargers")
+    near_col1, near_col2, near_col3, near_col4 = st.columns(4)
+    with near_col1:
+        query_lat = st.number_input("Latitude:", min_value=-90.0, max_value=90.0, value=38.72230, format="%.5f")
+    with near_col2:
+        query_lon = st.number_input("Longitude:", min_value=-180.0, max_value=180.0, value=-9.13930, format="%.5f")
+    with near_col3:
+        search_mode = st.radio("Search:", options=['Nearest', 'Within radius'], horizontal=True)
+        if search_mode == 'Nearest':
+            query_k = st.slider("Number of stations:", min_value=1, max_value=50, value=5)
+        else:
+            query_radius = st.slider("Radius (km):", min_value=1, max_value=100, value=10)
+    with near_col4:
+        query_categories = st.multiselect("Power per point:", options=POWER_PER_POINT_CATEGORIES)
 
+    with instrumentation.stage('nearest'):
+        if use_db:
+            # Bounding-box queries on the latitude index, exact distances computed here
+            if search_mode == 'Nearest':
+                nearby = get_station_db().nearest(query_lat, query_lon, query_k, query_categories)
+            else:
+                nearby = get_station_db().within(query_lat, query_lon, query_radius, query_categories)
+        else:
+            spatial_index = get_spatial_index(data_version)
+            if search_mode == 'Nearest':
+                nearby = nearest_stations(df, spatial_index, query_lat, query_lon, query_k, query_categories)
+            else:
+                nearby = stations_within(df, spatial_index, query_lat, query_lon, query_radius, query_categories)
+    if not nearby.empty:
+        # Per-connector detail: the most powerful DC connector of each station
+        nearby = nearby.assign(**{'Max DC (kW)': get_connector_table(data_version, use_db).max_power(
+            nearby['ID'], current='DC')})
+        st.dataframe(
+            nearby[['Distance (km)', 'Nome', 'Operador', 'Cidade', 'Endereço', 'Número de Pontos',
+                    'Potência Total (kW)', 'Max DC (kW)', 'Power per Point Category', 'Latitude', 'Longitude']],
+            hide_index=True,
+            use_container_width=True
+        )
+    else:
+        st.write("_No stations found_")
+
+    # --- Route Corridor (stations along an uploaded route) --- 
+    st.write("--- ") # Separator
+    st.subheader("Route Corridor")
+    route_col1, route_col2, route_col3 = st.columns([2, 1, 1])
+    with route_col1:
+        route_file = st.file_uploader("Route (GPX or GeoJSON line):", type=ROUTE_FILE_TYPES)
+    with route_col2:
+        corridor_km = st.slider("Corridor (km from the route):", min_value=1, max_value=50, value=5)
+    with route_col3:
+        route_categories = st.multiselect("Power per point:", options=POWER_PER_POINT_CATEGORIES,
+                                          key='route_categories')
+
+    if route_file is not None:
+        try:
+            route = get_route_index(route_file.getvalue(), route_file.name, corridor_km)
+        except ValueError as e:
+            # RouteFileError for unreadable files, ValueError for lines without two distinct points
+            st.error(str(e))
+            route = None
+        if route is not None:
+            with instrumentation.stage('route_corridor'):
+                if use_db:
+                    along = get_station_db().along_route(route, route_categories)
+                else:
+                    along = stations_along_route(df, get_spatial_index(data_version), route, route_categories)
+            st.write(f"{len(along)} stations within {corridor_km} km of the route ({route.total_km:.0f} km)")
+            if not along.empty:
+                along = along.assign(**{'Max DC (kW)': get_connector_table(data_version, use_db).max_power(
+                    along['ID'], current='DC')})
+                st.dataframe(
+                    along[['Along route (km)', 'Distance (km)', 'Nome', 'Operador', 'Cidade', 'Endereço',
+                           'Número de Pontos', 'Potência Total (kW)', 'Max DC (kW)', 'Power per Point Category',
+                           'Latitude', 'Longitude']],
+                    hide_index=True,
+                    use_container_width=True
+                )
+            with instrumentation.stage('route_map'):
+                folium_static(create_route_map(route.lats.tolist(), route.lons.tolist(), along),
+                              width=None, height=500)
 
     # --- Main Layout: Bottom Section (Detailed Charts) --- 
     st.write("--- ") # Separator
     st.subheader("Detailed Charts")
 
     if not filtered_df.empty:
-        chart_col1, chart_col2, chart_col3 = st.columns(3)
-
-        with chart_col1:
-            st.write("**Top Cities**")
-            top_cities = filtered_df['Cidade'].value_counts().nlargest(5)
-            if not top_cities.empty:
-                city_chart = alt.Chart(top_cities.reset_index()).mark_bar().encode(
-                    x=alt.X('count', title='Stations'),
-                    y=alt.Y('Cidade', sort='-x', title=None),
-                    tooltip=['Cidade', 'count'],
-                    color=alt.value(COLORS['blue'])
-                ).properties(height=200)
-                st.altair_chart(city_chart, use_container_width=True)
-            else:
-                st.write("_No data_")
-
-            st.write("**Points Distribution**")
-            points_dist = filtered_df['Charging Points Category'].value_counts()
-            if not points_dist.empty:
-                points_chart = alt.Chart(points_dist.reset_index()).mark_bar().encode(
-                    x=alt.X('count', title='Stations'),
-                    y=alt.Y('Charging Points Category', sort=['1 point', '2 points', '3-4 points', '5+ points'], title='Points per Station'),
-                    tooltip=['Charging Points Category', 'count'],
-                    color=alt.value(COLORS['blue'])
-                ).properties(height=200)
-                st.altair_chart(points_chart, use_container_width=True)
-            else:
-                 st.write("_No data_")
-
-        with chart_col2:
-             st.write("**Average Power per Number of Points**")
-             # Calculate average power for each number of points
-             avg_power_by_points = filtered_df.groupby('Número de Pontos')['Potência Total (kW)'].mean().reset_index()
-             avg_power_by_points.rename(columns={'Potência Total (kW)': 'Average Total Power (kW)'}, inplace=True)
-             
-             if not avg_power_by_points.empty and avg_power_by_points['Número de Pontos'].nunique() > 1:
-                 line = alt.Chart(avg_power_by_points).mark_line(point=True).encode(
-                     x=alt.X('Número de Pontos', title='Number of Points', scale=alt.Scale(zero=False)),
-                     y=alt.Y('Average Total Power (kW)', title='Avg. Total Power (kW)', scale=alt.Scale(zero=False)),
-                     tooltip=['Número de Pontos', alt.Tooltip('Average Total Power (kW)', format='.2f')]
-                 ).properties(
-                      height=430 # Match height of the column
-                 )
-                 st.altair_chart(line, use_container_width=True)
-             else:
-                 st.write("_Not enough distinct points data for line graph_")
-
-        with chart_col3:
-            st.write("**Total Power Distribution**")
-            power_dist = filtered_df['Power Range'].value_counts().reindex(power_ranges).fillna(0)
-            if not power_dist.empty:
-                power_chart = alt.Chart(power_dist.reset_index()).mark_bar().encode(
-                    x=alt.X('Power Range', title='Total Power (kW)'),
-                    y=alt.Y('count', title='Stations'),
-                    tooltip=['Power Range', 'count'],
-                    color=alt.value(COLORS['blue'])
-                ).properties(height=200)
-                st.altair_chart(power_chart, use_container_width=True)
-            else:
-                st.write("_No data_")
+        with instrumentation.stage('charts'):
+            # Vega-Lite specs built once per filter combination and reused by every session
+            specs = get_chart_specs(data_version, use_db, filter_key)
+            chart_col1, chart_col2, chart_col3 = st.columns(3)
+
+            with chart_col1:
+                st.write("**Top Cities**")
+                if specs['top_cities']:
+                    st.vega_lite_chart(specs['top_cities'], use_container_width=True)
+                else:
+                    st.write("_No data_")
+
+                st.write("**Points Distribution**")
+                if specs['points']:
+                    st.vega_lite_chart(specs['points'], use_container_width=True)
+                else:
+                     st.write("_No data_")
+
+            with chart_col2:
+                 st.write("**Average Power per Number of Points**")
+                 if specs['avg_power']:
+                     st.vega_lite_chart(specs['avg_power'], use_container_width=True)
+                 else:
+                     st.write("_Not enough distinct points data for line graph_")
+
+            with chart_col3:
+                st.write("**Total Power Distribution**")
+                if specs['power']:
+                    st.vega_lite_chart(specs['power'], use_container_width=True)
+                else:
+                    st.write("_No data_")
                 
-            st.write("**Power per Point (kW) Distribution**") # Histogram
-            ppp_data = filtered_df['Potência por Ponto (kW)'].dropna()
-            # ppp_data = ppp_data[ppp_data <= 200] # Optional: Cap at 200 kW for viz
-            
-            if not ppp_data.empty:
-                 ppp_hist = alt.Chart(pd.DataFrame({'Power per Point (kW)': ppp_data})).mark_bar().encode(
-                     alt.X("Power per Point (kW)", bin=alt.Bin(maxbins=20), title="Power per Point (kW)"),
-                     alt.Y('count()', title='Number of Stations'),
-                     tooltip=[alt.Tooltip("count()", title="Stations"), alt.X("Power per Point (kW)", bin=alt.Bin(maxbins=20))],
-                     color=alt.value(COLORS['blue']) # Added blue color
-                 ).properties(height=200)
-                 st.altair_chart(ppp_hist, use_container_width=True)
-            else:
-                 st.write("_No data for histogram_")
+                st.write("**Power per Point (kW) Distribution**") # Histogram
+                if specs['ppp']:
+                     st.vega_lite_chart(specs['ppp'], use_container_width=True)
+                else:
+                     st.write("_No data for histogram_")
 
     else:
         st.warning("No stations match the selected filters.")
@@ -0,0 +1,149 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from connectors import connector_bits
+from filter_index import FILTER_COLUMNS
+from station_data import CHARGING_POINTS_OPTIONS, POWER_RANGES
+
+# The sidebar filter dimensions (the connector filters as one bitmask), plus finer ones kept
+# for the charts: the number of points (average power line) and the exact power per point
+# (histogram, binned at query time)
+CUBE_DIMENSIONS = FILTER_COLUMNS + ['Connector Flags', 'Número de Pontos', 'Potência por Ponto (kW)']
+
+# Measures per cell: stations, summed total power and stations with a known power
+CUBE_MEASURES = ['stations', 'power', 'power_count']
+
+# Same tolerance Vega uses when assigning values to bins
+_BIN_EPSILON = 1e-14
+
+
+# Function to compute the bins Vega-Lite draws for bin=alt.Bin(maxbins=...) over an extent
+# (port of vega-statistics' bin(), with nice boundaries), returning (start, stop, step)
+def nice_bins(minimum, maximum, maxbins=20, base=10, divide=(5, 2)):
+    span = (maximum - minimum) or abs(minimum) or 1
+    logb = math.log(base)
+    level = math.ceil(math.log(maxbins) / logb)
+    step = base ** (math.floor(math.log(span) / logb + 0.5) - level)  # JS Math.round
+    while math.ceil(span / step) > maxbins:
+        step *= base
+    for div in divide:
+        value = step / div
+        if span / value <= maxbins:
+            step = value
+
+    value = math.log(step)
+    precision = 0 if value >= 0 else int(-value / logb) + 1
+    eps = base ** (-precision - 1)
+    start = math.floor(minimum / step + eps) * step
+    start = start - step if minimum < start else start
+    stop = math.ceil(maximum / step) * step
+    return start, (start + step if stop == start else stop), step
+
+
+class StationCube:
+    """Station counts and power sums per (city, power range, points category,
+    connector flags, number of points, power per point), built once per dataset version.
+
+    Every metric and chart of the dashboard is a sum over the cells that match
+    the sidebar filters, so its cost depends on the number of distinct cells,
+    not on the number of stations.
+    """
+
+    def __init__(self, cells):
+        self.values = {
+            'Cidade': sorted(cells['Cidade'].dropna().unique()),
+            'Power Range': list(POWER_RANGES),
+            'Charging Points Category': list(CHARGING_POINTS_OPTIONS),
+        }
+        self._codes = {
+            col: pd.Categorical(cells[col], categories=self.values[col]).codes.astype(np.int64)
+            for col in FILTER_COLUMNS
+        }
+        self._flags = cells['Connector Flags'].to_numpy(dtype=np.int64)
+        self._points = cells['Número de Pontos'].to_numpy(dtype=float)
+        self._ppp = cells['Potência por Ponto (kW)'].to_numpy(dtype=float)
+        self._stations = cells['stations'].to_numpy(dtype=float)
+        self._power = cells['power'].to_numpy(dtype=float)
+        self._power_count = cells['power_count'].to_numpy(dtype=float)
+        self.n_cells = len(cells)
+
+    @staticmethod
+    def cells_from_frame(df):
+        """Cube cells aggregated from a station table shaped like load_stations() output."""
+        power = df['Potência Total (kW)'].to_numpy(dtype=float)
+        rows = pd.DataFrame({col: df[col].to_numpy() for col in CUBE_DIMENSIONS})
+        rows['stations'] = 1
+        rows['power'] = np.nan_to_num(power)
+        rows['power_count'] = ~np.isnan(power)
+        return rows.groupby(CUBE_DIMENSIONS, dropna=False, sort=False).sum().reset_index()
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(cls.cells_from_frame(df))
+
+    # Function to turn the sidebar selection into a boolean mask over cells
+    # (an empty selection does not filter, as in the filter index)
+    def _selected(self, city='All', power_ranges=(), charging_points=(), connectors=()):
+        mask = np.ones(self.n_cells, dtype=bool)
+        for col, selected in [('Cidade', None if city == 'All' else [city]),
+                              ('Power Range', power_ranges),
+                              ('Charging Points Category', charging_points)]:
+            if selected:
+                wanted = np.isin(np.asarray(self.values[col], dtype=object), list(selected))
+                mask &= wanted[self._codes[col]] & (self._codes[col] >= 0)
+        if connectors:
+            mask &= (self._flags & connector_bits(connectors)) != 0
+        return mask
+
+    def stats(self, city='All', power_ranges=(), charging_points=(), connectors=()):
+        """Statistics panel values."""
+        mask = self._selected(city, power_ranges, charging_points, connectors)
+        stations = self._stations[mask]
+        ppp = self._ppp[mask]
+        ppp_known = ~np.isnan(ppp)
+        power = self._power[mask].sum()
+        power_count = self._power_count[mask].sum()
+        ppp_count = stations[ppp_known].sum()
+        return {
+            'total_stations': int(stations.sum()),
+            'total_points': int(np.dot(np.nan_to_num(self._points[mask]), stations)),
+            'total_power': power,
+            'avg_power_station': power / power_count if power_count else np.nan,
+            'avg_power_point': np.dot(ppp[ppp_known], stations[ppp_known]) / ppp_count if ppp_count else np.nan,
+        }
+
+    def counts_by(self, col, city='All', power_ranges=(), charging_points=(), connectors=()):
+        """Station counts per value of a filter dimension, like value_counts() in display order."""
+        mask = self._selected(city, power_ranges, charging_points, connectors) & (self._codes[col] >= 0)
+        counts = np.bincount(self._codes[col][mask], weights=self._stations[mask], minlength=len(self.values[col]))
+        return pd.Series(counts.astype(np.int64), index=pd.Index(self.values[col], name=col), name='count')
+
+    def avg_power_by_points(self, city='All', power_ranges=(), charging_points=(), connectors=()):
+        """Average total power per number of points (stations without a point count are left out)."""
+        mask = self._selected(city, power_ranges, charging_points, connectors) & ~np.isnan(self._points)
+        points, inverse = np.unique(self._points[mask], return_inverse=True)
+        power = np.bincount(inverse, weights=self._power[mask], minlength=len(points))
+        power_count = np.bincount(inverse, weights=self._power_count[mask], minlength=len(points))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            average = power / power_count
+        return pd.DataFrame({'Número de Pontos': points, 'Average Total Power (kW)': average})
+
+    def ppp_histogram(self, city='All', power_ranges=(), charging_points=(), connectors=(), maxbins=20):
+        """Non-empty power per point bins, with the same boundaries as Vega-Lite's maxbins binning."""
+        mask = self._selected(city, power_ranges, charging_points, connectors) & ~np.isnan(self._ppp)
+        values, weights = self._ppp[mask], self._stations[mask]
+        if not len(values):
+            return pd.DataFrame({'bin_start': [], 'bin_end': [], 'count': []})
+        start, stop, step = nice_bins(values.min(), values.max(), maxbins)
+        n_bins = max(int(round((stop - start) / step)), 1)
+        clamped = np.clip(values, start, stop - step)
+        bins = np.minimum(np.floor(_BIN_EPSILON + (clamped - start) / step).astype(np.int64), n_bins - 1)
+        counts = np.bincount(bins, weights=weights, minlength=n_bins).astype(np.int64)
+        non_empty = np.flatnonzero(counts)
+        return pd.DataFrame({
+            'bin_start': start + non_empty * step,
+            'bin_end': start + (non_empty + 1) * step,
+            'count': counts[non_empty],
+        })
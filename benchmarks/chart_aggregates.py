@@ -0,0 +1,74 @@
+"""Per-rerun cost of the statistics and chart data: scanning the filtered table vs the analytics cube.
+
+Run from the repository root:
+    python -m benchmarks.chart_aggregates --sizes 3660 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from analytics_cube import StationCube
+from benchmarks.synthetic import make_stations
+from filter_index import StationFilterIndex
+from station_data import compact_stations, preprocess_stations
+
+# Filter combinations timed on every size
+FILTERS = [
+    ('All', (), ()),
+    ('Lisboa', (), ()),
+    ('All', ('100+',), ('3-4 points', '5+ points')),
+]
+
+
+# Function to compute every metric and chart input from the filtered table, as the app used to
+def scan(filtered):
+    power = filtered['Potência Total (kW)']
+    stats = (len(filtered), filtered['Número de Pontos'].sum(), power.sum(), power.mean(),
+             filtered['Potência por Ponto (kW)'].mean())
+    top_cities = filtered['Cidade'].value_counts().nlargest(5)
+    points = filtered['Charging Points Category'].value_counts()
+    avg_power = filtered.groupby('Número de Pontos')['Potência Total (kW)'].mean()
+    power_ranges = filtered['Power Range'].value_counts()
+    ppp = np.histogram(filtered['Potência por Ponto (kW)'].dropna(), bins=20)
+    return stats, top_cities, points, avg_power, power_ranges, ppp
+
+
+# Function to answer the same from the cube
+def from_cube(cube, key):
+    return (cube.stats(*key), cube.counts_by('Cidade', *key).nlargest(5),
+            cube.counts_by('Charging Points Category', *key), cube.avg_power_by_points(*key),
+            cube.counts_by('Power Range', *key), cube.ppp_histogram(*key))
+
+
+# Function to time a callable, returning milliseconds per call
+def time_ms(func, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[3660, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'stations':>10} {'cells':>7} {'build (s)':>10} {'filters':<45} {'scan (ms)':>10} {'cube (ms)':>10}")
+    for n in args.sizes:
+        df = compact_stations(preprocess_stations(make_stations(n)))
+        index = StationFilterIndex(df)
+        start = time.perf_counter()
+        cube = StationCube.from_frame(df)
+        build_s = time.perf_counter() - start
+        for key in FILTERS:
+            filtered = df[index.mask(*key)]
+            scan_ms = time_ms(lambda: scan(filtered))
+            cube_ms = time_ms(lambda: from_cube(cube, key))
+            label = ' / '.join(str(part) for part in key)
+            print(f'{n:>10} {cube.n_cells:>7} {build_s:10.2f} {label:<45} {scan_ms:10.1f} {cube_ms:10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""Load test of the app with N concurrent sessions, in shared-dataset and per-session copy mode.
+
+Builds a synthetic dataset (JSON and Arrow snapshot, plus the SQLite store with --db) in a
+temporary folder. Then, for each mode and session count, a fresh Python process runs N
+sessions of Charging_map.py at the same time (streamlit.testing AppTest, one thread each;
+the Streamlit caches are process-wide, as on a real server). Each session changes one
+filter and reruns the script --reruns times. Reported per run: the process memory (resident
+set sampled every 10 ms; peak above the baseline taken after a warm-up session) and the
+rerun latency percentiles. The resident set is read from /proc, so memory is Linux-only.
+
+Run from the repository root:
+    python -m benchmarks.concurrent_sessions --stations 100000 --sessions 1 4 16 --reruns 5
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_FILE = os.path.join(ROOT, 'Charging_map.py')
+MODES = {'shared': '1', 'copy': '0'}
+SAMPLE_SECONDS = 0.01
+
+
+# Function to read the resident set size of this process in bytes (None where /proc is missing)
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+# Function to compute a percentile (0-100) of a list of numbers (nearest rank)
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))] if ordered else None
+
+
+# Function to write the synthetic dataset where the app looks for it (data/ and the
+# SQLite store under folder), returning the number of stations written
+def build_dataset(folder, n, with_db):
+    import create_db
+    import get_charging_stations as stations
+    from benchmarks.synthetic import make_pois
+    from station_data import DATA_FILE
+    from station_db import DB_FILE
+
+    os.makedirs(os.path.join(folder, os.path.dirname(DATA_FILE)), exist_ok=True)
+    records = stations.process_stations(make_pois(n))
+    with contextlib.redirect_stdout(io.StringIO()):
+        stations.save_data(records, os.path.join(folder, 'postos_carregamento.csv'),
+                           os.path.join(folder, DATA_FILE))
+        if with_db:
+            conn = sqlite3.connect(os.path.join(folder, DB_FILE))
+            create_db.create_table(conn)
+            create_db.refresh_station_data(conn, records)
+            conn.close()
+    return len(records)
+
+
+# Function to change one sidebar filter of a session (picked at random) before its next rerun
+def change_filter(at, rng):
+    widget = rng.choice(['city', 'power', 'connectors'])
+    if widget == 'city':
+        selectbox = at.selectbox(key='city_selector')
+        selectbox.set_value(rng.choice(selectbox.options))
+    else:
+        label = 'Select Total Power ranges (kW):' if widget == 'power' else 'Has a connector:'
+        multiselect = next(m for m in at.multiselect if m.label == label)
+        multiselect.set_value(rng.sample(multiselect.options, rng.randint(0, len(multiselect.options))))
+
+
+# Function to let AppTest sessions run at the same time in one process. AppTest installs a
+# mock Runtime (and its config overrides) around every run and removes it at the end, which
+# breaks the other sessions still running, and compiles the script again on every run; here
+# one Runtime and one script cache are used for the whole process, as on a real server, and
+# AppTest's per-run setup only touches a subclass of the Runtime
+def share_test_runtime():
+    from unittest.mock import MagicMock, patch
+
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+    from streamlit.testing.v1.util import build_mock_config_get_option
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage('/mock/media'))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    patch.object(config, 'get_option', new=build_mock_config_get_option({'global.appTest': True})).start()
+    app_test.Runtime = type('SessionRuntime', (Runtime,), {})
+    app_test.patch_config_options = lambda overrides: contextlib.nullcontext()
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+
+
+# Function to run one session: first load, then reruns after a filter change each, returning
+# the latency (s) of every rerun and the number of exceptions the script raised
+def run_session(seed, reruns, map_mode, timeout, start_barrier=None):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(APP_FILE, default_timeout=timeout)
+    if start_barrier is not None:
+        start_barrier.wait()
+    latencies = []
+    start = time.perf_counter()
+    at.run()
+    latencies.append(time.perf_counter() - start)
+    if map_mode == 'viewport':
+        next(r for r in at.radio if r.label == 'Map loading:').set_value('Viewport (server clustering)')
+    for _ in range(reruns):
+        change_filter(at, rng)
+        start = time.perf_counter()
+        at.run()
+        latencies.append(time.perf_counter() - start)
+    return latencies, len(at.exception)
+
+
+# Function to run N concurrent sessions in this process (the worker side), returning the results
+def run_worker(sessions, reruns, map_mode, timeout):
+    share_test_runtime()
+    # Warm-up session: loads the dataset and builds the indexes, so the baseline includes them
+    run_session(-1, 0, map_mode, timeout)
+    gc.collect()
+    baseline = rss_bytes()
+
+    peak = baseline
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.is_set():
+            rss = rss_bytes()
+            if rss is not None and rss > peak:
+                peak = rss
+            time.sleep(SAMPLE_SECONDS)
+
+    results = [None] * sessions
+    barrier = threading.Barrier(sessions)
+
+    def session(i):
+        try:
+            results[i] = run_session(i, reruns, map_mode, timeout, barrier)
+        except Exception as e:
+            results[i] = e
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    sampler.start()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    sampler.join()
+
+    failures = [result for result in results if isinstance(result, Exception)]
+    if failures:
+        raise RuntimeError(f"{len(failures)} of {sessions} sessions failed") from failures[0]
+    latencies = [latency for result in results for latency in result[0]]
+    return {
+        'sessions': sessions,
+        'reruns': len(latencies),
+        'seconds': round(elapsed, 2),
+        'p50_s': round(percentile(latencies, 50), 3),
+        'p95_s': round(percentile(latencies, 95), 3),
+        'max_s': round(max(latencies), 3),
+        'exceptions': sum(result[1] for result in results),
+        'baseline_mb': None if baseline is None else round(baseline / 1e6, 1),
+        'peak_above_baseline_mb': None if baseline is None else round((peak - baseline) / 1e6, 1),
+    }
+
+
+# Function to run one mode and session count in a fresh process, so memory is measured alone
+def run_isolated(folder, mode, sessions, args):
+    env = {**os.environ, 'EV_MAP_SHARED_DATA': MODES[mode],
+           'PYTHONPATH': os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')]))}
+    command = [sys.executable, '-m', 'benchmarks.concurrent_sessions', '--worker',
+               '--sessions', str(sessions), '--reruns', str(args.reruns),
+               '--map-mode', args.map_mode, '--timeout', str(args.timeout)]
+    completed = subprocess.run(command, cwd=folder, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {'mode': mode, 'sessions': sessions, 'error': completed.stderr.strip().splitlines()[-1:]}
+    return {'mode': mode, **json.loads(completed.stdout.strip().splitlines()[-1])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stations', type=int, default=100000)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--reruns', type=int, default=5, help='reruns per session after its first load')
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    parser.add_argument('--map-mode', choices=['viewport', 'all'], default='viewport',
+                        help="'all' renders every station into the map HTML (slow above ~50k stations)")
+    parser.add_argument('--db', action='store_true', help='also build the SQLite store, so the app reads from it')
+    parser.add_argument('--timeout', type=float, default=300, help='seconds allowed per rerun')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        # Streamlit's own logging goes to stderr; only the result line goes to stdout
+        result = run_worker(args.sessions[0], args.reruns, args.map_mode, args.timeout)
+        print(json.dumps(result))
+        return
+
+    results = []
+    print(f"{'mode':<7} {'sessions':>8} {'reruns':>7} {'p50 (s)':>8} {'p95 (s)':>8} {'max (s)':>8} "
+          f"{'base MB':>8} {'peak +MB':>9} {'errors':>7}")
+    with tempfile.TemporaryDirectory() as folder:
+        n = build_dataset(folder, args.stations, args.db)
+        print(f"{n} stations, {'SQLite store' if args.db else 'JSON/snapshot'}, {args.map_mode} map")
+        for sessions in args.sessions:
+            for mode in args.modes:
+                result = run_isolated(folder, mode, sessions, args)
+                results.append(result)
+                if 'error' in result:
+                    print(f"{mode:<7} {sessions:>8}  failed: {result['error']}")
+                    continue
+                print(f"{mode:<7} {sessions:>8} {result['reruns']:>7} {result['p50_s']:>8} {result['p95_s']:>8} "
+                      f"{result['max_s']:>8} {result['baseline_mb']!s:>8} {result['peak_above_baseline_mb']!s:>9} "
+                      f"{result['exceptions']:>7}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'stations': args.stations, 'db': args.db, 'map_mode': args.map_mode, 'results': results},
+                      f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
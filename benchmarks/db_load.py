@@ -0,0 +1,53 @@
+"""Rows per second of the row-by-row SQLite loader vs the bulk executemany loader.
+
+Run from the repository root:
+    python -m benchmarks.db_load --sizes 3660 1000000
+"""
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import time
+
+import create_db
+from benchmarks.synthetic import make_stations
+
+
+# Function to build processed station records, as stored in postos_carregamento.json
+def make_records(n):
+    df = make_stations(n).drop(columns=['Potência por Ponto (kW)'])
+    df['ID'] = df['ID'].astype(object)
+    df['Número de Pontos'] = df['Número de Pontos'].astype(object)
+    return df.to_dict('records')
+
+
+# Function to load records into a fresh database file, returning rows per second
+def rows_per_second(loader, records, db_file):
+    conn = sqlite3.connect(db_file)
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_db.create_table(conn)
+        start = time.perf_counter()
+        loader(conn, records)
+        elapsed = time.perf_counter() - start
+    conn.close()
+    return len(records) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[3660, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'row-by-row (rows/s)':>20} {'bulk (rows/s)':>14} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            records = make_records(n)
+            row = rows_per_second(create_db.insert_station_data, records, os.path.join(tmp, f'row_{n}.db'))
+            bulk = rows_per_second(create_db.bulk_insert_station_data, records, os.path.join(tmp, f'bulk_{n}.db'))
+            print(f'{n:>10} {row:20,.0f} {bulk:14,.0f} {bulk / row:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Throughput and completeness of the tiled fetch engine against the local mock API.
+
+Run from the repository root:
+    python -m benchmarks.fetch_engine --pois 60000 --countries PT ES --workers 1 8 --error-rate 0.05
+"""
+import argparse
+import time
+
+from benchmarks.mock_ocm import MockOpenChargeMap
+from benchmarks.synthetic import make_pois
+from fetcher import fetch_pois
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pois', type=int, default=60000)
+    parser.add_argument('--countries', nargs='+', default=['PT', 'ES'])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--page-size', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.05, help='Simulated server latency (s)')
+    parser.add_argument('--error-rate', type=float, default=0.05, help='Share of requests answered 429/503')
+    args = parser.parse_args()
+
+    pois = make_pois(args.pois, countries=tuple(args.countries))
+    expected = {poi['ID'] for poi in pois}
+    mock = MockOpenChargeMap(pois, latency=args.latency, error_rate=args.error_rate)
+    url = mock.start()
+
+    print(f"{'workers':>8} {'time (s)':>9} {'POIs/s':>9} {'requests':>9} {'retries':>8} {'complete':>9}")
+    try:
+        for workers in args.workers:
+            stats = {}
+            start = time.perf_counter()
+            result = fetch_pois(args.countries, base_url=url, workers=workers,
+                                page_size=args.page_size, stats=stats)
+            elapsed = time.perf_counter() - start
+            complete = {poi['ID'] for poi in result} == expected and len(result) == len(expected)
+            print(f'{workers:>8} {elapsed:9.2f} {len(result) / elapsed:9.0f} {stats["requests"]:>9} '
+                  f'{stats["retries"]:>8} {str(complete):>9}')
+    finally:
+        mock.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Render time of create_map: per-row folium.Marker loop vs bulk marker layer.
+
+Run from the repository root:
+    python -m benchmarks.map_render --sizes 3600 36000 360000
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import make_stations
+from station_map import create_map
+
+
+# Function to build and serialize a map, returning (seconds, html bytes)
+def time_render(df, bulk):
+    start = time.perf_counter()
+    m = create_map(df, bulk=bulk)
+    html = m.get_root().render()
+    return time.perf_counter() - start, len(html.encode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[3600, 36000, 360000])
+    parser.add_argument('--loop-max', type=int, default=36000,
+                        help='Skip the per-row loop above this many stations (it takes minutes)')
+    args = parser.parse_args()
+
+    print(f"{'stations':>10} {'loop (s)':>10} {'bulk (s)':>10} {'speedup':>8} {'bulk HTML (MB)':>15}")
+    for n in args.sizes:
+        df = make_stations(n)
+        bulk_s, bulk_bytes = time_render(df, bulk=True)
+        if n <= args.loop_max:
+            loop_s, _ = time_render(df, bulk=False)
+            loop_str, speedup_str = f'{loop_s:10.2f}', f'{loop_s / bulk_s:7.1f}x'
+        else:
+            loop_str, speedup_str = f"{'skipped':>10}", f"{'-':>8}"
+        print(f'{n:>10} {loop_str} {bulk_s:10.2f} {speedup_str} {bulk_bytes / 1e6:15.1f}')
+
+
+if __name__ == '__main__':
+    main()
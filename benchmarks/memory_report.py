@@ -0,0 +1,47 @@
+"""Memory of the station table: plain object/float64 frame vs compact frame.
+
+Run from the repository root:
+    python -m benchmarks.memory_report                     # data/postos_carregamento.json
+    python -m benchmarks.memory_report --synthetic 1000000
+"""
+import argparse
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+from benchmarks.synthetic import make_stations
+from station_data import DATA_FILE, load_stations, memory_report
+
+
+# Function to write n synthetic stations as a processed-stations JSON file
+def write_synthetic_json(n, path):
+    df = make_stations(n).drop(columns=['Potência por Ponto (kW)'])
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(df.to_json(orient='records', force_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', default=DATA_FILE)
+    parser.add_argument('--synthetic', type=int, help='Use N synthetic stations instead of --data')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.data
+        if args.synthetic:
+            path = os.path.join(tmp, 'stations.json')
+            write_synthetic_json(args.synthetic, path)
+        before = load_stations(path, compact=False)
+        after = load_stations(path)
+
+    report = memory_report(before, after)
+    with pd.option_context('display.width', 120, 'display.max_columns', None):
+        print(report.to_string(float_format=lambda v: f'{v:,.2f}'))
+    print(f"\n{len(after):,} stations: {report.loc['TOTAL', 'before_bytes'] / 1e6:,.1f} MB -> "
+          f"{report.loc['TOTAL', 'after_bytes'] / 1e6:,.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
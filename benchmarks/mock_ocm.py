@@ -0,0 +1,116 @@
+"""Local mock of the OpenChargeMap /v3/poi endpoint for fetch tests and benchmarks.
+
+Supports countrycode, boundingbox, modifiedsince and maxresults (results are
+truncated like the real API), with optional latency and injected 429/503
+errors. Run standalone with:
+    python -m benchmarks.mock_ocm --pois 50000 --port 8765
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from benchmarks.synthetic import make_pois
+
+_BBOX_PATTERN = re.compile(r'\(([-\d.]+),([-\d.]+)\),\(([-\d.]+),([-\d.]+)\)')
+
+
+class MockOpenChargeMap:
+    """In-memory POI store served over HTTP on 127.0.0.1."""
+
+    def __init__(self, pois, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.set_pois(pois)
+
+    def set_pois(self, pois):
+        self.pois = sorted(pois, key=lambda poi: poi['ID'])
+        self._lat = np.array([poi['AddressInfo']['Latitude'] for poi in self.pois], dtype=float)
+        self._lon = np.array([poi['AddressInfo']['Longitude'] for poi in self.pois], dtype=float)
+        self._country = np.array([poi.get('_CountryCode', 'PT') for poi in self.pois])
+        self._modified = np.array([poi.get('DateLastStatusUpdate', '') for poi in self.pois])
+
+    def query(self, params):
+        mask = np.ones(len(self.pois), dtype=bool)
+        if 'countrycode' in params:
+            mask &= np.isin(self._country, params['countrycode'][0].upper().split(','))
+        if 'boundingbox' in params:
+            match = _BBOX_PATTERN.fullmatch(params['boundingbox'][0].replace(' ', ''))
+            lat1, lon1, lat2, lon2 = map(float, match.groups())
+            mask &= (self._lat >= min(lat1, lat2)) & (self._lat <= max(lat1, lat2))
+            mask &= (self._lon >= min(lon1, lon2)) & (self._lon <= max(lon1, lon2))
+        if 'modifiedsince' in params:
+            mask &= self._modified >= params['modifiedsince'][0]
+        limit = int(params.get('maxresults', ['100'])[0])
+        return [self.pois[i] for i in np.flatnonzero(mask)[:limit]]
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with mock._lock:
+                    mock.requests += 1
+                    fail = mock._random.random() < mock.error_rate
+                    if fail:
+                        mock.errors += 1
+                if mock.latency:
+                    time.sleep(mock.latency)
+                if fail:
+                    self.send_response(mock._random.choice([429, 503]))
+                    self.send_header('Retry-After', '0')
+                    self.end_headers()
+                    return
+                body = json.dumps(mock.query(parse_qs(urlparse(self.path).query))).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self, port=0):
+        """Serve in a background thread; returns the /v3/poi URL."""
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self.server.server_port}/v3/poi'
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pois', type=int, default=50000)
+    parser.add_argument('--countries', nargs='+', default=['PT'])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    mock = MockOpenChargeMap(make_pois(args.pois, countries=tuple(args.countries)),
+                             latency=args.latency, error_rate=args.error_rate)
+    print(f'Serving {args.pois:,} POIs at {mock.start(args.port)} (Ctrl+C to stop)')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == '__main__':
+    main()
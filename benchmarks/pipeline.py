@@ -0,0 +1,232 @@
+"""Headless benchmark of every pipeline stage, from the raw API payload to the rendered map.
+
+Generates synthetic OpenChargeMap-shaped payloads and runs each stage without the
+Streamlit server or the network, recording wall time, peak Python memory
+(tracemalloc, which also sees numpy buffers) and the size of what the stage
+produces. Results are written as JSON, so runs on different commits can be compared.
+tracemalloc slows allocation-heavy stages down; --no-memory gives cleaner timings.
+
+Run from the repository root:
+    python -m benchmarks.pipeline --sizes 1000 10000 100000 1000000 --output results.json
+    python -m benchmarks.pipeline --compare base.json results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import create_db
+import get_charging_stations as stations
+from analytics_cube import StationCube
+from benchmarks.synthetic import make_pois
+from chart_specs import detailed_chart_specs
+from fetcher import STREAM_CHUNK_SIZE, iter_json_array
+from filter_index import StationFilterIndex
+from station_data import compact_stations, load_stations, preprocess_stations, snapshot_path, stations_from_records
+from station_db import StationDatabase
+from station_map import create_map, render_map_html
+
+STAGES = ['parse', 'process', 'save', 'db_load', 'load_json', 'load_snapshot', 'preprocess',
+          'filter_index', 'filter', 'cube', 'chart_specs', 'db_query', 'db_nearby', 'render_map']
+
+# Filter combinations applied by the 'filter' stage (sidebar city, power ranges, points)
+FILTERS = [('All', (), ()), ('Lisboa', (), ()), ('Porto', ('100+',), ('3-4 points', '5+ points'))]
+# Points queried by the 'db_nearby' stage (nearest stations and stations within NEARBY_KM)
+NEARBY_POINTS = [(38.7223, -9.1393), (41.1579, -8.6291), (40.2033, -8.4103)]
+NEARBY_KM = 5
+
+# Above this many stations the full map is not rendered (HTML of hundreds of MB)
+DEFAULT_MAX_MAP_SIZE = 100000
+
+
+# Function to run one stage (under tracemalloc unless disabled) with its prints silenced,
+# returning (result, seconds, peak MB or None)
+def measure(func, trace_memory=True):
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func()
+    seconds = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+# Function to describe the run, so result files from different commits can be told apart
+def run_metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+# Function to run the selected stages for one payload size, returning one result dict per stage
+def run_size(n, stages, tmp, max_map_size, trace_memory=True):
+    results = []
+
+    # Runs a stage when selected; a stage that later ones depend on (needed) still runs, untimed
+    def record(stage, func, sizes=None, needed=False):
+        if stage not in stages:
+            if not needed:
+                return None
+            with contextlib.redirect_stdout(io.StringIO()):
+                return func()
+        result, seconds, peak = measure(func, trace_memory)
+        entry = {'stage': stage, 'size': n, 'seconds': round(seconds, 4), 'peak_mb': peak}
+        entry.update(sizes(result) if sizes else {})
+        results.append(entry)
+        return result
+
+    json_file = os.path.join(tmp, f'stations_{n}.json')
+    csv_file = os.path.join(tmp, f'stations_{n}.csv')
+    db_file = os.path.join(tmp, f'stations_{n}.db')
+
+    # API payload, as the streaming fetcher receives it (generation itself is not timed)
+    payload = json.dumps(make_pois(n, countries=('PT', 'ES'))).encode('utf-8')
+    chunks = [payload[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(payload), STREAM_CHUNK_SIZE)]
+    pois = record('parse', lambda: list(iter_json_array(chunks)), lambda _: {'payload_bytes': len(payload)},
+                  needed=True)
+    del payload, chunks
+
+    records = record('process', lambda: stations.process_stations(pois), needed=True)
+    del pois
+
+    def file_sizes(*paths):
+        return lambda _: {f'{os.path.splitext(path)[1][1:]}_bytes': os.path.getsize(path)
+                          for path in paths if os.path.exists(path)}
+
+    record('save', lambda: stations.save_data(records, csv_file, json_file),
+           file_sizes(csv_file, json_file, snapshot_path(json_file)), needed=True)
+
+    def load_db():
+        conn = sqlite3.connect(db_file)
+        create_db.create_table(conn)
+        create_db.refresh_station_data(conn, records)
+        conn.close()
+
+    record('db_load', load_db, file_sizes(db_file), needed=bool({'db_query', 'db_nearby'} & stages))
+
+    record('load_json', lambda: load_stations(json_file, use_snapshot=False))
+    df = record('load_snapshot', lambda: load_stations(json_file), needed=True)
+
+    # Preprocessing on its own: city normalization, bucket columns and compaction of the raw table
+    if 'preprocess' in stages:
+        raw = stations_from_records(records, compact=False)[list(records[0]) + ['Potência por Ponto (kW)']]
+        record('preprocess', lambda: compact_stations(preprocess_stations(raw.copy())))
+        del raw
+    del records
+
+    index = record('filter_index', lambda: StationFilterIndex(df), needed='filter' in stages)
+    record('filter', lambda: [df[index.mask(*key)] for key in FILTERS],
+           lambda frames: {'rows': [len(frame) for frame in frames]})
+    cube = record('cube', lambda: StationCube.from_frame(df), lambda cube: {'cells': cube.n_cells},
+                  needed='chart_specs' in stages)
+    record('chart_specs', lambda: [detailed_chart_specs(cube, key, '#00C0F3') for key in FILTERS],
+           lambda specs: {'spec_bytes': sum(len(json.dumps(spec)) for spec in specs[0].values() if spec)})
+
+    def query_db():
+        db = StationDatabase(db_file)
+        result = [db.stations(*key) for key in FILTERS], db.cube_cells()
+        db.close()
+        return result
+
+    record('db_query', query_db, lambda result: {'rows': [len(frame) for frame in result[0]]})
+
+    # Dashboard queries in database mode that read a handful of rows around a point
+    def query_nearby():
+        db = StationDatabase(db_file)
+        result = ([db.nearest(lat, lon) for lat, lon in NEARBY_POINTS]
+                  + [db.within(lat, lon, NEARBY_KM) for lat, lon in NEARBY_POINTS])
+        db.close()
+        return result
+
+    record('db_nearby', query_nearby, lambda frames: {'rows': [len(frame) for frame in frames]})
+
+    if 'render_map' in stages:
+        if n <= max_map_size:
+            record('render_map', lambda: render_map_html(create_map(df)), lambda html: {'html_bytes': len(html)})
+        else:
+            results.append({'stage': 'render_map', 'size': n, 'skipped': f'more than {max_map_size} stations'})
+    return results
+
+
+# Function to print results as a table
+def print_results(results):
+    print(f"{'stage':<14} {'size':>9} {'seconds':>9} {'peak MB':>9}  output")
+    for entry in results:
+        if 'skipped' in entry:
+            print(f"{entry['stage']:<14} {entry['size']:>9} {'-':>9} {'-':>9}  skipped: {entry['skipped']}")
+            continue
+        extra = ', '.join(f'{key}={value}' for key, value in entry.items()
+                          if key not in ('stage', 'size', 'seconds', 'peak_mb'))
+        peak = '-' if entry['peak_mb'] is None else f"{entry['peak_mb']:.1f}"
+        print(f"{entry['stage']:<14} {entry['size']:>9} {entry['seconds']:>9.3f} {peak:>9}  {extra}")
+
+
+# Function to compare two result files stage by stage (ratio > 1 means the second run is slower)
+def compare(base_file, head_file):
+    with open(base_file, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(head_file, encoding='utf-8') as f:
+        head = json.load(f)
+    base_results = {(e['stage'], e['size']): e for e in base['results'] if 'seconds' in e}
+    print(f"{base['meta'].get('commit')} -> {head['meta'].get('commit')}")
+    print(f"{'stage':<14} {'size':>9} {'base s':>9} {'head s':>9} {'time':>7} {'memory':>7}")
+    for entry in head['results']:
+        old = base_results.get((entry['stage'], entry['size']))
+        if old is None or 'seconds' not in entry:
+            continue
+        time_ratio = entry['seconds'] / old['seconds'] if old['seconds'] else float('nan')
+        memory_ratio = entry['peak_mb'] / old['peak_mb'] if entry['peak_mb'] and old['peak_mb'] else float('nan')
+        print(f"{entry['stage']:<14} {entry['size']:>9} {old['seconds']:>9.3f} {entry['seconds']:>9.3f} "
+              f"{time_ratio:>6.2f}x {memory_ratio:>6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--max-map-size', type=int, default=DEFAULT_MAX_MAP_SIZE,
+                        help='largest size for which the full map is rendered')
+    parser.add_argument('--no-memory', action='store_true', help='do not trace peak memory (faster, cleaner timings)')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'), help='compare two result files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            size_results = run_size(n, set(args.stages), tmp, args.max_map_size, not args.no_memory)
+            print_results(size_results)
+            results.extend(size_results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'meta': run_metadata(), 'results': results}, f, indent=2)
+        print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
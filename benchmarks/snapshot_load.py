@@ -0,0 +1,50 @@
+"""Load time of the station table from the JSON file vs the memory-mapped Arrow snapshot.
+
+Run from the repository root:
+    python -m benchmarks.snapshot_load --sizes 3660 100000 1000000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.db_load import make_records
+from station_data import dataset_version, load_stations, snapshot_path, stations_from_records, write_snapshot
+
+
+# Function to time a loader, returning (seconds, DataFrame)
+def timed(load):
+    start = time.perf_counter()
+    df = load()
+    return time.perf_counter() - start, df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[3660, 100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'stations':>10} {'JSON (MB)':>10} {'Arrow (MB)':>11} {'JSON load (s)':>14} {'snapshot load (s)':>18} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            json_file = os.path.join(tmp, f'stations_{n}.json')
+            records = make_records(n)
+            # Same layout as save_data writes
+            with open(json_file, 'w', encoding='utf-8') as f:
+                json.dump(records, f, ensure_ascii=False, indent=2)
+            write_snapshot(stations_from_records(records), dataset_version(json_file), snapshot_path(json_file))
+            del records
+
+            json_s, from_json = timed(lambda: load_stations(json_file, use_snapshot=False))
+            snapshot_s, from_snapshot = timed(lambda: load_stations(json_file))
+            pd.testing.assert_frame_equal(from_json, from_snapshot)
+            json_mb = os.path.getsize(json_file) / 1e6
+            arrow_mb = os.path.getsize(snapshot_path(json_file)) / 1e6
+            print(f'{n:>10} {json_mb:10.1f} {arrow_mb:11.1f} {json_s:14.3f} {snapshot_s:18.3f} {json_s / snapshot_s:7.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Latency of k-nearest, radius and route corridor queries on StationSpatialIndex.
+
+Routes are synthetic GPS tracks of --route-km km (a point every ~30 m, a few metres of
+jitter); the route columns time building the route's segment index and one corridor query.
+
+Run from the repository root:
+    python -m benchmarks.spatial_queries --sizes 3660 2000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from spatial_index import KM_PER_DEGREE, RouteSegmentIndex, StationSpatialIndex
+
+PORTUGAL_BOX = ((37.0, 42.1), (-9.4, -6.3))
+EUROPE_BOX = ((36.0, 70.0), (-10.0, 30.0))
+
+
+# Function to time a query over many random points, returning milliseconds per query
+def time_queries(query, points):
+    start = time.perf_counter()
+    for lat, lon in points:
+        query(lat, lon)
+    return (time.perf_counter() - start) / len(points) * 1000
+
+
+# Function to make a winding GPS track of length_km starting inside the box, heading north-east
+def make_route(rng, lat_range, lon_range, length_km, step_km=0.03):
+    n = int(length_km / step_km)
+    heading = np.radians(45) + np.cumsum(rng.normal(0, 0.02, n))
+    lat0 = rng.uniform(lat_range[0], (lat_range[0] + lat_range[1]) / 2)
+    lon0 = rng.uniform(lon_range[0], (lon_range[0] + lon_range[1]) / 2)
+    lats = lat0 + np.cumsum(np.cos(heading)) * step_km / KM_PER_DEGREE
+    lons = lon0 + np.cumsum(np.sin(heading)) * step_km / (KM_PER_DEGREE * np.cos(np.radians(lat0)))
+    jitter = rng.normal(0, 3e-5, (2, n))
+    return lats + jitter[0], lons + jitter[1]
+
+
+# Function to time building the segment index of each route and one corridor query on it,
+# returning milliseconds per route for both
+def time_routes(index, routes, width_km):
+    build = query = 0.0
+    for lats, lons in routes:
+        start = time.perf_counter()
+        route = RouteSegmentIndex(lats, lons, width_km)
+        middle = time.perf_counter()
+        index.along_route(route)
+        build, query = build + middle - start, query + time.perf_counter() - middle
+    return build / len(routes) * 1000, query / len(routes) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[3660, 2000000])
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--routes', type=int, default=20)
+    parser.add_argument('--route-km', type=float, default=300)
+    parser.add_argument('--corridor-km', type=float, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'stations':>10} {'build (s)':>10} {'5-NN (ms)':>10} {'5-NN 5% (ms)':>13} {'10 km (ms)':>11} "
+          f"{'route index (ms)':>17} {'corridor (ms)':>14}")
+    for n in args.sizes:
+        # Portugal-sized datasets stay in Portugal; bigger ones spread over Europe
+        (lat_range, lon_range) = PORTUGAL_BOX if n <= 100000 else EUROPE_BOX
+        lat, lon = rng.uniform(*lat_range, n), rng.uniform(*lon_range, n)
+        start = time.perf_counter()
+        index = StationSpatialIndex(lat, lon)
+        build_s = time.perf_counter() - start
+
+        where = rng.random(n) < 0.05  # e.g. "DC ultra-fast only"
+        points = list(zip(rng.uniform(*lat_range, args.queries), rng.uniform(*lon_range, args.queries)))
+        knn = time_queries(lambda la, lo: index.nearest(la, lo, k=5), points)
+        knn_where = time_queries(lambda la, lo: index.nearest(la, lo, k=5, where=where), points)
+        radius = time_queries(lambda la, lo: index.within(la, lo, 10), points)
+        routes = [make_route(rng, lat_range, lon_range, args.route_km) for _ in range(args.routes)]
+        route_build, corridor = time_routes(index, routes, args.corridor_km)
+        print(f'{n:>10} {build_s:10.2f} {knn:10.3f} {knn_where:13.3f} {radius:11.3f} '
+              f'{route_build:17.2f} {corridor:14.2f}')
+
+
+if __name__ == '__main__':
+    main()
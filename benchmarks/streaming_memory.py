@@ -0,0 +1,81 @@
+"""Peak Python memory of list-based vs streaming fetch -> process -> save.
+
+Starts the mock API in a separate process so only the client side is measured.
+Run from the repository root:
+    python -m benchmarks.streaming_memory --pois 100000 --countries PT ES
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import requests
+
+import get_charging_stations as stations
+from fetcher import fetch_pois, iter_pois
+
+
+# Function to start the mock API in a child process and wait until it answers
+def start_mock(pois, countries, port):
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.mock_ocm', '--pois', str(pois), '--port', str(port),
+         '--countries', *countries],
+        stdout=subprocess.DEVNULL
+    )
+    url = f'http://127.0.0.1:{port}/v3/poi'
+    for _ in range(600):
+        try:
+            requests.get(url, params={'maxresults': 1}, timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.5)
+    process.kill()
+    raise RuntimeError('Mock API did not start')
+
+
+# Function to run a pipeline under tracemalloc, returning (seconds, peak MB)
+def measure(pipeline):
+    tracemalloc.start()
+    start = time.perf_counter()
+    pipeline()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pois', type=int, default=100000)
+    parser.add_argument('--countries', nargs='+', default=['PT', 'ES'])
+    parser.add_argument('--page-size', type=int, default=2000)
+    parser.add_argument('--port', type=int, default=8799)
+    args = parser.parse_args()
+
+    process, url = start_mock(args.pois, args.countries, args.port)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_file, json_file = os.path.join(tmp, 's.csv'), os.path.join(tmp, 's.json')
+
+            def list_pipeline():
+                pois = fetch_pois(args.countries, base_url=url, page_size=args.page_size)
+                stations.save_data(stations.process_stations(pois), csv_file, json_file)
+
+            def stream_pipeline():
+                pois = iter_pois(args.countries, base_url=url, page_size=args.page_size)
+                stations.save_data_streaming(stations.iter_processed_stations(pois), csv_file, json_file)
+
+            results = [('list', *measure(list_pipeline)), ('stream', *measure(stream_pipeline))]
+    finally:
+        process.kill()
+
+    print(f"\n{'pipeline':>9} {'time (s)':>9} {'peak MB':>9}")
+    for name, elapsed, peak in results:
+        print(f'{name:>9} {elapsed:9.2f} {peak:9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+# Rough bounding box of mainland Portugal
+LAT_RANGE = (37.0, 42.1)
+LON_RANGE = (-9.4, -6.3)
+
+CITIES = ['Lisboa', 'Porto', 'Braga', 'Coimbra', 'Faro', 'Aveiro', 'Leiria',
+          'Setúbal', 'Évora', 'Viseu', 'Oeiras', 'Cascais', 'Sintra', None]
+OPERATORS = ['Mobi.E', 'Tesla', 'Ionity', 'Galp', 'EDP', None]
+CONNECTOR_POWERS = np.array([3.7, 7.4, 11.0, 22.0, 50.0, 150.0, 350.0])
+
+
+# Function to generate a station table shaped like load_data() output
+def make_stations(n, seed=0):
+    rng = np.random.default_rng(seed)
+    num_points = rng.integers(1, 9, size=n)
+    total_power = rng.choice(CONNECTOR_POWERS, size=n) * num_points
+    df = pd.DataFrame({
+        'ID': np.arange(1, n + 1),
+        'Nome': [f'Station {i}' for i in range(1, n + 1)],
+        'Operador': rng.choice(np.array(OPERATORS, dtype=object), size=n),
+        'Endereço': [f'Rua {i}' for i in range(1, n + 1)],
+        'Cidade': rng.choice(np.array(CITIES, dtype=object), size=n),
+        'Código Postal': [f'{1000 + i % 8000}-{i % 1000:03d}' for i in range(n)],
+        'Latitude': rng.uniform(*LAT_RANGE, size=n),
+        'Longitude': rng.uniform(*LON_RANGE, size=n),
+        'Número de Pontos': num_points,
+        'Potência Total (kW)': total_power,
+        'Data Atualização': '2025-04-01 12:00:00',
+    })
+    df['Potência por Ponto (kW)'] = df['Potência Total (kW)'] / df['Número de Pontos']
+    df['Operador'] = df['Operador'].fillna('Unknown')
+    return df
+
+
+# Country boxes (south, west, north, east) and ISO codes used for synthetic POIs
+POI_COUNTRY_BOXES = {
+    'PT': (37.0, -9.4, 42.1, -6.3),
+    'ES': (36.2, -9.2, 43.7, 3.2),
+    'FR': (43.0, -4.5, 51.0, 7.5),
+}
+
+# (ConnectionTypeID, CurrentTypeID, PowerKW) combinations seen in OpenChargeMap data:
+# Type 2 AC at 3.7-22 kW, CCS / CHAdeMO DC at 50-350 kW
+CONNECTOR_TYPES = [
+    (25, 20, 3.7), (25, 20, 7.4), (25, 20, 11.0), (25, 20, 22.0),
+    (33, 30, 50.0), (33, 30, 150.0), (33, 30, 350.0), (2, 30, 50.0),
+]
+
+
+# Function to generate n OpenChargeMap-shaped POIs (compact output) spread over countries
+def make_pois(n, seed=0, countries=('PT',)):
+    rng = np.random.default_rng(seed)
+    country_codes = rng.choice(np.array(countries), size=n)
+    towns = rng.choice(np.array([c or '' for c in CITIES], dtype=object), size=n)
+    connection_counts = rng.integers(0, 7, size=n)
+    connector_choice = rng.integers(0, len(CONNECTOR_TYPES), size=n)
+    quantities = rng.integers(1, 3, size=n)
+    status_days = rng.integers(0, 3650, size=n)
+    lat_u, lon_u = rng.random(n), rng.random(n)
+
+    pois = []
+    for i in range(n):
+        south, west, north, east = POI_COUNTRY_BOXES.get(country_codes[i], POI_COUNTRY_BOXES['PT'])
+        connection_type, current_type, power = CONNECTOR_TYPES[connector_choice[i]]
+        updated = pd.Timestamp('2015-01-01') + pd.Timedelta(days=int(status_days[i]))
+        pois.append({
+            'ID': i + 1,
+            'UUID': f'00000000-0000-0000-0000-{i + 1:012d}',
+            'DataProviderID': 1,
+            'OperatorID': int(rng.integers(1, 50)),
+            'UsageTypeID': 1,
+            'AddressInfo': {
+                'ID': i + 1,
+                'Title': f'Station {i + 1}',
+                'AddressLine1': f'Rua {i + 1}',
+                'Town': towns[i] or None,
+                'Postcode': f'{1000 + i % 8000}-{i % 1000:03d}',
+                'CountryID': 177,
+                'Latitude': round(south + lat_u[i] * (north - south), 6),
+                'Longitude': round(west + lon_u[i] * (east - west), 6),
+                'DistanceUnit': 0,
+            },
+            'Connections': [
+                {
+                    'ID': (i + 1) * 10 + c,
+                    'ConnectionTypeID': connection_type,
+                    'StatusTypeID': 50,
+                    'LevelID': 3 if current_type == 30 else 2,
+                    'PowerKW': power,
+                    'CurrentTypeID': current_type,
+                    'Quantity': int(quantities[i]),
+                }
+                for c in range(connection_counts[i])
+            ],
+            'NumberOfPoints': int(connection_counts[i] * quantities[i]),
+            'StatusTypeID': 50,
+            'DateLastStatusUpdate': updated.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'SubmissionStatusTypeID': 200,
+            'DateCreated': '2015-01-01T00:00:00Z',
+            '_CountryCode': str(country_codes[i]),
+        })
+    return pois
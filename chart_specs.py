@@ -0,0 +1,71 @@
+import altair as alt
+
+# Display order of the charging points categories on the distribution chart
+POINTS_ORDER = ['1 point', '2 points', '3-4 points', '5+ points']
+
+
+# Function to turn an Altair chart into its Vega-Lite spec (data inline, as JSON records),
+# without Altair's default width/height, which Streamlit also drops
+def to_spec(chart):
+    with alt.themes.enable('none'):
+        return chart.to_dict()
+
+
+# Function to build the Vega-Lite specs of the Detailed Charts for one filter combination,
+# from the analytics cube; a chart without enough data is None
+def detailed_chart_specs(cube, filter_key, color):
+    specs = dict.fromkeys(['top_cities', 'points', 'avg_power', 'power', 'ppp'])
+
+    top_cities = cube.counts_by('Cidade', *filter_key).nlargest(5)
+    top_cities = top_cities[top_cities > 0]
+    if not top_cities.empty:
+        specs['top_cities'] = to_spec(alt.Chart(top_cities.reset_index()).mark_bar().encode(
+            x=alt.X('count', title='Stations'),
+            y=alt.Y('Cidade', sort='-x', title=None),
+            tooltip=['Cidade', 'count'],
+            color=alt.value(color)
+        ).properties(height=200))
+
+    points_dist = cube.counts_by('Charging Points Category', *filter_key)
+    points_dist = points_dist[points_dist > 0]
+    if not points_dist.empty:
+        specs['points'] = to_spec(alt.Chart(points_dist.reset_index()).mark_bar().encode(
+            x=alt.X('count', title='Stations'),
+            y=alt.Y('Charging Points Category', sort=POINTS_ORDER, title='Points per Station'),
+            tooltip=['Charging Points Category', 'count'],
+            color=alt.value(color)
+        ).properties(height=200))
+
+    # Average power for each number of points
+    avg_power_by_points = cube.avg_power_by_points(*filter_key)
+    if not avg_power_by_points.empty and avg_power_by_points['Número de Pontos'].nunique() > 1:
+        specs['avg_power'] = to_spec(alt.Chart(avg_power_by_points).mark_line(point=True).encode(
+            x=alt.X('Número de Pontos', title='Number of Points', scale=alt.Scale(zero=False)),
+            y=alt.Y('Average Total Power (kW)', title='Avg. Total Power (kW)', scale=alt.Scale(zero=False)),
+            tooltip=['Número de Pontos', alt.Tooltip('Average Total Power (kW)', format='.2f')]
+        ).properties(
+            height=430 # Match height of the column
+        ))
+
+    power_dist = cube.counts_by('Power Range', *filter_key)
+    if not power_dist.empty:
+        specs['power'] = to_spec(alt.Chart(power_dist.reset_index()).mark_bar().encode(
+            x=alt.X('Power Range', title='Total Power (kW)'),
+            y=alt.Y('count', title='Stations'),
+            tooltip=['Power Range', 'count'],
+            color=alt.value(color)
+        ).properties(height=200))
+
+    # Pre-binned by the cube, with the bins Altair would pick for maxbins=20
+    ppp_bins = cube.ppp_histogram(*filter_key, maxbins=20)
+    if not ppp_bins.empty:
+        specs['ppp'] = to_spec(alt.Chart(ppp_bins).mark_bar().encode(
+            alt.X('bin_start', bin='binned', title="Power per Point (kW)"),
+            alt.X2('bin_end'),
+            alt.Y('count', title='Number of Stations'),
+            tooltip=[alt.Tooltip('count', title="Stations"),
+                     alt.Tooltip('bin_start', title="From (kW)"), alt.Tooltip('bin_end', title="To (kW)")],
+            color=alt.value(color)
+        ).properties(height=200))
+
+    return specs
@@ -0,0 +1,201 @@
+import json
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Gazetteer of the Portuguese municipalities (name, district, aliases), shipped next to this module
+GAZETTEER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'municipalities_pt.json')
+
+# Portuguese postcode (CP4-CP3); the CP4 prefix is what locates the municipality
+POSTCODE_PATTERN = re.compile(r'\s*(\d{4})(?:\s*-\s*\d{3})?\s*')
+# Side of the coordinate cells used as the last fallback (~5 km)
+CELL_DEGREES = 0.05
+# A postcode prefix or cell is only learned from at least MIN_SUPPORT stations whose
+# city name resolved, at least MIN_AGREEMENT of them in the same municipality
+MIN_SUPPORT = 3
+MIN_AGREEMENT = 0.8
+
+# Abbreviations expanded word by word ('S. João' -> 'sao joao', 'V.N. Gaia' -> 'vila nova gaia')
+ABBREVIATIONS = {'s': 'sao', 'sto': 'santo', 'sta': 'santa', 'v': 'vila', 'n': 'nova', 'sr': 'senhor', 'sra': 'senhora'}
+# Linking words left out of the short keys ('Ponte de Lima' also matches 'ponte lima')
+PARTICLES = {'de', 'da', 'do', 'das', 'dos', 'e', 'a', 'o'}
+
+# Separators between the parts of a city field ('Lisboa - Parque das Nações', 'Arcozelo, Gaia');
+# a hyphen only separates when spaced, so 'Idanha-a-Nova' stays whole
+_SEGMENT_SEPARATORS = re.compile(r'\s+-\s+|[,;/|()\[\]]')
+_NUMBERS = re.compile(r'\d+')
+_NON_WORD = re.compile(r'[^a-z]+')
+
+
+# Function to build the str.translate table that strips accents from Latin letters
+def _accent_table():
+    table = {}
+    for code in range(0xC0, 0x250):
+        base = ''.join(c for c in unicodedata.normalize('NFD', chr(code)) if unicodedata.category(c) != 'Mn')
+        if base and base != chr(code):
+            table[code] = base
+    return str.maketrans(table)
+
+
+_ACCENTS = _accent_table()
+
+
+# Function to reduce a city spelling to its lookup key: no accents, case, digits
+# or punctuation, abbreviations expanded ('V.N. de Gaia 4400' -> 'vila nova de gaia')
+def city_key(name):
+    words = _NON_WORD.sub(' ', _NUMBERS.sub(' ', str(name).lower().translate(_ACCENTS))).split()
+    return ' '.join(ABBREVIATIONS.get(word, word) for word in words)
+
+
+# Function to get the shorter keys a spelling also matches: without particles and without spaces
+def _short_keys(key):
+    short = ' '.join(word for word in key.split() if word not in PARTICLES)
+    return [short, key.replace(' ', ''), short.replace(' ', '')]
+
+
+# Function to capitalize each word of a name the gazetteer does not know (accents kept,
+# linking words in lower case: 'QUINTA DO CONDE' -> 'Quinta do Conde')
+def title_case(name):
+    words = str(name).split()
+    return ' '.join(word.lower() if i and word.lower() in PARTICLES else word.capitalize()
+                    for i, word in enumerate(words))
+
+
+class CityResolver:
+    """Canonical municipality names from free-text city fields.
+
+    Every name and alias of the gazetteer is reduced to its keys (see city_key)
+    once, into a lookup table; a city field then resolves with a few dictionary
+    lookups, for the whole field or, failing that, for each of its parts.
+    Only whole keys match, so a name is never found inside an unrelated one.
+    """
+
+    def __init__(self, municipalities):
+        self.municipalities = municipalities
+        self.names = sorted({entry['name'] for entry in municipalities})
+        self.districts = {}
+        for entry in municipalities:
+            self.districts.setdefault(entry['name'], set()).add(entry.get('district'))
+
+        table = {}
+        spellings = [(entry['name'], spelling) for entry in municipalities
+                     for spelling in [entry['name']] + entry.get('aliases', [])]
+        for name, spelling in spellings:
+            table.setdefault(city_key(spelling), name)
+        # Shorter keys only where they do not clash with a full key or point to two municipalities
+        short = {}
+        for name, spelling in spellings:
+            for key in _short_keys(city_key(spelling)):
+                if key and key not in table:
+                    short.setdefault(key, set()).add(name)
+        table.update({key: names.pop() for key, names in short.items() if len(names) == 1})
+        self._table = table
+        self._matches = {}
+
+    @classmethod
+    def from_file(cls, path=GAZETTEER_FILE):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f)['municipalities'])
+
+    def _lookup(self, text):
+        key = city_key(text)
+        if not key:
+            return None
+        match = self._table.get(key)
+        if match is None:
+            compact = key.replace(' ', '')
+            match = self._table.get(compact)
+        return match
+
+    def match(self, city):
+        """Gazetteer name of a city spelling, or None if it is not a known municipality (memoized)."""
+        if city is None or (isinstance(city, float) and np.isnan(city)):
+            return None
+        try:
+            return self._matches[city]
+        except KeyError:
+            pass
+        match = self._lookup(city)
+        if match is None:
+            for part in _SEGMENT_SEPARATORS.split(str(city)):
+                match = self._lookup(part)
+                if match is not None:
+                    break
+        self._matches[city] = match
+        return match
+
+    def canonical_name(self, city):
+        """Gazetteer name of a city spelling, or the spelling title-cased if it is not known."""
+        return self.match(city) or title_case(city)
+
+
+# Function to get the resolver for the bundled gazetteer (loaded once per process)
+@lru_cache(maxsize=None)
+def default_resolver():
+    return CityResolver.from_file(GAZETTEER_FILE)
+
+
+# Function to learn which municipality a key (postcode prefix or cell) stands for, from
+# the rows whose name resolved; keys with too few rows or no clear majority are left out
+def _learn(keys, names):
+    known = pd.DataFrame({'key': keys, 'name': names}).dropna()
+    if known.empty:
+        return {}
+    counts = known.groupby(['key', 'name'], sort=False).size().rename('stations').reset_index()
+    totals = counts.groupby('key')['stations'].transform('sum')
+    # MIN_AGREEMENT is above one half, so at most one municipality per key passes
+    counts = counts[(totals >= MIN_SUPPORT) & (counts['stations'] >= MIN_AGREEMENT * totals)]
+    return dict(zip(counts['key'], counts['name']))
+
+
+# Function to get the coordinate cell of each station (NaN coordinates give no cell)
+def coordinate_cells(lats, lons, cell_degrees=CELL_DEGREES):
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    with np.errstate(invalid='ignore'):
+        rows = np.floor(lats / cell_degrees)
+        cols = np.floor(lons / cell_degrees)
+    cells = pd.Series((rows + 90 / cell_degrees) * (720 / cell_degrees) + (cols + 360 / cell_degrees))
+    return cells.where(np.isfinite(cells))
+
+
+# Function to get the CP4 prefix of each postcode (None when it is not a Portuguese postcode)
+def postcode_prefixes(postcodes):
+    matches = (POSTCODE_PATTERN.fullmatch(code) if isinstance(code, str) else None for code in postcodes)
+    return pd.Series([match.group(1) if match else None for match in matches], dtype=object)
+
+
+# Function to canonicalize a whole city column, in order: the gazetteer name the spelling
+# matches; the municipality its postcode prefix, then its ~5 km coordinate cell, points to
+# (learned from the stations of the same dataset whose name matched); the spelling
+# title-cased, spelled like the most common variant of its key; None if nothing is known
+def canonical_cities(cities, postcodes=None, lats=None, lons=None, resolver=None):
+    resolver = resolver or default_resolver()
+    cities = pd.Series(cities, dtype=object).reset_index(drop=True)
+    uniques = cities.dropna().unique()
+    names = cities.map({city: resolver.match(city) for city in uniques})
+
+    fallbacks = []
+    if postcodes is not None:
+        fallbacks.append(lambda: postcode_prefixes(postcodes))
+    if lats is not None and lons is not None:
+        fallbacks.append(lambda: coordinate_cells(lats, lons))
+    learned_from = names.copy()
+    for fallback_keys in fallbacks:
+        missing = names.isna()
+        if missing.any():
+            keys = fallback_keys()
+            names[missing] = keys[missing].map(_learn(keys, learned_from))
+
+    unknown = names.isna() & cities.notna()
+    if unknown.any():
+        titled = cities[unknown].map({city: title_case(city) for city in cities[unknown].unique()})
+        titled = titled[titled != '']
+        keys = titled.map({title: city_key(title) for title in titled.unique()})
+        spelling = titled.groupby(keys).agg(lambda values: values.value_counts().index[0])
+        names[titled.index] = keys.map(spelling)
+    return names.where(names.notna(), None)
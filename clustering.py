@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+TILE_SIZE = 256  # Web Mercator tile size in pixels
+CELL_PX = 60     # Grid cell size in screen pixels (about one cluster bubble)
+MIN_ZOOM = 0
+MAX_ZOOM = 18
+
+
+# Function to project coordinates to global Web Mercator pixel coordinates at a zoom level
+def lonlat_to_pixels(lat, lon, zoom):
+    scale = TILE_SIZE * 2.0 ** zoom
+    lat = np.clip(np.asarray(lat, dtype=float), -85.05112878, 85.05112878)
+    sin_lat = np.sin(np.radians(lat))
+    x = (np.asarray(lon, dtype=float) + 180.0) / 360.0 * scale
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * scale
+    return x, y
+
+
+# Function to convert global pixel coordinates back to (lat, lon)
+def pixels_to_lonlat(x, y, zoom):
+    scale = TILE_SIZE * 2.0 ** zoom
+    lon = np.asarray(x, dtype=float) / scale * 360.0 - 180.0
+    n = np.pi - 2.0 * np.pi * np.asarray(y, dtype=float) / scale
+    lat = np.degrees(np.arctan(np.sinh(n)))
+    return lat, lon
+
+
+# Function to approximate the map bounds shown for a center/zoom in a viewport of the given size
+def bounds_for_view(center_lat, center_lon, zoom, width_px=1200, height_px=700):
+    x, y = lonlat_to_pixels(center_lat, center_lon, zoom)
+    south, west = pixels_to_lonlat(x - width_px / 2, y + height_px / 2, zoom)
+    north, east = pixels_to_lonlat(x + width_px / 2, y - height_px / 2, zoom)
+    return [[float(south), float(west)], [float(north), float(east)]]
+
+
+class GridClusterIndex:
+    """Grid clusters for every zoom level, built bottom-up from MAX_ZOOM.
+
+    At each zoom the map is cut into CELL_PX-pixel cells; a cell's parent one
+    level up is (cx >> 1, cy >> 1), so each level is aggregated from the one
+    below. Cells are stored sorted by (cx, cy) so a viewport query only scans
+    the columns of cells it covers.
+    """
+
+    def __init__(self, lat, lon, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.n_points = len(lat)
+        self.levels = {}
+
+        x, y = lonlat_to_pixels(lat, lon, max_zoom)
+        cx = (x // CELL_PX).astype(np.int64)
+        cy = (y // CELL_PX).astype(np.int64)
+        count = np.ones(len(lat))
+        sum_lat, sum_lon = lat, lon
+        row = np.arange(len(lat))
+
+        for zoom in range(max_zoom, min_zoom - 1, -1):
+            keys, inverse = np.unique((cx << 32) | cy, return_inverse=True)
+            count = np.bincount(inverse, weights=count, minlength=len(keys))
+            sum_lat = np.bincount(inverse, weights=sum_lat, minlength=len(keys))
+            sum_lon = np.bincount(inverse, weights=sum_lon, minlength=len(keys))
+            # Row of the station for single-station cells (-1 once a cell holds several)
+            cell_row = np.full(len(keys), -1, dtype=np.int64)
+            cell_row[inverse] = row
+            cell_row[count > 1] = -1
+
+            self.levels[zoom] = {
+                'keys': keys,
+                'lat': sum_lat / count,
+                'lon': sum_lon / count,
+                'count': count.astype(np.int64),
+                'row': cell_row,
+            }
+            cx, cy, row = (keys >> 32) >> 1, (keys & 0xFFFFFFFF) >> 1, cell_row
+
+    def query(self, bounds, zoom):
+        """Clusters and single stations inside bounds [[south, west], [north, east]] at a zoom level.
+
+        Returns (clusters, rows): a DataFrame of cluster centroids with their
+        station counts, and the positions of stations shown on their own.
+        """
+        zoom = int(min(max(round(zoom), self.min_zoom), self.max_zoom))
+        level = self.levels[zoom]
+        (south, west), (north, east) = bounds
+        x0, y0 = lonlat_to_pixels(north, west, zoom)
+        x1, y1 = lonlat_to_pixels(south, east, zoom)
+        cx0, cx1 = int(x0 // CELL_PX), int(x1 // CELL_PX)
+        cy0, cy1 = int(y0 // CELL_PX), int(y1 // CELL_PX)
+
+        keys = level['keys']
+        start = np.searchsorted(keys, cx0 << 32)
+        stop = np.searchsorted(keys, (cx1 + 1) << 32)
+        cell_y = keys[start:stop] & 0xFFFFFFFF
+        selected = start + np.flatnonzero((cell_y >= cy0) & (cell_y <= cy1))
+
+        single = level['row'][selected] >= 0
+        rows = level['row'][selected[single]]
+        multi = selected[~single]
+        clusters = pd.DataFrame({
+            'lat': level['lat'][multi],
+            'lon': level['lon'][multi],
+            'count': level['count'][multi],
+        })
+        return clusters, rows
+
+
+# Function to convert Leaflet bounds as returned by st_folium
+# ({'_southWest': {'lat', 'lng'}, '_northEast': {...}}) to [[south, west], [north, east]]
+def parse_leaflet_bounds(bounds):
+    try:
+        south_west, north_east = bounds['_southWest'], bounds['_northEast']
+        parsed = [[south_west['lat'], south_west['lng']], [north_east['lat'], north_east['lng']]]
+    except (KeyError, TypeError):
+        return None
+    if any(value is None for corner in parsed for value in corner):
+        return None
+    # Leaflet reports longitudes beyond +-180 once the world wraps
+    parsed[0][1] = max(parsed[0][1], -180.0)
+    parsed[1][1] = min(parsed[1][1], 180.0)
+    return parsed
@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+
+# OpenChargeMap ConnectionTypeID -> connector type (the compact API output only carries the ids)
+CONNECTION_TYPES = {
+    0: 'Unknown',
+    1: 'Type 1 (J1772)',
+    2: 'CHAdeMO',
+    8: 'Tesla (Roadster)',
+    25: 'Type 2 (Socket Only)',
+    27: 'Tesla Supercharger',
+    28: 'CEE 7/4 - Schuko',
+    30: 'Tesla (Model S/X)',
+    32: 'CCS (Type 1)',
+    33: 'CCS (Type 2)',
+    1036: 'Type 2 (Tethered Connector)',
+}
+# OpenChargeMap CurrentTypeID -> current
+CURRENT_TYPES = {10: 'AC (Single-Phase)', 20: 'AC (Three-Phase)', 30: 'DC'}
+
+# Key of the connector list in the processed station records, and the keys of each connector
+CONNECTORS_KEY = 'Conectores'
+CONNECTOR_COLUMNS = ['ID', 'Tipo', 'Corrente', 'Potência (kW)', 'Quantidade']
+
+# Connector filters of the sidebar: a station matches when any of its connectors has the
+# current, the minimum power and one of the types given (at most 8, one bit each in the flags)
+CONNECTOR_FILTERS = {
+    'DC ≥ 50 kW': {'current': 'DC', 'min_power': 50},
+    'DC ≥ 150 kW': {'current': 'DC', 'min_power': 150},
+    'CCS': {'types': ['CCS (Type 1)', 'CCS (Type 2)']},
+    'CHAdeMO': {'types': ['CHAdeMO']},
+    'Type 2': {'types': ['Type 2 (Socket Only)', 'Type 2 (Tethered Connector)']},
+}
+CONNECTOR_OPTIONS = list(CONNECTOR_FILTERS)
+
+
+# Function to turn an OpenChargeMap Connections list into connector records
+def connector_records(connections):
+    return [{
+        'Tipo': CONNECTION_TYPES.get(conn.get('ConnectionTypeID'), 'Other'),
+        'Corrente': CURRENT_TYPES.get(conn.get('CurrentTypeID')),
+        'Potência (kW)': conn.get('PowerKW'),
+        'Quantidade': conn.get('Quantity') or 1,
+    } for conn in connections or []]
+
+
+# Function to get the bit of each connector filter, OR-ed over a selection (0 = no filter)
+def connector_bits(selected):
+    return sum(1 << CONNECTOR_OPTIONS.index(label) for label in set(selected or ()))
+
+
+# Function to build the SQL predicate of a connector filter over the connectors table
+def connector_sql(label):
+    spec = CONNECTOR_FILTERS[label]
+    clauses = []
+    if 'current' in spec:
+        clauses.append(f"corrente = '{spec['current']}'")
+    if 'min_power' in spec:
+        clauses.append(f"potencia_kw >= {spec['min_power']}")
+    if 'types' in spec:
+        clauses.append(f"tipo IN ({', '.join(repr(value) for value in spec['types'])})")
+    return '(' + ' AND '.join(clauses) + ')'
+
+
+class ConnectorTable:
+    """Connectors of all stations (stations 1:N connectors) as columns, sorted by
+    station id, with the row range of each station.
+
+    Per-station aggregates (max DC power, count of CCS >= 150 kW, ...) are
+    computed for every station at once with reduceat/bincount over a connector
+    mask, and looked up by station id with a binary search.
+    """
+
+    def __init__(self, frame):
+        frame = frame.sort_values('ID', kind='stable')
+        self.n_connectors = len(frame)
+        ids = frame['ID'].to_numpy(dtype=np.int64)
+        self.station_ids, starts = np.unique(ids, return_index=True)
+        self._starts = starts.astype(np.int64)
+        self._owner = np.repeat(np.arange(len(self.station_ids)), np.diff(np.append(self._starts, len(ids))))
+        self.types = pd.Categorical(frame['Tipo'])
+        self.currents = pd.Categorical(frame['Corrente'])
+        self.power = pd.to_numeric(frame['Potência (kW)'], errors='coerce').to_numpy(dtype=np.float32)
+        self.quantity = pd.to_numeric(frame['Quantidade'], errors='coerce').fillna(1).to_numpy(dtype=np.int32)
+
+    @classmethod
+    def from_records(cls, records):
+        """Connector table from processed station records (their CONNECTORS_KEY lists)."""
+        rows = [(record.get('ID'), conn.get('Tipo'), conn.get('Corrente'), conn.get('Potência (kW)'),
+                 conn.get('Quantidade'))
+                for record in records if record.get('ID') is not None
+                for conn in record.get(CONNECTORS_KEY) or ()]
+        return cls(pd.DataFrame(rows, columns=CONNECTOR_COLUMNS))
+
+    def to_frame(self):
+        """One row per connector, in the CONNECTOR_COLUMNS layout."""
+        return pd.DataFrame({
+            'ID': self.station_ids[self._owner],
+            'Tipo': self.types,
+            'Corrente': self.currents,
+            'Potência (kW)': self.power,
+            'Quantidade': self.quantity,
+        })
+
+    def matches(self, current=None, min_power=None, types=None):
+        """Boolean mask over connectors: the given current, at least min_power kW, one of the types."""
+        mask = np.ones(self.n_connectors, dtype=bool)
+        if current is not None:
+            mask &= np.asarray(self.currents == current)
+        if min_power is not None:
+            mask &= self.power >= min_power
+        if types is not None:
+            mask &= np.asarray(self.types.isin(types))
+        return mask
+
+    # Function to get the position of each station id in station_ids (-1 without connectors)
+    def _positions(self, station_ids):
+        station_ids = np.asarray(station_ids, dtype=np.int64)
+        if not len(self.station_ids):
+            return np.full(len(station_ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.station_ids, station_ids), len(self.station_ids) - 1)
+        return np.where(self.station_ids[positions] == station_ids, positions, -1)
+
+    # Function to pick per-station values (one per station_ids entry, default for unknown ids)
+    def _lookup(self, values, station_ids, default):
+        positions = self._positions(station_ids)
+        result = np.full(len(positions), default, dtype=np.asarray(values).dtype)
+        result[positions >= 0] = values[positions[positions >= 0]]
+        return result
+
+    def count(self, station_ids, current=None, min_power=None, types=None):
+        """Connectors (times their quantity) matching the conditions, per station."""
+        mask = self.matches(current, min_power, types)
+        counts = np.bincount(self._owner[mask], weights=self.quantity[mask], minlength=len(self.station_ids))
+        return self._lookup(counts.astype(np.int64), station_ids, 0)
+
+    def max_power(self, station_ids, current=None, types=None):
+        """Highest power (kW) among the station's connectors matching the conditions; NaN if none."""
+        if not self.n_connectors:
+            return np.full(len(station_ids), np.nan)
+        power = np.where(self.matches(current, None, types) & ~np.isnan(self.power), self.power, -np.inf)
+        best = np.maximum.reduceat(power.astype(float), self._starts)
+        return self._lookup(np.where(np.isinf(best), np.nan, best), station_ids, np.nan)
+
+    def has(self, station_ids, current=None, min_power=None, types=None):
+        """Whether each station has at least one connector matching the conditions."""
+        return self.count(station_ids, current, min_power, types) > 0
+
+    def flags(self, station_ids):
+        """Bitmask of the CONNECTOR_FILTERS each station matches (see connector_bits)."""
+        flags = np.zeros(len(station_ids), dtype=np.uint8)
+        for bit, spec in enumerate(CONNECTOR_FILTERS.values()):
+            flags |= (self.has(station_ids, **spec).astype(np.uint8) << bit)
+        return flags
@@ -0,0 +1,114 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from connectors import connector_bits
+from spatial_index import KM_PER_DEGREE, StationSpatialIndex
+
+# Distance from the centre of a hexagon to its corners (km): ~10 km² per cell, ~9,000 cells on the mainland
+HEX_RADIUS_KM = 2.0
+# Box covered by the grid (south, west, north, east): mainland Portugal
+COVERAGE_BOUNDS = (36.9, -9.6, 42.2, -6.1)
+# Power (kW) from which a station counts as fast charging: per point, or of a DC connector
+FAST_KW = 50
+FAST_CONNECTORS = ['DC ≥ 50 kW']
+
+# Simplified outline of mainland Portugal (lon, lat; within a few km), which keeps the sea
+# and Spain out of the grid
+MAINLAND_OUTLINE = [
+    (-8.87, 41.87), (-8.64, 42.03), (-8.48, 42.08), (-8.20, 42.15), (-8.13, 41.81), (-7.90, 41.91),
+    (-7.70, 41.92), (-7.42, 41.88), (-6.95, 41.95), (-6.60, 41.97), (-6.53, 41.68), (-6.19, 41.58),
+    (-6.27, 41.49), (-6.50, 41.27), (-6.93, 41.02), (-6.80, 40.85), (-6.83, 40.50), (-6.95, 40.25),
+    (-6.88, 40.05), (-7.01, 39.67), (-7.53, 39.67), (-7.23, 39.45), (-7.05, 39.05), (-7.20, 38.75),
+    (-7.32, 38.45), (-6.95, 38.15), (-7.18, 38.00), (-7.52, 37.55), (-7.41, 37.17), (-7.65, 37.10),
+    (-7.90, 36.96), (-8.25, 37.08), (-8.54, 37.12), (-8.68, 37.08), (-8.99, 37.02), (-8.82, 37.40),
+    (-8.80, 37.73), (-8.88, 37.95), (-8.78, 38.38), (-8.90, 38.48), (-9.22, 38.42), (-9.23, 38.66),
+    (-9.42, 38.70), (-9.50, 38.78), (-9.42, 39.05), (-9.41, 39.36), (-9.07, 39.60), (-8.87, 40.15),
+    (-8.75, 40.64), (-8.68, 41.15), (-8.78, 41.50),
+]
+
+# Columns of the coverage table
+COVERAGE_COLUMNS = ['Latitude', 'Longitude', 'Nearest station (km)', 'Nearest ≥50 kW station (km)']
+
+
+# Function to lay a hexagonal grid (pointy-top, every other row shifted by half a cell) over a
+# box: the centres of cells of radius_km, on a projection true to scale at the box's mid latitude
+def hex_grid(bounds=COVERAGE_BOUNDS, radius_km=HEX_RADIUS_KM):
+    south, west, north, east = bounds
+    scale = np.cos(np.radians((south + north) / 2))
+    row_step = 1.5 * radius_km / KM_PER_DEGREE
+    col_step = np.sqrt(3) * radius_km / (KM_PER_DEGREE * scale)
+    rows = np.arange(int(np.ceil((north - south) / row_step)) + 1)
+    cols = np.arange(int(np.ceil((east - west) / col_step)) + 1)
+    row, col = np.repeat(rows, len(cols)), np.tile(cols, len(rows))
+    return south + row * row_step, west + (col + (row % 2) / 2) * col_step
+
+
+# Function to test which points (lat, lon) lie inside a polygon given as a list of (lon, lat)
+# vertices: even-odd ray casting, all points against all edges at once
+def inside_polygon(lats, lons, polygon):
+    ring = np.asarray(polygon, dtype=float)
+    x1, y1 = ring[:, 0], ring[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    x, y = np.asarray(lons, dtype=float)[:, None], np.asarray(lats, dtype=float)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        at = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    crossed = ((y1 > y) != (y2 > y)) & (x < at)
+    return crossed.sum(axis=1) % 2 == 1
+
+
+# Function to get the centres of the grid cells on land (inside the mainland outline); they do
+# not depend on the stations, so they are computed once per process
+@lru_cache(maxsize=2)
+def _land_cells(bounds, radius_km):
+    lat, lon = hex_grid(bounds, radius_km)
+    on_land = inside_polygon(lat, lon, MAINLAND_OUTLINE)
+    return lat[on_land], lon[on_land]
+
+
+def land_cells(bounds=COVERAGE_BOUNDS, radius_km=HEX_RADIUS_KM):
+    return _land_cells(tuple(bounds), radius_km)
+
+
+# Function to mark the stations that count as fast charging (power per point, or DC connectors)
+def fast_charging_mask(df):
+    fast = (df['Potência por Ponto (kW)'].to_numpy(dtype=float) >= FAST_KW)
+    if 'Connector Flags' in df.columns:
+        fast |= (df['Connector Flags'].to_numpy() & connector_bits(FAST_CONNECTORS)) != 0
+    return fast
+
+
+class CoverageGrid:
+    """Distance from every land cell of a hexagonal grid to the nearest station and to the
+    nearest fast (≥ 50 kW) station: where the charging deserts are.
+
+    Built once per dataset version; both distances come from one batched
+    nearest-neighbour pass per station set over StationSpatialIndex.
+    """
+
+    def __init__(self, lat, lon, nearest_km, nearest_fast_km, radius_km=HEX_RADIUS_KM):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.nearest_km = np.asarray(nearest_km, dtype=float)
+        self.nearest_fast_km = np.asarray(nearest_fast_km, dtype=float)
+        self.radius_km = radius_km
+
+    @classmethod
+    def from_frame(cls, df, radius_km=HEX_RADIUS_KM, bounds=COVERAGE_BOUNDS):
+        lat, lon = land_cells(bounds, radius_km)
+        stations = df[df['Latitude'].notna() & df['Longitude'].notna()]
+        index = StationSpatialIndex.from_frame(stations)
+        nearest_km = index.nearest_each(lat, lon)[1]
+        nearest_fast_km = index.nearest_each(lat, lon, where=fast_charging_mask(stations))[1]
+        return cls(lat, lon, nearest_km, nearest_fast_km, radius_km)
+
+    def distances(self, fast=False):
+        return self.nearest_fast_km if fast else self.nearest_km
+
+    def share_beyond(self, km, fast=False):
+        """Share of the land cells farther than km from a (fast) station."""
+        return float(np.mean(self.distances(fast) > km)) if len(self.lat) else 0.0
+
+    def to_frame(self):
+        return pd.DataFrame(dict(zip(COVERAGE_COLUMNS, [self.lat, self.lon, self.nearest_km, self.nearest_fast_km])))
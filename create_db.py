@@ -1,12 +1,40 @@
 import sqlite3
 import json
 import os
+import argparse
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from operator import itemgetter
 import numpy as np # Para lidar com potenciais inf em Potencia por Ponto
+from pandas.util import hash_array
+from city_names import canonical_cities, default_resolver
+from connectors import CONNECTORS_KEY
+from station_data import current_dataset_version, dataset_file
 
 # --- Configuração ---
 JSON_FILE = os.path.join('data', 'postos_carregamento.json')
 DB_FILE = 'charging_stations.db'
 TABLE_NAME = 'stations'
+CHANGES_TABLE = 'station_changes'
+REFRESHES_TABLE = 'refreshes'
+CONNECTORS_TABLE = 'connectors'
+SECONDARY_INDEX_COLUMNS = ['cidade', 'potencia_total_kw', 'numero_pontos', 'latitude']
+BULK_BATCH_SIZE = 50000 # Registos validados/inseridos de cada vez no carregamento em bloco
+STATION_COLUMNS = ['id', 'nome', 'operador', 'endereco', 'cidade', 'cidade_original', 'codigo_postal',
+                   'latitude', 'longitude', 'numero_pontos', 'potencia_total_kw',
+                   'data_atualizacao', 'potencia_por_ponto_kw', 'hash_conteudo']
+# Colunas vindas da descarga que entram no hash do conteúdo (ver station_hashes); a cidade
+# canónica é deduzida por canonicalize_cities e fica fora do hash e das atualizações do upsert
+HASHED_COLUMNS = [column for column in STATION_COLUMNS
+                  if column not in ['id', 'cidade', 'data_atualizacao', 'hash_conteudo']]
+_hashed_fields = itemgetter(*[STATION_COLUMNS.index(column) for column in HASHED_COLUMNS])
+# Tipos com que cada coluna entra no hash (o mesmo valor dá o mesmo hash, seja int ou float)
+HASH_DTYPES = {column: object if column in ('nome', 'operador', 'endereco', 'cidade_original', 'codigo_postal')
+               else np.float64 for column in HASHED_COLUMNS}
+# Os conectores vêm tal como estão no JSON (a potência pode vir como texto), por isso entram todos como objeto
+CONNECTOR_HASH_DTYPES = dict.fromkeys(['tipo', 'corrente', 'potencia_kw', 'quantidade'], object)
+HASH_MULTIPLIER = np.uint64(1_000_003) # Ímpar, para combinar os hashes das colunas sem perder bits
 
 # --- Funções Auxiliares ---
 
@@ -30,21 +58,85 @@ def create_table(conn):
                                         operador TEXT,
                                         endereco TEXT,
                                         cidade TEXT,
+                                        cidade_original TEXT,
                                         codigo_postal TEXT,
                                         latitude REAL NOT NULL,
                                         longitude REAL NOT NULL,
                                         numero_pontos INTEGER,
                                         potencia_total_kw REAL,
                                         data_atualizacao TEXT,
-                                        potencia_por_ponto_kw REAL
+                                        potencia_por_ponto_kw REAL,
+                                        hash_conteudo TEXT,
+                                        removido INTEGER NOT NULL DEFAULT 0,
+                                        removido_em TEXT
+                                    ); """
+    # Registo das atualizações incrementais (refresh_station_data)
+    sql_create_refreshes_table = f""" CREATE TABLE IF NOT EXISTS {REFRESHES_TABLE} (
+                                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                        executado_em TEXT NOT NULL
+                                    ); """
+    # Conectores de cada estação (1:N), com o tipo, a corrente ('DC', 'AC (...)'), a potência e a quantidade
+    sql_create_connectors_table = f""" CREATE TABLE IF NOT EXISTS {CONNECTORS_TABLE} (
+                                        station_id INTEGER NOT NULL,
+                                        tipo TEXT,
+                                        corrente TEXT,
+                                        potencia_kw REAL,
+                                        quantidade INTEGER
+                                    ); """
+    # tipo: 'inserido', 'atualizado', 'removido' ou 'reposto'
+    sql_create_changes_table = f""" CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} (
+                                        refresh_id INTEGER NOT NULL REFERENCES {REFRESHES_TABLE}(id),
+                                        station_id INTEGER NOT NULL,
+                                        tipo TEXT NOT NULL
                                     ); """
     try:
         cursor = conn.cursor()
         cursor.execute(sql_create_stations_table)
+        # Bases de dados criadas antes do hash/remoção lógica/cidade canónica: acrescentar as colunas
+        existing_columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({TABLE_NAME})")}
+        added_columns = []
+        for column, definition in [('hash_conteudo', 'TEXT'),
+                                   ('removido', 'INTEGER NOT NULL DEFAULT 0'),
+                                   ('removido_em', 'TEXT'),
+                                   ('cidade_original', 'TEXT')]:
+            if column not in existing_columns:
+                cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN {column} {definition}")
+                added_columns.append(column)
+        if 'cidade_original' in added_columns:
+            # A cidade guardada até aqui é a original; passa a ser a canónica
+            cursor.execute(f"UPDATE {TABLE_NAME} SET cidade_original = cidade")
+            canonicalize_cities(conn)
+        cursor.execute(sql_create_refreshes_table)
+        cursor.execute(sql_create_changes_table)
+        # Uma alteração por estação e atualização (INSERT OR IGNORE), também para procurar por refresh_id
+        cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{CHANGES_TABLE}_refresh_station "
+                       f"ON {CHANGES_TABLE}(refresh_id, station_id)")
+        cursor.execute(sql_create_connectors_table)
+        create_secondary_indexes(conn)
+        conn.commit()
         print(f"Tabela '{TABLE_NAME}' verificada/criada com sucesso.")
     except sqlite3.Error as e:
         print(f"Erro ao criar a tabela: {e}")
 
+def secondary_indexes():
+    """ Nome, tabela e colunas dos índices secundários das estações e dos conectores """
+    # Índices secundários para os filtros do dashboard (station_db.py) e a pesquisa por proximidade
+    indexes = [(f"idx_{TABLE_NAME}_{column}", TABLE_NAME, column) for column in SECONDARY_INDEX_COLUMNS]
+    # Por estação (agregados, substituição) e por corrente/potência (filtros como "tem DC >= 50 kW")
+    return indexes + [(f"idx_{CONNECTORS_TABLE}_station", CONNECTORS_TABLE, 'station_id'),
+                      (f"idx_{CONNECTORS_TABLE}_corrente_potencia", CONNECTORS_TABLE, 'corrente, potencia_kw'),
+                      (f"idx_{CONNECTORS_TABLE}_tipo", CONNECTORS_TABLE, 'tipo')]
+
+def create_secondary_indexes(conn):
+    """ Cria os índices secundários que faltarem """
+    for name, table, columns in secondary_indexes():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})")
+
+def drop_secondary_indexes(conn):
+    """ Remove os índices secundários (para os recriar de uma vez depois de um carregamento) """
+    for name, _, _ in secondary_indexes():
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+
 def load_json_data(json_path):
     """ Carrega os dados do ficheiro JSON """
     try:
@@ -68,11 +160,20 @@ def insert_station_data(conn, stations_data):
         return
         
     sql_insert = f''' INSERT OR IGNORE INTO {TABLE_NAME}(
-                        id, nome, operador, endereco, cidade, codigo_postal, 
+                        id, nome, operador, endereco, cidade, cidade_original, codigo_postal, 
                         latitude, longitude, numero_pontos, potencia_total_kw, 
-                        data_atualizacao, potencia_por_ponto_kw
-                    ) VALUES(?,?,?,?,?,?,?,?,?,?,?,?) '''
+                        data_atualizacao, potencia_por_ponto_kw, hash_conteudo
+                    ) VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?) '''
     
+    sql_insert_connector = f''' INSERT INTO {CONNECTORS_TABLE}(station_id, tipo, corrente, potencia_kw, quantidade)
+                                VALUES(?,?,?,?,?) '''
+
+    # Hash do conteúdo calculado como no carregamento em bloco, para que a próxima atualização
+    # incremental não dê todas as estações como alteradas (fica o da primeira ocorrência de cada id)
+    rows, _, _ = prepare_station_rows(stations_data)
+    hashes = {row[0]: row[-1] for row in reversed(rows)}
+
+    resolver = default_resolver()
     cursor = conn.cursor()
     inserted_count = 0
     skipped_count = 0
@@ -116,6 +217,7 @@ def insert_station_data(conn, stations_data):
                 station.get('Nome'),
                 station.get('Operador'),
                 station.get('Endereço'),
+                city_name(resolver, station.get('Cidade')),
                 station.get('Cidade'),
                 station.get('Código Postal'),
                 lat,
@@ -123,13 +225,16 @@ def insert_station_data(conn, stations_data):
                 num_pontos,
                 potencia_total,
                 station.get('Data Atualização'),
-                potencia_por_ponto
+                potencia_por_ponto,
+                hashes.get(station_id)
             )
             
             cursor.execute(sql_insert, data_tuple)
             inserted_count += cursor.rowcount # Adiciona 1 se inseriu, 0 se ignorou (ID já existe)
             if cursor.rowcount == 0:
                 skipped_count +=1 # Conta como ignorado se o ID já existia
+            else:
+                cursor.executemany(sql_insert_connector, connector_rows(station_id, station))
 
         except sqlite3.Error as e:
             print(f"Erro ao inserir dados para ID {station.get('ID', 'N/A')}: {e}")
@@ -138,16 +243,298 @@ def insert_station_data(conn, stations_data):
             print(f"Erro inesperado no processamento do registo ID {station.get('ID', 'N/A')}: {e}")
             skipped_count += 1
             
+    canonicalize_cities(conn)
     conn.commit()
     print(f"Inserção concluída. {inserted_count} registos inseridos, {skipped_count} ignorados/com erro.")
 
+# --- Cidades canónicas ---
+
+def city_name(resolver, city):
+    """ Nome provisório da cidade ao inserir: o do gazetteer ou o original em maiúsculas
+    iniciais (canonicalize_cities completa-o depois, com o código postal e as coordenadas) """
+    if city is None or not str(city).strip():
+        return None
+    return resolver.canonical_name(city)
+
+def canonicalize_cities(conn, refresh_id=None):
+    """ Resolve de uma vez a cidade canónica de todas as estações ativas a partir da original,
+    do código postal e das coordenadas (ver city_names.canonical_cities), no fim de cada
+    carregamento registo a registo ou atualização e ao migrar bases de dados antigas (executemany
+    com UPDATE por id, linear no número de estações). Só grava as estações que mudam; com
+    refresh_id regista-as como 'atualizado'. Não faz commit (corre dentro da transação de quem
+    chama). Devolve o número de alteradas. """
+    rows = conn.execute(f''' SELECT id, cidade, cidade_original, codigo_postal, latitude, longitude
+                             FROM {TABLE_NAME} WHERE removido = 0 ''').fetchall()
+    if not rows:
+        return 0
+    ids, cities, original, postcodes, lats, lons = zip(*rows)
+    resolved = canonical_cities(original, postcodes, lats, lons)
+    changed = [(city, station_id) for station_id, old, city in zip(ids, cities, resolved) if old != city]
+    conn.executemany(f"UPDATE {TABLE_NAME} SET cidade = ? WHERE id = ?", changed)
+    if refresh_id is not None:
+        conn.executemany(f"INSERT OR IGNORE INTO {CHANGES_TABLE}(refresh_id, station_id, tipo) VALUES(?, ?, 'atualizado')",
+                         [(refresh_id, station_id) for _, station_id in changed])
+    return len(changed)
+
+# --- Carregamento em bloco ---
+
+def apply_load_pragmas(conn):
+    """ Pragmas para carregamento rápido: WAL, sem fsync durante a carga, cache maior """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-262144") # 256 MB
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+def restore_pragmas(conn):
+    """ Volta a um modo seguro depois da carga (WAL mantém-se) """
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+def hash_columns(columns, dtypes):
+    """ Hash (uint64) de cada linha de um conjunto de colunas: pandas.util.hash_array de cada
+    coluna, com tipos fixos para que o mesmo conteúdo dê sempre o mesmo hash, combinados pela
+    ordem das colunas """
+    hashes = np.zeros(len(columns[0]), dtype=np.uint64)
+    for values, dtype in zip(columns, dtypes):
+        hashes = hashes * HASH_MULTIPLIER ^ hash_array(np.array(values, dtype=dtype))
+    return hashes
+
+def station_hashes(rows, connectors=(), owners=()):
+    """ Hash do conteúdo de cada estação, para detetar alterações: as colunas vindas da descarga
+    (HASHED_COLUMNS) e os conectores (tuplos tipo, corrente, potência, quantidade; owners diz a
+    que linha de rows pertence cada um, pela ordem em que aparecem). Ficam de fora o id, a data
+    de atualização, que get_charging_stations.py muda em cada descarga, e a cidade canónica, que
+    canonicalize_cities deduz. Calculado para o lote inteiro de uma vez, coluna a coluna
+    (ver hash_columns). """
+    if not rows:
+        return []
+    hashes = hash_columns(list(zip(*map(_hashed_fields, rows))), HASH_DTYPES.values())
+    if len(connectors):
+        connector_hashes = hash_columns(list(zip(*connectors)), CONNECTOR_HASH_DTYPES.values())
+        # Soma por estação com um peso ímpar por posição, para que a ordem dos conectores conte
+        owners = np.asarray(owners, dtype=np.int64)
+        first = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        position = np.arange(len(owners)) - np.repeat(first, np.diff(np.r_[first, len(owners)]))
+        per_station = np.zeros(len(rows), dtype=np.uint64)
+        np.add.at(per_station, owners, connector_hashes * (2 * position.astype(np.uint64) + 1))
+        hashes = hashes ^ per_station
+    return [f"{value:016x}" for value in hashes.tolist()]
+
+def connector_rows(station_id, station):
+    """ Tuplos do INSERT na tabela de conectores para os conectores de uma estação """
+    return [(station_id, conn.get('Tipo'), conn.get('Corrente'), conn.get('Potência (kW)'), conn.get('Quantidade'))
+            for conn in station.get(CONNECTORS_KEY) or ()]
+
+def prepare_station_rows(batch):
+    """ Valida e converte um lote de estações para tuplos do INSERT (mesmas regras que
+    insert_station_data), com o hash do conteúdo e a cidade canónica a NULL (ver with_cities).
+    Devolve os tuplos das estações, os dos seus conectores e o número de registos ignorados. """
+    rows = []
+    connectors = []
+    owners = []
+    append = rows.append
+    for station in batch:
+        get = station.get
+        station_id, lat, lon = get('ID'), get('Latitude'), get('Longitude')
+        num_pontos, potencia_total = get('Número de Pontos'), get('Potência Total (kW)')
+        if station_id is None or lat is None or lon is None:
+            continue
+        try:
+            lat = float(lat)
+            lon = float(lon)
+            num_pontos = int(num_pontos) if num_pontos is not None else 0
+            potencia_total = float(potencia_total) if potencia_total is not None else 0.0
+        except (ValueError, TypeError):
+            continue
+
+        # Potência por ponto (None sem pontos ou se der infinito)
+        potencia_por_ponto = potencia_total / num_pontos if num_pontos > 0 else None
+        if potencia_por_ponto in (np.inf, -np.inf):
+            potencia_por_ponto = None
+
+        station_connectors = connector_rows(station_id, station)
+        if station_connectors:
+            owners.extend([len(rows)] * len(station_connectors))
+            connectors.extend(station_connectors)
+        append((station_id, get('Nome'), get('Operador'), get('Endereço'), None, get('Cidade'),
+                get('Código Postal'), lat, lon, num_pontos, potencia_total,
+                get('Data Atualização'), potencia_por_ponto))
+    hashes = station_hashes(rows, [conn[1:] for conn in connectors], owners)
+    rows = [row + (content_hash,) for row, content_hash in zip(rows, hashes)]
+    return rows, connectors, len(batch) - len(rows)
+
+def with_cities(rows):
+    """ Os tuplos de prepare_station_rows com a cidade canónica, resolvida de uma vez para todos a
+    partir da original, do código postal e das coordenadas (ver city_names.canonical_cities) """
+    if not rows:
+        return rows
+    city = STATION_COLUMNS.index('cidade')
+    columns = list(zip(*rows))
+    cities = canonical_cities(*[columns[STATION_COLUMNS.index(column)]
+                                for column in ['cidade_original', 'codigo_postal', 'latitude', 'longitude']])
+    return [row[:city] + (name,) + row[city + 1:] for row, name in zip(rows, cities)]
+
+def bulk_insert_station_data(conn, stations_data, batch_size=BULK_BATCH_SIZE):
+    """ Insere as estações em lotes com executemany, numa única transação. A cidade canónica é
+    resolvida uma só vez para toda a entrada, antes dos lotes, e entra já no INSERT (sem segunda
+    passagem de UPDATE sobre os índices). """
+    sql_insert = f''' INSERT OR IGNORE INTO {TABLE_NAME}({', '.join(STATION_COLUMNS)})
+                    VALUES({', '.join('?' * len(STATION_COLUMNS))}) '''
+
+    # Os conectores só entram para as estações que ainda não os tinham (as ignoradas já existiam)
+    sql_insert_connectors = f''' INSERT INTO {CONNECTORS_TABLE}(station_id, tipo, corrente, potencia_kw, quantidade)
+                                 SELECT * FROM temp.new_connectors
+                                 WHERE station_id NOT IN (SELECT station_id FROM {CONNECTORS_TABLE}) '''
+
+    # Validação e cidades de uma vez para toda a entrada; a inserção vai em lotes de batch_size
+    rows, connectors, invalid_count = prepare_station_rows(stations_data)
+    rows = with_cities(rows)
+
+    apply_load_pragmas(conn)
+    changes_before = conn.total_changes
+    try:
+        conn.execute("BEGIN")
+        # Numa base de dados vazia, os índices secundários são criados de uma vez no fim (mais
+        # rápido do que mantê-los linha a linha durante a carga)
+        empty = conn.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {TABLE_NAME})").fetchone()[0]
+        if empty:
+            drop_secondary_indexes(conn)
+        conn.execute(f"CREATE TEMP TABLE new_connectors AS SELECT station_id, tipo, corrente, potencia_kw, quantidade "
+                     f"FROM {CONNECTORS_TABLE} WHERE 0")
+        for start in range(0, len(rows), batch_size):
+            conn.executemany(sql_insert, rows[start:start + batch_size])
+        conn.executemany("INSERT INTO temp.new_connectors VALUES(?,?,?,?,?)", connectors)
+        inserted_count = conn.total_changes - changes_before - len(connectors)
+        conn.execute(sql_insert_connectors)
+        conn.execute("DROP TABLE temp.new_connectors")
+        if empty:
+            create_secondary_indexes(conn)
+        conn.execute("COMMIT")
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Erro na inserção em bloco (nada foi gravado): {e}")
+        return 0
+    except BaseException:
+        # Erro vindo dos dados (p.ex. a descarga falhou a meio): desfazer e propagar
+        conn.rollback()
+        raise
+    finally:
+        restore_pragmas(conn)
+
+    print(f"Inserção em bloco concluída. {inserted_count} registos inseridos, "
+          f"{len(rows) + invalid_count - inserted_count} ignorados/com erro.")
+    return inserted_count
+
+# --- Atualização incremental ---
+
+def refresh_station_data(conn, stations_data, batch_size=BULK_BATCH_SIZE, full_snapshot=True):
+    """ Atualiza a base de dados a partir dos dados atuais, numa única transação:
+    insere estações novas, atualiza só as que mudaram (hash do conteúdo diferente),
+    marca como removidas as que deixaram de aparecer (só se stations_data for a lista
+    completa) e regista cada alteração em station_changes.
+    Devolve (refresh_id, contagem por tipo) ou None em caso de erro. """
+    columns = ', '.join(STATION_COLUMNS)
+    updates = ', '.join(f"{column} = excluded.{column}" for column in STATION_COLUMNS[1:] if column != 'cidade')
+    sql_stage = f"INSERT OR IGNORE INTO temp.staging({columns}) VALUES({', '.join('?' * len(STATION_COLUMNS))})"
+    # Ordem importa: o registo de alterações compara com o estado anterior à atualização
+    sql_log_upserts = f''' INSERT INTO {CHANGES_TABLE}(refresh_id, station_id, tipo)
+                           SELECT ?, s.id, CASE WHEN t.id IS NULL THEN 'inserido'
+                                                WHEN t.removido = 1 THEN 'reposto'
+                                                ELSE 'atualizado' END
+                           FROM temp.staging s LEFT JOIN {TABLE_NAME} t ON t.id = s.id
+                           WHERE t.id IS NULL OR t.removido = 1 OR t.hash_conteudo IS NOT s.hash_conteudo '''
+    sql_log_removed = f''' INSERT INTO {CHANGES_TABLE}(refresh_id, station_id, tipo)
+                           SELECT ?, id, 'removido' FROM {TABLE_NAME}
+                           WHERE removido = 0 AND id NOT IN (SELECT id FROM temp.staging) '''
+    sql_soft_delete = f''' UPDATE {TABLE_NAME} SET removido = 1, removido_em = ?
+                           WHERE removido = 0 AND id NOT IN (SELECT id FROM temp.staging) '''
+    # Conectores substituídos nas estações inseridas, atualizadas ou repostas nesta atualização
+    sql_delete_connectors = f''' DELETE FROM {CONNECTORS_TABLE} WHERE station_id IN (
+                                     SELECT station_id FROM {CHANGES_TABLE} WHERE refresh_id = ? AND tipo != 'removido') '''
+    sql_insert_connectors = f''' INSERT INTO {CONNECTORS_TABLE}(station_id, tipo, corrente, potencia_kw, quantidade)
+                                 SELECT * FROM temp.staging_connectors WHERE station_id IN (
+                                     SELECT station_id FROM {CHANGES_TABLE} WHERE refresh_id = ? AND tipo != 'removido') '''
+    sql_upsert = f''' INSERT INTO {TABLE_NAME}({columns}, removido, removido_em)
+                      SELECT {columns}, 0, NULL FROM temp.staging WHERE true
+                      ON CONFLICT(id) DO UPDATE SET {updates}, removido = 0, removido_em = NULL
+                      WHERE {TABLE_NAME}.hash_conteudo IS NOT excluded.hash_conteudo
+                         OR {TABLE_NAME}.removido = 1 '''
+
+    refreshed_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    apply_load_pragmas(conn)
+    stations_iter = iter(stations_data)
+    try:
+        conn.execute("BEGIN")
+        conn.execute(f"CREATE TEMP TABLE staging AS SELECT {columns} FROM {TABLE_NAME} WHERE 0")
+        conn.execute("CREATE UNIQUE INDEX temp.idx_staging_id ON staging(id)")
+        conn.execute(f"CREATE TEMP TABLE staging_connectors AS SELECT station_id, tipo, corrente, potencia_kw, "
+                     f"quantidade FROM {CONNECTORS_TABLE} WHERE 0")
+        conn.execute("CREATE INDEX temp.idx_staging_connectors_station ON staging_connectors(station_id)")
+        while True:
+            batch = list(islice(stations_iter, batch_size))
+            if not batch:
+                break
+            rows, connectors, _ = prepare_station_rows(batch)
+            conn.executemany(sql_stage, rows)
+            conn.executemany("INSERT INTO temp.staging_connectors VALUES(?,?,?,?,?)", connectors)
+
+        refresh_id = conn.execute(f"INSERT INTO {REFRESHES_TABLE}(executado_em) VALUES(?)",
+                                  (refreshed_at,)).lastrowid
+        conn.execute(sql_log_upserts, (refresh_id,))
+        if full_snapshot:
+            conn.execute(sql_log_removed, (refresh_id,))
+            conn.execute(sql_soft_delete, (refreshed_at,))
+        conn.execute(sql_upsert)
+        conn.execute(sql_delete_connectors, (refresh_id,))
+        conn.execute(sql_insert_connectors, (refresh_id,))
+        # Cidade canónica de uma vez para todas as estações ativas; as que mudam só por isso
+        # ficam registadas como 'atualizado'
+        canonicalize_cities(conn, refresh_id)
+        conn.execute("DROP TABLE temp.staging")
+        conn.execute("DROP TABLE temp.staging_connectors")
+        conn.execute("COMMIT")
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Erro na atualização incremental (nada foi gravado): {e}")
+        return None
+    except BaseException:
+        # Erro vindo dos dados (p.ex. a descarga falhou a meio): desfazer e propagar
+        conn.rollback()
+        raise
+    finally:
+        restore_pragmas(conn)
+
+    counts = {'inserido': 0, 'atualizado': 0, 'removido': 0, 'reposto': 0}
+    counts.update(conn.execute(f"SELECT tipo, COUNT(*) FROM {CHANGES_TABLE} WHERE refresh_id = ? GROUP BY tipo",
+                               (refresh_id,)).fetchall())
+    print(f"Atualização {refresh_id} concluída: {counts['inserido']} inseridos, {counts['atualizado']} atualizados, "
+          f"{counts['removido']} removidos, {counts['reposto']} repostos.")
+    return refresh_id, counts
+
+def changes_since(conn, refresh_id):
+    """ Estações alteradas depois da atualização refresh_id, com o último tipo de alteração
+    de cada uma ({station_id: tipo}), para invalidar só o que mudou. """
+    rows = conn.execute(f''' SELECT station_id, tipo FROM {CHANGES_TABLE}
+                             WHERE refresh_id > ? ORDER BY refresh_id ''', (refresh_id,))
+    return dict(rows.fetchall())
+
+def latest_refresh_id(conn):
+    """ Id da última atualização incremental (0 se ainda não houve nenhuma) """
+    return conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {REFRESHES_TABLE}").fetchone()[0]
+
 # --- Função Principal ---
 
 def main():
+    parser = argparse.ArgumentParser(description="Cria ou atualiza a base de dados SQLite a partir do JSON dos postos.")
+    parser.add_argument("--row-by-row", action="store_true",
+                        help="usar a inserção registo a registo (só insere estações novas)")
+    parser.add_argument("--insert-only", action="store_true",
+                        help="carregamento em bloco que só insere estações novas, sem atualizar nem remover")
+    args = parser.parse_args()
+
     print("Iniciando processo de criação da base de dados SQLite...")
     
-    # Carregar dados JSON
-    stations_data = load_json_data(JSON_FILE)
+    # Carregar dados JSON (a versão publicada pelo refresh_scheduler.py, se houver)
+    stations_data = load_json_data(dataset_file(current_dataset_version()))
     if not stations_data:
         return # Termina se não conseguiu carregar o JSON
         
@@ -160,7 +547,15 @@ def main():
     create_table(conn)
     
     # Inserir dados
-    insert_station_data(conn, stations_data)
+    start = time.perf_counter()
+    if args.row_by_row:
+        insert_station_data(conn, stations_data)
+    elif args.insert_only:
+        bulk_insert_station_data(conn, stations_data)
+    else:
+        refresh_station_data(conn, stations_data)
+    elapsed = time.perf_counter() - start
+    print(f"Carregamento em {elapsed:.2f}s ({len(stations_data) / max(elapsed, 1e-9):,.0f} registos/s).")
     
     # Fechar conexão
     if conn:
@@ -0,0 +1,271 @@
+import codecs
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Caixas envolventes (sul, oeste, norte, este) por país; PT inclui Açores e Madeira.
+# Países sem entrada usam o mundo inteiro (a divisão em mosaicos adapta-se).
+COUNTRY_BOUNDS = {
+    "PT": (29.8, -31.6, 42.2, -6.1),
+    "ES": (27.5, -18.3, 43.9, 4.4),
+    "FR": (41.3, -5.3, 51.2, 9.7),
+    "DE": (47.2, 5.8, 55.1, 15.1),
+    "IT": (35.4, 6.6, 47.1, 18.6),
+    "NL": (50.7, 3.3, 53.6, 7.3),
+    "BE": (49.4, 2.5, 51.6, 6.5),
+    "GB": (49.8, -8.7, 60.9, 1.8),
+}
+WORLD_BOUNDS = (-90.0, -180.0, 90.0, 180.0)
+
+DEFAULT_PAGE_SIZE = 5000     # maxresults por pedido; um mosaico cheio é dividido em 4
+STREAM_PAGE_SIZE = 1000      # limite de maxresults com stream=True (POIs de um mosaico em memória)
+STREAM_CHUNK_SIZE = 64 * 1024
+DEFAULT_WORKERS = 8          # pedidos em paralelo
+MIN_TILE_DEGREES = 1e-4      # abaixo disto não se divide mais (POIs no mesmo ponto)
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5           # segundos; duplica a cada tentativa
+RETRY_STATUS = {429, 500, 502, 503, 504}
+MAX_RETRY_AFTER = 60         # segundos; espera máxima pedida pelo servidor em Retry-After
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+
+
+class FetchError(Exception):
+    """ Pedido falhado depois de esgotar as tentativas """
+
+
+def _session(pool_size):
+    """ Sessão HTTP por thread, com ligações reutilizadas """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _local.session = session
+    return session
+
+
+def iter_json_array(chunks):
+    """ Devolve, um a um, os elementos (objetos) de um array JSON recebido aos bocados,
+    sem nunca ter o documento inteiro em memória. Uma resposta cortada antes do "]" ou
+    com lixo pelo meio dá ValueError (só no fim, para não confundir um objeto que
+    continua no próximo bocado com um inválido). """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    # Estado: "start" (antes do "["), "first"/"item" (à espera de um elemento, o primeiro
+    # ou depois de uma vírgula), "separator" (à espera de "," ou "]") e "end" (depois do "]")
+    buffer, pos, state = "", 0, "start"
+    for chunk in chunks:
+        buffer = buffer[pos:] + utf8.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            char = buffer[pos]
+            if state == "end":
+                raise ValueError(f"Dados depois do fim do array JSON: {buffer[pos:pos + 40]!r}")
+            if state == "start":
+                if char != "[":
+                    raise ValueError("A resposta não é um array JSON")
+                state, pos = "first", pos + 1
+            elif state == "separator":
+                if char not in ",]":
+                    raise ValueError(f"Esperava ',' ou ']' no array JSON: {buffer[pos:pos + 40]!r}")
+                state, pos = ("item" if char == "," else "end"), pos + 1
+            elif char == "]" and state == "first":
+                state, pos = "end", pos + 1
+            else:
+                try:
+                    item, pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    break  # Objeto incompleto: esperar pelo próximo bocado
+                state = "separator"
+                yield item
+    rest = (buffer[pos:] + utf8.decode(b"", final=True)).strip()
+    if state == "start" and not rest:
+        raise ValueError("Resposta vazia")
+    if state != "end":
+        raise ValueError(f"Array JSON cortado ou inválido: {rest[:40]!r}")
+
+
+def request_with_retry(url, params, headers=None, timeout=60, max_retries=MAX_RETRIES,
+                       backoff_base=BACKOFF_BASE, pool_size=DEFAULT_WORKERS, stats=None, stream=False):
+    """ GET com backoff exponencial (e jitter) em 429/5xx e erros de ligação.
+    Respeita o cabeçalho Retry-After (em segundos, até MAX_RETRY_AFTER) quando o servidor o envia.
+    Com stream=True o corpo é descodificado aos bocados (iter_json_array), sem guardar o texto
+    inteiro da resposta ao lado dos objetos, mas devolve na mesma a lista completa: só com a
+    resposta toda se sabe que não veio cortada (e se é preciso repetir o pedido). """
+    for attempt in range(max_retries + 1):
+        retry_after = None
+        try:
+            response = _session(pool_size).get(url, params=params, headers=headers, timeout=timeout,
+                                               stream=stream)
+            if response.status_code not in RETRY_STATUS:
+                if stream:
+                    # A resposta fica aberta até ser lida; fechá-la também num 4xx
+                    with response:
+                        response.raise_for_status()
+                        return list(iter_json_array(response.iter_content(STREAM_CHUNK_SIZE)))
+                response.raise_for_status()
+                return response.json()
+            error = f"HTTP {response.status_code}"
+            retry_after = response.headers.get("Retry-After")
+            response.close()
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                ValueError) as e:
+            # ValueError: resposta cortada ou JSON inválido (iter_json_array, response.json())
+            error = str(e)
+
+        if attempt == max_retries:
+            raise FetchError(f"{error} após {max_retries + 1} tentativas ({params})")
+        if stats is not None:
+            with _stats_lock:
+                stats["retries"] = stats.get("retries", 0) + 1
+        try:
+            delay = min(float(retry_after), MAX_RETRY_AFTER)
+            if not delay >= 0:
+                raise ValueError(f"Retry-After inválido: {retry_after!r}")
+        except (TypeError, ValueError):
+            delay = backoff_base * 2 ** attempt * (0.5 + random.random())
+        time.sleep(delay)
+
+
+def split_tile(tile):
+    """ Divide um mosaico (sul, oeste, norte, este) em quatro """
+    south, west, north, east = tile
+    mid_lat, mid_lon = (south + north) / 2, (west + east) / 2
+    return [
+        (south, west, mid_lat, mid_lon),
+        (south, mid_lon, mid_lat, east),
+        (mid_lat, west, north, mid_lon),
+        (mid_lat, mid_lon, north, east),
+    ]
+
+
+def format_bounding_box(tile):
+    """ Formato do parâmetro boundingbox da API: (lat1,lon1),(lat2,lon2) """
+    south, west, north, east = tile
+    return f"({south},{west}),({north},{east})"
+
+
+def _outside(root, poi):
+    """ POI sem coordenadas ou fora da caixa do país, que nenhum mosaico contém (a API pode
+    devolvê-los, por exemplo com coordenadas arredondadas ou se ignorar a caixa) """
+    address = poi.get("AddressInfo") or {}
+    lat, lon = address.get("Latitude"), address.get("Longitude")
+    if lat is None or lon is None:
+        return True
+    south, west, north, east = root
+    return not (south <= lat <= north and west <= lon <= east)
+
+
+def _owns(tile, root, poi):
+    """ Cada POI dentro da caixa do país pertence a um só mosaico: intervalos
+    [sul, norte) x [oeste, este), fechados apenas nas margens norte/este da caixa do
+    país. A API trata as caixas como fechadas, por isso um POI numa fronteira chega
+    em dois mosaicos. Os de fora (ver _outside) ficam com a caixa do país. """
+    address = poi.get("AddressInfo") or {}
+    lat, lon = address.get("Latitude"), address.get("Longitude")
+    south, west, north, east = tile
+    lat_ok = south <= lat < north or (lat == north == root[2])
+    lon_ok = west <= lon < east or (lon == east == root[3])
+    return lat_ok and lon_ok
+
+
+def iter_pois(countries=("PT",), base_params=None, extra_params=None, base_url=None, headers=None,
+              workers=DEFAULT_WORKERS, page_size=DEFAULT_PAGE_SIZE, timeout=60, stats=None, stream=True):
+    """ Gera todos os POIs dos países indicados, pedidos em mosaicos por caixa envolvente.
+
+    Cada mosaico é pedido com maxresults=page_size; se vier cheio (pode ter sido
+    truncado) é dividido em quatro e os filhos são pedidos. Os pedidos correm em
+    paralelo (no máximo `workers` de cada vez) e cada POI sai uma única vez (ver
+    _owns; os que nenhum mosaico contém saem pelo primeiro pedido que os trouxer e
+    são contados em stats["outside_bounds"]). Os POIs saem mosaico a mosaico: em
+    memória ficam no máximo `workers` mosaicos, seja qual for o número de países, e com
+    stream=True cada mosaico tem no máximo STREAM_PAGE_SIZE POIs. """
+    stats = {} if stats is None else stats
+    stats.update({"requests": 0, "retries": 0, "tiles_split": 0, "truncated_tiles": 0, "outside_bounds": 0})
+    request_params = {"compact": True, "verbose": False, "output": "json", **(base_params or {})}
+    request_params.update(extra_params or {})
+    if stream:
+        page_size = min(page_size, STREAM_PAGE_SIZE)
+    request_params["maxresults"] = page_size
+
+    def fetch_tile(country, tile):
+        tile_params = {**request_params, "countrycode": country,
+                       "boundingbox": format_bounding_box(tile)}
+        return request_with_retry(base_url, tile_params, headers, timeout,
+                                  pool_size=workers, stats=stats, stream=stream)
+
+    # Mosaicos por pedir; só há `workers` pedidos submetidos de cada vez, para que
+    # mosaicos já descarregados não se acumulem enquanto o consumidor escreve
+    queue = deque()
+    for country in countries:
+        root = COUNTRY_BOUNDS.get(country.upper(), WORLD_BOUNDS)
+        queue.append((country, root, root))
+
+    # IDs (por país) dos POIs fora de todos os mosaicos já devolvidos
+    outside = set()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        while queue or pending:
+            while queue and len(pending) < workers:
+                country, root, tile = queue.popleft()
+                pending[executor.submit(fetch_tile, country, tile)] = (country, root, tile)
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            future = done.pop()
+            country, root, tile = pending.pop(future)
+            result = future.result()
+            del future
+            stats["requests"] += 1
+            south, west, north, east = tile
+            if len(result) >= page_size:
+                if min(north - south, east - west) > MIN_TILE_DEGREES:
+                    stats["tiles_split"] += 1
+                    queue.extend((country, root, child) for child in split_tile(tile))
+                    continue
+                stats["truncated_tiles"] += 1
+                print(f"Aviso: mosaico {tile} ({country}) continua cheio; podem faltar POIs.")
+            for poi in result:
+                if _outside(root, poi):
+                    key = (country, poi.get("ID"))
+                    if key in outside:
+                        continue
+                    if key[1] is not None:
+                        outside.add(key)
+                    stats["outside_bounds"] += 1
+                    yield poi
+                elif _owns(tile, root, poi):
+                    yield poi
+            del result
+
+    if stats["outside_bounds"]:
+        print(f"Aviso: {stats['outside_bounds']} POIs sem coordenadas ou fora da caixa do país "
+              f"(incluídos na mesma).")
+
+
+def fetch_pois(countries=("PT",), base_params=None, extra_params=None, base_url=None, headers=None,
+               workers=DEFAULT_WORKERS, page_size=DEFAULT_PAGE_SIZE, timeout=60, stats=None):
+    """ Lista de todos os POIs dos países indicados, ordenada por ID (ver iter_pois); os POIs
+    sem ID vêm no fim, pela ordem em que chegaram. """
+    pois = {}
+    without_id = []
+    for poi in iter_pois(countries, base_params, extra_params, base_url, headers,
+                         workers, page_size, timeout, stats, stream=False):
+        if poi.get("ID") is None:
+            without_id.append(poi)
+        else:
+            pois[poi["ID"]] = poi
+    return [pois[poi_id] for poi_id in sorted(pois)] + without_id
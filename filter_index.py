@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+from connectors import CONNECTOR_OPTIONS
+
+# Sidebar filter dimensions
+FILTER_COLUMNS = ['Cidade', 'Power Range', 'Charging Points Category']
+
+
+class StationFilterIndex:
+    """Bitmaps of row positions per filter value, built once per dataset version
+    (one per connector filter too, from the 'Connector Flags' column).
+    Statistics and charts are answered by analytics_cube.StationCube."""
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        self.values = {}
+        self._codes = {}
+        self._bitmaps = {}
+        for col in FILTER_COLUMNS:
+            cat = pd.Categorical(df[col])
+            codes = cat.codes.astype(np.int64)
+            self.values[col] = list(cat.categories)
+            self._codes[col] = codes
+            # One packed bitmap (1 bit per row, np.packbits layout) per distinct value
+            positions = np.arange(self.n_rows)
+            bitmaps = np.zeros((len(cat.categories), (self.n_rows + 7) // 8), dtype=np.uint8)
+            np.bitwise_or.at(bitmaps, (codes, positions >> 3), (128 >> (positions & 7)).astype(np.uint8))
+            self._bitmaps[col] = bitmaps
+        # Connector filters: one bitmap per bit of the flags (a station can match several)
+        flags = (df['Connector Flags'].to_numpy(dtype=np.uint8) if 'Connector Flags' in df
+                 else np.zeros(self.n_rows, dtype=np.uint8))
+        self._connector_bitmaps = {label: np.packbits((flags >> bit) & 1)
+                                   for bit, label in enumerate(CONNECTOR_OPTIONS)}
+
+    # Function to turn selected labels into a boolean array over a dimension's values
+    # (None or an empty selection means "no filter")
+    def _selected_values(self, col, selected):
+        values = self.values[col]
+        if not selected:
+            return np.ones(len(values), dtype=bool)
+        selected = set(selected)
+        return np.fromiter((value in selected for value in values), dtype=bool, count=len(values))
+
+    def _selection(self, city, power_ranges, charging_points):
+        return {
+            'Cidade': self._selected_values('Cidade', None if city == 'All' else [city]),
+            'Power Range': self._selected_values('Power Range', power_ranges),
+            'Charging Points Category': self._selected_values('Charging Points Category', charging_points),
+        }
+
+    def mask(self, city='All', power_ranges=(), charging_points=(), connectors=()):
+        """Boolean row mask for a filter combination, as an OR within and an AND across dimensions."""
+        selection = self._selection(city, power_ranges, charging_points)
+        combined = None
+        for col in FILTER_COLUMNS:
+            if selection[col].all():
+                continue
+            bitmap = np.bitwise_or.reduce(self._bitmaps[col][selection[col]], axis=0)
+            combined = bitmap if combined is None else combined & bitmap
+        if connectors:
+            bitmap = np.bitwise_or.reduce([self._connector_bitmaps[label] for label in connectors], axis=0)
+            combined = bitmap if combined is None else combined & bitmap
+        if combined is None:
+            return np.ones(self.n_rows, dtype=bool)
+        return np.unpackbits(combined, count=self.n_rows).astype(bool)
+
+    def positions(self, city='All', power_ranges=(), charging_points=(), connectors=()):
+        """Row positions matching a filter combination."""
+        return np.flatnonzero(self.mask(city, power_ranges, charging_points, connectors))
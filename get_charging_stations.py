@@ -1,92 +1,323 @@
 import requests
 import pandas as pd
 import json
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+import argparse
+import csv
 import os
 import sys
 
+import station_data
+from connectors import CONNECTORS_KEY, ConnectorTable, connector_records
+from fetcher import DEFAULT_WORKERS, FetchError, fetch_pois, iter_pois
+
 # Carregar variáveis de ambiente do arquivo .env
 load_dotenv()
 
-# Configuração da API
-BASE_URL = "https://api.openchargemap.io/v3/poi"
+# Configuração da API (o URL pode ser trocado, p.ex. por um servidor local de testes)
+BASE_URL = os.getenv('OPENCHARGEMAP_BASE_URL', "https://api.openchargemap.io/v3/poi")
 
 # Obter a chave API do ambiente
 API_KEY = os.getenv('OPENCHARGE_API_KEY')
 
-if not API_KEY:
-    print("Erro: Chave API não encontrada!")
-    print("Por favor, crie um arquivo .env com sua chave API.")
-    print("Você pode usar o arquivo .env.example como template.")
-    sys.exit(1)
-
 HEADERS = {
     "X-API-Key": API_KEY
 }
 
-# Parâmetros para Portugal
+# Parâmetros comuns a todos os pedidos (país e paginação são tratados pelo fetcher)
 params = {
-    "countrycode": "PT",
-    "maxresults": 10000,
     "compact": True,
     "verbose": False,
     "output": "json"
 }
 
-def get_charging_stations():
+# Países descarregados por omissão
+COUNTRIES = ["PT"]
+
+# Ficheiros de saída e estado da sincronização incremental
+CSV_FILE = "postos_carregamento.csv"
+JSON_FILE = "postos_carregamento.json"
+SYNC_STATE_FILE = "sync_state.json"
+
+# Margem de segurança ao pedir alterações desde a última sincronização (o merge é idempotente)
+SYNC_OVERLAP = timedelta(minutes=5)
+
+# SubmissionStatusTypeID >= 1000 corresponde a POIs retirados ("Delisted") no OpenChargeMap
+DELISTED_STATUS_MIN_ID = 1000
+
+def check_api_key():
+    if not API_KEY:
+        print("Erro: Chave API não encontrada!")
+        print("Por favor, crie um arquivo .env com sua chave API.")
+        print("Você pode usar o arquivo .env.example como template.")
+        sys.exit(1)
+
+def get_charging_stations(extra_params=None, base_url=None, countries=None, workers=DEFAULT_WORKERS):
     try:
-        response = requests.get(BASE_URL, headers=HEADERS, params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        # Pedidos paginados por mosaicos, em paralelo e com novas tentativas (ver fetcher.py)
+        stats = {}
+        stations = fetch_pois(countries or COUNTRIES, base_params=params, extra_params=extra_params,
+                              base_url=base_url or BASE_URL, headers=HEADERS, workers=workers, stats=stats)
+        print(f"{stats['requests']} pedidos, {stats['retries']} novas tentativas, "
+              f"{stats['tiles_split']} mosaicos divididos, {stats['outside_bounds']} POIs fora da caixa do país.")
+        return stations
+    except (requests.RequestException, FetchError) as e:
         print(f"Erro ao buscar dados: {e}")
         return None
 
-def process_stations(stations):
-    processed_data = []
+def process_station(station):
+    # Extrair informações básicas
+    address_info = station.get("AddressInfo", {})
     
-    for station in stations:
-        # Extrair informações básicas
-        address_info = station.get("AddressInfo", {})
-        
-        # Processar conexões
-        connections = station.get("Connections", [])
-        total_power = sum(conn.get("PowerKW", 0) for conn in connections if conn.get("PowerKW"))
-        
-        station_data = {
-            "ID": station.get("ID"),
-            "Nome": address_info.get("Title"),
-            "Operador": station.get("OperatorInfo", {}).get("Title"),
-            "Endereço": address_info.get("AddressLine1"),
-            "Cidade": address_info.get("Town"),
-            "Código Postal": address_info.get("Postcode"),
-            "Latitude": address_info.get("Latitude"),
-            "Longitude": address_info.get("Longitude"),
-            "Número de Pontos": len(connections),
-            "Potência Total (kW)": total_power,
-            "Data Atualização": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        processed_data.append(station_data)
+    # Processar conexões
+    connections = station.get("Connections", [])
+    total_power = sum(conn.get("PowerKW", 0) for conn in connections if conn.get("PowerKW"))
     
-    return processed_data
+    return {
+        "ID": station.get("ID"),
+        "Nome": address_info.get("Title"),
+        "Operador": station.get("OperatorInfo", {}).get("Title"),
+        "Endereço": address_info.get("AddressLine1"),
+        "Cidade": address_info.get("Town"),
+        "Código Postal": address_info.get("Postcode"),
+        "Latitude": address_info.get("Latitude"),
+        "Longitude": address_info.get("Longitude"),
+        "Número de Pontos": len(connections),
+        "Potência Total (kW)": total_power,
+        "Data Atualização": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        # Detalhe por conector: tipo, corrente, potência e quantidade (ver connectors.py)
+        CONNECTORS_KEY: connector_records(connections)
+    }
+
+def iter_processed_stations(stations):
+    """ Versão geradora de process_stations: processa um POI de cada vez """
+    for station in stations:
+        yield process_station(station)
+
+def process_stations(stations):
+    return list(iter_processed_stations(stations))
+
+def csv_row(record):
+    """ Registo pronto para o CSV: a lista de conectores vai numa só coluna, em JSON """
+    if isinstance(record.get(CONNECTORS_KEY), list):
+        return {**record, CONNECTORS_KEY: json.dumps(record[CONNECTORS_KEY], ensure_ascii=False)}
+    return record
 
-def save_data(data, csv_file="postos_carregamento.csv", json_file="postos_carregamento.json"):
+def save_data(data, csv_file=CSV_FILE, json_file=JSON_FILE):
     # Criar DataFrame
-    df = pd.DataFrame(data)
+    df = pd.DataFrame([csv_row(record) for record in data])
     
-    # Salvar como CSV
-    df.to_csv(csv_file, index=False, encoding='utf-8')
+    # Salvar como CSV (em .tmp, trocado no fim: quem lê nunca vê um ficheiro a meio)
+    df.to_csv(f"{csv_file}.tmp", index=False, encoding='utf-8')
+    os.replace(f"{csv_file}.tmp", csv_file)
     print(f"Dados salvos em {csv_file}")
     
     # Salvar como JSON
-    with open(json_file, 'w', encoding='utf-8') as f:
+    with open(f"{json_file}.tmp", 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(f"{json_file}.tmp", json_file)
     print(f"Dados salvos em {json_file}")
 
+    save_snapshot(data, json_file)
+
+def save_snapshot(data, json_file=JSON_FILE):
+    """ Grava, ao lado do JSON, o snapshot colunar (Arrow) já limpo e com as colunas derivadas,
+    que o dashboard abre por memory-map em vez de reprocessar o JSON """
+    snapshot_file = station_data.snapshot_path(json_file)
+    try:
+        version = station_data.dataset_version(json_file)
+        station_data.write_snapshot(station_data.stations_from_records(data), version, snapshot_file)
+        # Tabela de conectores (uma linha por conector), também colunar
+        station_data.write_snapshot(ConnectorTable.from_records(data).to_frame(), version,
+                                    station_data.connectors_snapshot_path(json_file))
+    except ImportError:
+        print("pyarrow não está instalado: snapshot colunar não gravado (o dashboard lê o JSON).")
+        return
+    print(f"Snapshot colunar salvo em {snapshot_file}")
+
+# --- Escrita em streaming ---
+
+def save_data_streaming(records, csv_file=CSV_FILE, json_file=JSON_FILE, db_file=None):
+    """ Escreve registos processados (p.ex. de iter_processed_stations) diretamente nos
+    ficheiros CSV e JSON e, opcionalmente, na base de dados SQLite (atualização incremental
+    numa só transação), sem juntar os dados em memória. Os ficheiros são escritos em .tmp e
+    só substituem os anteriores no fim. """
+    csv_tmp, json_tmp = f"{csv_file}.tmp", f"{json_file}.tmp"
+    conn = None
+    count = 0
+
+    def write_files(csv_f, json_f):
+        """ Escreve cada registo no CSV e no JSON e passa-o adiante (para a base de dados) """
+        nonlocal count
+        writer = None
+        json_f.write("[")
+        for record in records:
+            if writer is None:
+                writer = csv.DictWriter(csv_f, fieldnames=list(record.keys()), lineterminator='\n')
+                writer.writeheader()
+            writer.writerow(csv_row(record))
+
+            # Mesmo formato que json.dump(data, indent=2) de save_data
+            item = json.dumps(record, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+            json_f.write(("," if count else "") + "\n  " + item)
+            count += 1
+            yield record
+        json_f.write("\n]" if count else "]")
+
+    try:
+        if db_file:
+            import create_db
+            conn = create_db.create_connection(db_file)
+            create_db.create_table(conn)
+
+        with open(csv_tmp, 'w', encoding='utf-8', newline='') as csv_f, \
+                open(json_tmp, 'w', encoding='utf-8') as json_f:
+            written = write_files(csv_f, json_f)
+            if conn is not None:
+                create_db.refresh_station_data(conn, written)
+            # Se a base de dados falhou a meio, os ficheiros são escritos na mesma
+            for _ in written:
+                pass
+    except BaseException:
+        for tmp_file in (csv_tmp, json_tmp):
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        raise
+    finally:
+        if conn is not None:
+            conn.close()
+
+    os.replace(csv_tmp, csv_file)
+    print(f"Dados salvos em {csv_file}")
+    os.replace(json_tmp, json_file)
+    print(f"Dados salvos em {json_file}")
+    return count
+
+# --- Sincronização incremental ---
+
+def load_sync_state(state_file=SYNC_STATE_FILE):
+    """ Lê o estado da última sincronização ({} se ainda não houve nenhuma) """
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_sync_state(state, state_file=SYNC_STATE_FILE):
+    """ Grava o estado de forma atómica (ficheiro temporário + os.replace) """
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_file, state_file)
+
+def is_removed(station):
+    """ Indica se o POI foi retirado do OpenChargeMap """
+    status_id = station.get("SubmissionStatusTypeID")
+    if status_id is None:
+        status_id = (station.get("SubmissionStatus") or {}).get("ID")
+    return status_id is not None and status_id >= DELISTED_STATUS_MIN_ID
+
+def merge_stations(existing, changed):
+    """ Aplica POIs alterados (formato da API) aos registos processados existentes.
+    Devolve a lista resultante e contagens de inserções, atualizações e remoções. """
+    merged = {station["ID"]: station for station in existing}
+    counts = {"inseridos": 0, "atualizados": 0, "removidos": 0}
+
+    removed_ids = {station.get("ID") for station in changed if is_removed(station)}
+    live = [station for station in changed if station.get("ID") not in removed_ids]
+
+    for station_id in removed_ids:
+        if merged.pop(station_id, None) is not None:
+            counts["removidos"] += 1
+
+    for station_data in process_stations(live):
+        if station_data["ID"] in merged:
+            counts["atualizados"] += 1
+        else:
+            counts["inseridos"] += 1
+        merged[station_data["ID"]] = station_data
+
+    return list(merged.values()), counts
+
+def fetch_updates(state, json_file=JSON_FILE, base_url=None, countries=None, workers=DEFAULT_WORKERS):
+    """ Pede apenas os POIs alterados desde a última sincronização (state) e junta-os aos
+    registos de json_file; sem estado anterior (ou sem dados locais) descarrega tudo.
+    Não grava nada: devolve (registos, início da sincronização), ou None se a descarga falhou. """
+    sync_started = datetime.now(timezone.utc)
+
+    existing = None
+    if state.get("last_sync"):
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                existing = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            existing = None
+
+    if existing is None:
+        print("Sem sincronização anterior: a descarregar todos os postos...")
+        stations = get_charging_stations(base_url=base_url, countries=countries, workers=workers)
+        if stations is None:
+            return None
+        data = process_stations([station for station in stations if not is_removed(station)])
+        print(f"Encontrados {len(data)} postos de carregamento.")
+    else:
+        since = datetime.fromisoformat(state["last_sync"]) - SYNC_OVERLAP
+        print(f"A pedir alterações desde {since.isoformat()}...")
+        changed = get_charging_stations({"modifiedsince": since.strftime("%Y-%m-%dT%H:%M:%S")}, base_url=base_url,
+                                        countries=countries, workers=workers)
+        if changed is None:
+            return None
+        data, counts = merge_stations(existing, changed)
+        print(f"Recebidos {len(changed)} POIs alterados: {counts['inseridos']} inseridos, "
+              f"{counts['atualizados']} atualizados, {counts['removidos']} removidos.")
+    return data, sync_started
+
+def sync_incremental(base_url=None, csv_file=CSV_FILE, json_file=JSON_FILE, state_file=SYNC_STATE_FILE,
+                     countries=None, workers=DEFAULT_WORKERS):
+    """ Pede apenas os POIs alterados desde a última sincronização e junta-os aos dados locais.
+    Sem estado anterior (ou sem dados locais) faz uma descarga completa. """
+    fetched = fetch_updates(load_sync_state(state_file), json_file, base_url, countries, workers)
+    if fetched is None:
+        return False
+    data, sync_started = fetched
+
+    save_data(data, csv_file, json_file)
+    save_sync_state({"last_sync": sync_started.isoformat(), "stations": len(data)}, state_file)
+    return True
+
 def main():
-    print("Buscando dados dos postos de carregamento em Portugal...")
-    stations = get_charging_stations()
+    parser = argparse.ArgumentParser(description="Descarrega os postos de carregamento do OpenChargeMap.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="pedir apenas as alterações desde a última sincronização")
+    parser.add_argument("--base-url", default=None, help="URL da API (por omissão, OpenChargeMap)")
+    parser.add_argument("--countries", nargs="+", default=COUNTRIES,
+                        help="códigos ISO dos países a descarregar (por omissão: PT)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="pedidos em paralelo")
+    parser.add_argument("--stream", action="store_true",
+                        help="processar e gravar os POIs mosaico a mosaico, à medida que chegam (memória limitada)")
+    parser.add_argument("--db", default=None, help="com --stream, gravar também nesta base de dados SQLite")
+    args = parser.parse_args()
+
+    check_api_key()
+
+    if args.incremental:
+        if not sync_incremental(base_url=args.base_url, countries=args.countries, workers=args.workers):
+            print("Não foi possível sincronizar os dados dos postos de carregamento.")
+        return
+
+    print(f"Buscando dados dos postos de carregamento ({', '.join(args.countries)})...")
+    if args.stream:
+        try:
+            pois = iter_pois(args.countries, base_params=params, base_url=args.base_url or BASE_URL,
+                             headers=HEADERS, workers=args.workers)
+            count = save_data_streaming(iter_processed_stations(pois), db_file=args.db)
+            print(f"Gravados {count} postos de carregamento.")
+        except (requests.RequestException, FetchError) as e:
+            print(f"Erro ao buscar dados: {e}")
+        return
+
+    stations = get_charging_stations(base_url=args.base_url, countries=args.countries, workers=args.workers)
     
     if stations:
         print(f"Encontrados {len(stations)} postos de carregamento.")
@@ -96,4 +327,4 @@ def main():
         print("Não foi possível obter os dados dos postos de carregamento.")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
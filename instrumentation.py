@@ -0,0 +1,295 @@
+import functools
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Opt-in switch: '1' collects stage timers and counters, 'log' also writes every
+# measurement as a JSON line to stderr. Anything else (or unset) turns it all off.
+ENV_VAR = 'EV_MAP_DIAGNOSTICS'
+# Port ('9464' or 'host:port') of the Prometheus text endpoint; not started unless set
+PORT_ENV_VAR = 'EV_MAP_METRICS_PORT'
+
+# Prefix of every exported metric name
+METRIC_PREFIX = 'ev_map'
+# Most recent timings kept per stage for the percentiles
+RECENT_SAMPLES = 500
+
+# Hides the diagnostics page's sidebar link while the instrumentation is off
+HIDE_DIAGNOSTICS_LINK_CSS = "<style>[data-testid='stSidebarNav'] a[href$='/Diagnostics'] {display: none;}</style>"
+
+MODE = os.environ.get(ENV_VAR, '').strip().lower()
+ENABLED = MODE not in ('', '0', 'false', 'off', 'no')
+
+logger = logging.getLogger('ev_map.instrumentation')
+if MODE == 'log' and not logger.handlers:
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+# Function to compute a percentile (0-100) of a list of numbers, interpolating linearly
+def _percentile(values, q):
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+# Function to format a label set the Prometheus way: {name="value",...}
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+class Metrics:
+    """Per-stage timers, counters and gauges of one server process, shared by all
+    sessions and pages. Collectors are callables returning {name: number}, read
+    whenever the metrics are exported (e.g. MapHtmlCache.stats)."""
+
+    def __init__(self, recent=RECENT_SAMPLES):
+        self.recent = recent
+        self._lock = threading.Lock()
+        self._collectors = {}
+        self.reset()
+
+    def reset(self):
+        """Drop every timing, counter and gauge (collectors stay registered)."""
+        with self._lock:
+            self.started = time.time()
+            self._stages = {}
+            self._counters = {}
+            self._gauges = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = {'count': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0,
+                                               'recent': deque(maxlen=self.recent)}
+            entry['count'] += 1
+            entry['total'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            entry['last'] = seconds
+            entry['recent'].append(seconds)
+        logger.info(json.dumps({'event': 'stage', 'stage': stage, 'seconds': round(seconds, 6), 'ts': time.time()}))
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        logger.info(json.dumps({'event': 'count', 'name': name, 'value': value, **labels, 'ts': time.time()}))
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+        logger.info(json.dumps({'event': 'gauge', 'name': name, 'value': value, **labels, 'ts': time.time()}))
+
+    def register_collector(self, name, collect):
+        with self._lock:
+            self._collectors[name] = collect
+
+    def stages(self):
+        """One row per stage, slowest in total first; times in seconds."""
+        with self._lock:
+            entries = [(stage, dict(entry, recent=list(entry['recent']))) for stage, entry in self._stages.items()]
+        rows = [{
+            'stage': stage,
+            'calls': entry['count'],
+            'total': entry['total'],
+            'mean': entry['total'] / entry['count'],
+            'p50': _percentile(entry['recent'], 50),
+            'p95': _percentile(entry['recent'], 95),
+            'max': entry['max'],
+            'last': entry['last'],
+        } for stage, entry in entries]
+        return sorted(rows, key=lambda row: -row['total'])
+
+    def counters(self):
+        with self._lock:
+            return [{'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(self._counters.items())]
+
+    def gauges(self):
+        """Gauges set by the app plus the collectors' current values (a failing collector is skipped)."""
+        with self._lock:
+            rows = [{'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(self._gauges.items())]
+            collectors = sorted(self._collectors.items())
+        for prefix, collect in collectors:
+            try:
+                values = collect()
+            except Exception:
+                continue
+            rows.extend({'name': f'{prefix}_{name}', 'labels': {}, 'value': value}
+                        for name, value in values.items()
+                        if isinstance(value, (int, float)) and not isinstance(value, bool))
+        return rows
+
+    def snapshot(self):
+        """Everything collected so far, as plain JSON-serializable data."""
+        return {
+            'started': self.started,
+            'uptime_seconds': time.time() - self.started,
+            'stages': self.stages(),
+            'counters': self.counters(),
+            'gauges': self.gauges(),
+        }
+
+    def prometheus_text(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        stages = self.stages()
+        if stages:
+            name = f'{METRIC_PREFIX}_stage_seconds'
+            lines += [f'# HELP {name} Time spent per stage (quantiles over the last {self.recent} calls).',
+                      f'# TYPE {name} summary']
+            for row in stages:
+                stage = (('stage', row['stage']),)
+                for quantile in ('p50', 'p95'):
+                    labels = _format_labels(stage + (('quantile', f'0.{quantile[1:]}'),))
+                    lines.append(f"{name}{labels} {row[quantile]:.6f}")
+                lines.append(f"{name}_sum{_format_labels(stage)} {row['total']:.6f}")
+                lines.append(f"{name}_count{_format_labels(stage)} {row['calls']}")
+
+        for kind, rows, suffix in [('counter', self.counters(), '_total'), ('gauge', self.gauges(), '')]:
+            typed = set()
+            for row in rows:
+                name = f"{METRIC_PREFIX}_{row['name']}{suffix}"
+                if name not in typed:
+                    lines.append(f'# TYPE {name} {kind}')
+                    typed.add(name)
+                lines.append(f"{name}{_format_labels(tuple(sorted(row['labels'].items())))} {row['value']}")
+
+        uptime = f'{METRIC_PREFIX}_uptime_seconds'
+        lines += [f'# TYPE {uptime} gauge', f'{uptime} {time.time() - self.started:.3f}']
+        return '\n'.join(lines) + '\n'
+
+
+class _StageTimer:
+    """Context manager recording the wall time of a block under a stage name."""
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+# Process-wide metrics shared by the app and the diagnostics page
+METRICS = Metrics()
+
+_NULL_TIMER = nullcontext()
+
+
+# Function to time a block: `with stage('filter'): ...` (does nothing when disabled)
+def stage(name):
+    if not ENABLED:
+        return _NULL_TIMER
+    return _StageTimer(METRICS, name)
+
+
+# Function to add to a counter (does nothing when disabled)
+def count(name, value=1, **labels):
+    if ENABLED:
+        METRICS.count(name, value, **labels)
+
+
+# Function to set a gauge to its latest value (does nothing when disabled)
+def gauge(name, value, **labels):
+    if ENABLED:
+        METRICS.set_gauge(name, value, **labels)
+
+
+# Function to register a collector whose values are exported as gauges named <name>_<key>
+def register_collector(name, collect):
+    if ENABLED:
+        METRICS.register_collector(name, collect)
+
+
+# Function to wrap a Streamlit cache decorator so calls and misses are counted and the
+# work done on a miss is timed under the cache's name; when disabled it is the plain
+# decorator. Usage: @track_cache('load_data', st.cache_data)
+def track_cache(name, cache_decorator):
+    def decorate(func):
+        if not ENABLED:
+            return cache_decorator(func)
+
+        # Only runs on a miss; wraps keeps the name, source and signature the cache keys on
+        @functools.wraps(func)
+        def compute(*args, **kwargs):
+            METRICS.count('cache_misses', cache=name)
+            with _StageTimer(METRICS, name):
+                return func(*args, **kwargs)
+
+        cached = cache_decorator(compute)
+
+        @functools.wraps(func)
+        def call(*args, **kwargs):
+            METRICS.count('cache_calls', cache=name)
+            return cached(*args, **kwargs)
+
+        call.clear = cached.clear
+        return call
+
+    return decorate
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = METRICS.prometheus_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+# Function to start (once per process) the Prometheus text endpoint on the port given
+# in EV_MAP_METRICS_PORT, in a daemon thread; returns the server, or None if it is not
+# configured or could not be started (not retried on every rerun)
+def start_metrics_server(address=None):
+    global _server
+    address = address or os.environ.get(PORT_ENV_VAR)
+    if not ENABLED or not address:
+        return None
+    with _server_lock:
+        if _server is None:
+            host, _, port = str(address).rpartition(':')
+            try:
+                _server = ThreadingHTTPServer((host or '127.0.0.1', int(port)), _MetricsHandler)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Metrics endpoint not started on {address}: {e}")
+                _server = False
+                return None
+            threading.Thread(target=_server.serve_forever, name='metrics-endpoint', daemon=True).start()
+        return _server or None
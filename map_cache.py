@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+
+# Default memory budget for cached map HTML (a full-country map is ~1.5 MB)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class MapHtmlCache:
+    """Process-wide LRU cache of rendered map HTML, bounded by total size in bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(city, power_ranges, charging_points, version, connectors=(), coverage=None):
+        # Multiselect order does not change the map, so sort the selections
+        return (city, tuple(sorted(power_ranges)), tuple(sorted(charging_points)), tuple(sorted(connectors)), version,
+                coverage)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, html):
+        size = len(html.encode('utf-8'))
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return  # Never cache an entry that would evict everything else
+            self._entries[key] = (html, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_render(self, key, render):
+        """Return cached HTML for key, calling render() and storing the result on a miss."""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        html = render()
+        self.put(key, html)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -1,5 +1,7 @@
 import streamlit as st
 
+import instrumentation
+
 # Apply custom CSS for black background and white text
 st.markdown("""
     <style>
@@ -27,6 +29,10 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# The Diagnostics page is only listed when the instrumentation is on
+if not instrumentation.ENABLED:
+    st.markdown(instrumentation.HIDE_DIAGNOSTICS_LINK_CSS, unsafe_allow_html=True)
+
 st.title("💡 Application Explanation")
 
 st.header("Map Marker Pop-up Details")
@@ -36,7 +42,7 @@ When you click on a marker cluster on the map and then on an individual station
 *   **Name:** The official name or designation of the charging station.
 *   **Operator:** The company or entity that operates and maintains the charging station. `Not available` if this information is missing.
 *   **Address:** The physical street address of the charging station. `Not available` if this information is missing.
-*   **City:** The city where the charging station is located. This is normalized to handle variations in naming (e.g., 'Lisbon' becomes 'Lisboa').
+*   **City:** The city where the charging station is located. This is normalized to the municipality name to handle variations in naming (e.g., 'Lisbon' becomes 'Lisboa', 'V.N. Gaia' becomes 'Vila Nova de Gaia'); a missing city is filled in from the postal code or location when nearby stations agree.
 *   **Postal Code:** The postal code for the station's location. `Not available` if this information is missing.
 *   **Latitude:** The geographic latitude coordinate of the station. Useful for precise location or input into navigation systems.
 *   **Longitude:** The geographic longitude coordinate of the station. Useful for precise location or input into navigation systems.
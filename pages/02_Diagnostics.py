@@ -0,0 +1,77 @@
+import json
+
+import pandas as pd
+import streamlit as st
+
+import instrumentation
+
+st.title("🩺 Diagnostics")
+
+if not instrumentation.ENABLED:
+    st.info(f"Instrumentation is off. Start the app with `{instrumentation.ENV_VAR}=1` "
+            f"(or `{instrumentation.ENV_VAR}=log` to also write JSON log lines) to collect timings.")
+    st.stop()
+
+metrics = instrumentation.METRICS
+snapshot = metrics.snapshot()
+counters = {(row['name'], tuple(sorted(row['labels'].items()))): row['value'] for row in snapshot['counters']}
+
+st.caption(f"Collected over the last {snapshot['uptime_seconds'] / 60:,.1f} minutes, across all sessions of this server. "
+           f"Script runs: {counters.get(('script_runs', ()), 0):,}")
+
+# --- Stage timers ---
+st.subheader("Stages")
+if snapshot['stages']:
+    stages = pd.DataFrame(snapshot['stages'])
+    for col in ['mean', 'p50', 'p95', 'max', 'last']:
+        stages[col] = stages[col] * 1000
+    st.dataframe(
+        stages.rename(columns={'total': 'total (s)', 'mean': 'mean (ms)', 'p50': 'p50 (ms)', 'p95': 'p95 (ms)',
+                               'max': 'max (ms)', 'last': 'last (ms)'}),
+        hide_index=True,
+        use_container_width=True,
+        column_config={col: st.column_config.NumberColumn(format="%.2f")
+                       for col in ['total (s)', 'mean (ms)', 'p50 (ms)', 'p95 (ms)', 'max (ms)', 'last (ms)']}
+    )
+else:
+    st.write("_Nothing timed yet: open the map page first_")
+
+# --- Streamlit caches (a miss is a call that ran the function) ---
+st.subheader("Caches")
+caches = sorted({dict(labels)['cache'] for name, labels in counters if name == 'cache_calls'})
+if caches:
+    rows = []
+    for cache in caches:
+        calls = counters.get(('cache_calls', (('cache', cache),)), 0)
+        misses = counters.get(('cache_misses', (('cache', cache),)), 0)
+        rows.append({'cache': cache, 'calls': calls, 'hits': calls - misses, 'misses': misses,
+                     'hit rate': (calls - misses) / calls if calls else 0.0})
+    st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True,
+                 column_config={'hit rate': st.column_config.NumberColumn(format="%.2f")})
+else:
+    st.write("_No cache calls yet_")
+
+# --- Counters and gauges (rows filtered, markers emitted, HTML bytes, map cache...) ---
+st.subheader("Counters and gauges")
+values = [{'metric': row['name'], 'type': kind, 'labels': ', '.join(f'{k}={v}' for k, v in row['labels'].items()),
+           'value': row['value']}
+          for kind, rows in [('counter', snapshot['counters']), ('gauge', snapshot['gauges'])] for row in rows
+          if not row['name'].startswith('cache_')]
+if values:
+    st.dataframe(pd.DataFrame(values), hide_index=True, use_container_width=True)
+
+# --- Export ---
+st.subheader("Export")
+prometheus_text = metrics.prometheus_text()
+export_col1, export_col2, export_col3 = st.columns(3)
+with export_col1:
+    st.download_button("Download Prometheus text", prometheus_text, file_name="metrics.prom", mime="text/plain")
+with export_col2:
+    st.download_button("Download JSON", json.dumps(snapshot, indent=2), file_name="metrics.json",
+                       mime="application/json")
+with export_col3:
+    if st.button("Reset metrics"):
+        metrics.reset()
+        st.rerun()
+with st.expander("Prometheus text"):
+    st.code(prometheus_text, language=None)
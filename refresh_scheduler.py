@@ -0,0 +1,256 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import create_db
+import get_charging_stations as stations
+from station_data import (CURRENT_VERSION_FILE, VERSIONS_DIR, current_dataset_version, dataset_file,
+                          published_version, version_file)
+
+# Refresh interval of the scheduler started by the dashboard, in hours; no scheduler unless set
+INTERVAL_ENV_VAR = 'EV_MAP_REFRESH_HOURS'
+# Published versions kept besides the current one (sessions may still be reading them)
+KEEP_VERSIONS = 2
+
+logger = logging.getLogger('ev_map.refresh')
+
+
+class RefreshError(Exception):
+    """A refresh that did not publish a new version (the current one stays in place)."""
+
+
+# Function to fail early, with a clear error, when the OpenChargeMap API key is missing (the
+# API refuses every download without it); get_charging_stations.check_api_key exits the
+# process instead, which suits its command line but not a thread of the dashboard
+def check_api_key():
+    if not stations.API_KEY:
+        raise RefreshError("no OpenChargeMap API key: set OPENCHARGE_API_KEY in the environment or a .env file "
+                           "(see .env.example)")
+
+
+# Function to name a new version: UTC time of the refresh plus a random suffix, so names sort
+# by age and never collide (nor look like dataset_version()'s mtime-size strings)
+def new_version_id():
+    return f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{uuid.uuid4().hex[:6]}"
+
+
+# Function to write processed records as a new version folder (JSON, CSV and the Arrow
+# snapshots): written under a temporary name and renamed once complete, so a version
+# folder is always whole. Returns the version id; the pointer is not changed.
+def write_version(records, versions_dir=VERSIONS_DIR):
+    version = new_version_id()
+    tmp_dir = os.path.join(versions_dir, f".{version}.tmp")
+    os.makedirs(tmp_dir)
+    try:
+        json_file = os.path.join(tmp_dir, os.path.basename(version_file(version)))
+        stations.save_data(records, os.path.splitext(json_file)[0] + '.csv', json_file)
+        os.replace(tmp_dir, os.path.join(versions_dir, version))
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return version
+
+
+# Function to make a version the current one: the pointer file is written to .tmp and swapped
+# in with os.replace, so readers see either the old or the new pointer, never a partial one
+def publish_version(version, stations_count=None, pointer_file=CURRENT_VERSION_FILE):
+    pointer = {
+        'version': version,
+        'published': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'stations': stations_count,
+    }
+    tmp_file = f"{pointer_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(pointer, f, indent=2)
+    os.replace(tmp_file, pointer_file)
+
+
+# Function to delete old version folders, keeping the current one and the `keep` newest others
+# (and leftovers of interrupted writes); returns the deleted versions
+def prune_versions(keep=KEEP_VERSIONS, versions_dir=VERSIONS_DIR):
+    current = published_version()
+    try:
+        names = sorted(os.listdir(versions_dir), reverse=True)
+    except OSError:
+        return []
+    older = [name for name in names if name != current and not name.startswith('.')]
+    removed = older[keep:] + [name for name in names if name.endswith('.tmp')]
+    for name in removed:
+        shutil.rmtree(os.path.join(versions_dir, name), ignore_errors=True)
+    return removed
+
+
+# Function to load records into the SQLite store in one transaction (readers keep seeing the
+# previous contents until the commit)
+def load_database(records, db_file=create_db.DB_FILE):
+    conn = sqlite3.connect(db_file)
+    try:
+        create_db.create_table(conn)
+        if create_db.refresh_station_data(conn, records) is None:
+            raise RefreshError(f"loading {db_file} failed")
+    finally:
+        conn.close()
+
+
+# Function to run one refresh: fetch (incremental when a previous sync is known) → process →
+# write a new version folder → load the SQLite store (when db_file is given) → warm the
+# caches (warm(version), optional) → swap the pointer → drop old versions. Nothing the
+# dashboard reads changes before the pointer swap, so it never sees a partial dataset.
+def refresh(countries=None, base_url=None, workers=stations.DEFAULT_WORKERS, incremental=True, db_file=None,
+            warm=None, state_file=stations.SYNC_STATE_FILE, keep=KEEP_VERSIONS):
+    check_api_key()
+    state = stations.load_sync_state(state_file) if incremental else {}
+    fetched = stations.fetch_updates(state, dataset_file(current_dataset_version()), base_url, countries, workers)
+    if fetched is None:
+        raise RefreshError("download failed")
+    records, sync_started = fetched
+    if not records:
+        raise RefreshError("the download returned no stations")
+
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    version = write_version(records)
+    if db_file:
+        load_database(records, db_file)
+    if warm is not None:
+        try:
+            warm(version)
+        except Exception:
+            # A cold cache only costs the first session a slower rerun
+            logger.exception("warming the caches for version %s failed", version)
+    publish_version(version, len(records))
+    stations.save_sync_state({'last_sync': sync_started.isoformat(), 'stations': len(records)}, state_file)
+    prune_versions(keep)
+    return version
+
+
+class RefreshScheduler:
+    """Runs refresh() every interval in a daemon thread, one refresh at a time.
+
+    A failed refresh leaves the current version in place and is retried at the
+    next tick. Options are passed on to refresh().
+    """
+
+    def __init__(self, interval_seconds, refresh_func=refresh, **options):
+        self.interval_seconds = interval_seconds
+        self._refresh = refresh_func
+        self._options = options
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.running = False
+        self.refreshes = 0
+        self.failures = 0
+        self.last_version = None
+        self.last_success = None
+        self.last_error = None
+
+    def start(self, run_now=False):
+        """Start the worker thread; the first refresh runs after one interval unless run_now.
+        Without an API key (see check_api_key) refresh() could never succeed, so the thread is
+        not started and the reason is kept in last_error."""
+        if self._refresh is refresh:
+            try:
+                check_api_key()
+            except RefreshError as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.error("refresh scheduler not started: %s", e)
+                return self
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, args=(run_now,), name='refresh-scheduler',
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self, run_now):
+        if not run_now and self._stop.wait(self.interval_seconds):
+            return
+        while not self._stop.is_set():
+            self.run_once()
+            if self._stop.wait(self.interval_seconds):
+                return
+
+    def run_once(self):
+        """Run a refresh now (skipped if one is already running); returns the new version or None."""
+        if not self._lock.acquire(blocking=False):
+            return None
+        self.running = True
+        try:
+            version = self._refresh(**self._options)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            logger.exception("refresh failed; the current dataset version stays in place")
+            return None
+        finally:
+            self.running = False
+            self._lock.release()
+        self.refreshes += 1
+        self.last_version = version
+        self.last_success = time.time()
+        self.last_error = None
+        return version
+
+    def stats(self):
+        """Counters for the metrics endpoint (see instrumentation.register_collector)."""
+        return {
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'running': int(self.running),
+            'seconds_since_success': None if self.last_success is None else time.time() - self.last_success,
+        }
+
+
+# Function to read the refresh interval (hours) from EV_MAP_REFRESH_HOURS; None if unset or invalid
+def interval_from_env():
+    try:
+        hours = float(os.environ.get(INTERVAL_ENV_VAR, ''))
+    except ValueError:
+        return None
+    return hours * 3600 if hours > 0 else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the stations in the background and publish each "
+                                                 "download as a new dataset version.")
+    parser.add_argument('--every', type=float, default=None, metavar='HOURS',
+                        help="refresh every HOURS hours (default: run one refresh and exit)")
+    parser.add_argument('--full', action='store_true', help="download everything instead of only the changes")
+    parser.add_argument('--db', default=None, help="also load each version into this SQLite database")
+    parser.add_argument('--countries', nargs='+', default=stations.COUNTRIES)
+    parser.add_argument('--base-url', default=None, help="API URL (default: OpenChargeMap)")
+    parser.add_argument('--workers', type=int, default=stations.DEFAULT_WORKERS)
+    parser.add_argument('--keep', type=int, default=KEEP_VERSIONS, help="old versions kept besides the current one")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    try:
+        check_api_key()
+    except RefreshError as e:
+        parser.error(str(e))
+
+    options = dict(countries=args.countries, base_url=args.base_url, workers=args.workers,
+                   incremental=not args.full, db_file=args.db, keep=args.keep)
+    if args.every is None:
+        print(f"Published version {refresh(**options)}")
+        return
+    scheduler = RefreshScheduler(args.every * 3600, **options).start(run_now=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import json
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+# File types accepted for routes (GPX tracks/routes and GeoJSON lines)
+ROUTE_FILE_TYPES = ['gpx', 'geojson', 'json']
+
+
+class RouteFileError(ValueError):
+    """A route file that could not be read or holds no line."""
+
+
+# Function to read the points of a GPX file: track points, else route points, else waypoints
+def _gpx_points(text):
+    try:
+        root = ET.fromstring(text)
+    except ET.ParseError as e:
+        raise RouteFileError(f"Invalid GPX file: {e}") from e
+    for tag in ('trkpt', 'rtept', 'wpt'):
+        # Tags carry the GPX namespace ({http://www.topografix.com/GPX/1/1}trkpt)
+        points = [(float(el.get('lat')), float(el.get('lon'))) for el in root.iter()
+                  if el.tag.rsplit('}', 1)[-1] == tag and el.get('lat') and el.get('lon')]
+        if points:
+            return points
+    return []
+
+
+# Function to read the line points of a GeoJSON object (coordinates are [lon, lat, ...]);
+# several lines are joined in the order they appear
+def _geojson_points(obj):
+    if not isinstance(obj, dict):
+        return []
+    kind = obj.get('type')
+    if kind == 'FeatureCollection':
+        return [p for feature in obj.get('features') or [] for p in _geojson_points(feature)]
+    if kind == 'Feature':
+        return _geojson_points(obj.get('geometry'))
+    if kind == 'GeometryCollection':
+        return [p for geometry in obj.get('geometries') or [] for p in _geojson_points(geometry)]
+    if kind == 'LineString':
+        lines = [obj.get('coordinates') or []]
+    elif kind == 'MultiLineString':
+        lines = obj.get('coordinates') or []
+    else:
+        return []
+    return [(float(c[1]), float(c[0])) for line in lines for c in line]
+
+
+# Function to read a route file (GPX or GeoJSON, told apart by name or content) into arrays
+# of latitudes and longitudes
+def read_route(data, name=''):
+    try:
+        text = data.decode('utf-8-sig') if isinstance(data, bytes) else data
+        if name.lower().endswith('.gpx') or text.lstrip().startswith('<'):
+            points = _gpx_points(text)
+        else:
+            points = _geojson_points(json.loads(text))
+    except RouteFileError:
+        raise
+    except (ValueError, TypeError, IndexError) as e:
+        raise RouteFileError(f"Invalid route file: {e}") from e
+    if len(points) < 2:
+        raise RouteFileError("The file holds no line (at least two points are needed)")
+    lats, lons = np.array(points, dtype=float).T
+    if np.abs(lats).max() > 90 or np.abs(lons).max() > 180:
+        raise RouteFileError("The file has coordinates outside the valid latitude/longitude range")
+    return lats, lons
@@ -0,0 +1,34 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Shared-dataset mode: the station table (and the tables read from the SQLite store) is cached
+# once per server process and shared read-only by every session (st.cache_resource), instead of
+# handed to each session as its own unpickled copy on every rerun (st.cache_data). On unless
+# set to 0/false/off/no, which brings back the per-session copies.
+ENV_VAR = 'EV_MAP_SHARED_DATA'
+
+ENABLED = os.environ.get(ENV_VAR, '1').strip().lower() not in ('0', 'false', 'off', 'no')
+
+
+# Function to make the column buffers of a DataFrame read-only, so a session writing into the
+# shared table fails ("assignment destination is read-only") instead of changing it for every
+# other session. Selections (df[mask], take, assign, copy) get fresh, writable buffers, so each
+# session's filtered view is its own copy of the selected rows only. Returns a new frame over
+# the same buffers (nothing is copied), built column by column through the public API: a
+# frame built from arrays with copy=False keeps each one as its own block, read-only flag included.
+def freeze_frame(df):
+    columns = []
+    for _, column in df.items():
+        values = column.array
+        if isinstance(values, pd.Categorical):
+            # Categorical.codes is already a read-only view of the column's codes
+            values = pd.Categorical.from_codes(values.codes, dtype=values.dtype, validate=False)
+        elif isinstance(column.dtype, np.dtype):
+            values = column.to_numpy(copy=False)
+            values.flags.writeable = False
+        columns.append(values)
+    frozen = pd.DataFrame(dict(enumerate(columns)), index=df.index, copy=False)
+    frozen.columns = df.columns
+    return frozen
@@ -0,0 +1,333 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180.0  # ~111.2 km per degree of latitude
+
+
+# Function to compute great-circle distances (km) from one point to arrays of points
+def haversine_km(lat, lon, lats, lons):
+    lat, lon = np.radians(lat), np.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class StationSpatialIndex:
+    """Uniform lat/lon grid over station coordinates with k-nearest and radius queries.
+
+    Stations are sorted by grid cell, so every row of cells touched by a query
+    box is one contiguous slice found with a binary search; only those
+    candidates get an exact haversine distance.
+    """
+
+    def __init__(self, lat, lon, cell_deg=0.05):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.cell_deg = cell_deg
+        self.n_cols = int(np.ceil(360.0 / cell_deg))
+        self.n_rows = int(np.ceil(180.0 / cell_deg))
+
+        keys = self._cell_rows(self.lat) * self.n_cols + self._cell_cols(self.lon)
+        self.order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.order]
+
+    @classmethod
+    def from_frame(cls, df, cell_deg=0.05):
+        return cls(df['Latitude'].to_numpy(), df['Longitude'].to_numpy(), cell_deg)
+
+    def _cell_rows(self, lat):
+        return np.clip(((np.asarray(lat) + 90.0) // self.cell_deg).astype(np.int64), 0, self.n_rows - 1)
+
+    def _cell_cols(self, lon):
+        return np.clip(((np.asarray(lon) + 180.0) // self.cell_deg).astype(np.int64), 0, self.n_cols - 1)
+
+    # Function to collect row positions of stations in the lat/lon box around a point
+    def _candidates(self, lat, lon, radius_km):
+        dlat = radius_km / KM_PER_DEGREE
+        max_abs_lat = min(abs(lat) + dlat, 89.9)
+        dlon = min(radius_km / (KM_PER_DEGREE * np.cos(np.radians(max_abs_lat))), 180.0)
+
+        row0, row1 = self._cell_rows(lat - dlat), self._cell_rows(lat + dlat)
+        col0, col1 = self._cell_cols(lon - dlon), self._cell_cols(lon + dlon)
+        rows = np.arange(row0, row1 + 1) * self.n_cols
+        starts = np.searchsorted(self.sorted_keys, rows + col0, side='left')
+        stops = np.searchsorted(self.sorted_keys, rows + col1, side='right')
+        lengths = stops - starts
+        if not lengths.sum():
+            return np.empty(0, dtype=np.int64)
+        # Expand the [start, stop) slices into one index array
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return self.order[offsets + np.arange(lengths.sum())]
+
+    def _query_box(self, lat, lon, radius_km, where):
+        candidates = self._candidates(lat, lon, radius_km)
+        if where is not None:
+            candidates = candidates[where[candidates]]
+        return candidates, haversine_km(lat, lon, self.lat[candidates], self.lon[candidates])
+
+    def within(self, lat, lon, radius_km, where=None):
+        """Row positions and distances (km) of stations within radius_km, nearest first.
+
+        where: optional boolean array over stations restricting the search.
+        """
+        candidates, dist = self._query_box(lat, lon, radius_km, where)
+        inside = dist <= radius_km
+        candidates, dist = candidates[inside], dist[inside]
+        order = np.argsort(dist, kind='stable')
+        return candidates[order], dist[order]
+
+    def nearest(self, lat, lon, k=5, where=None):
+        """Row positions and distances (km) of the k nearest stations, nearest first.
+
+        The search box doubles until it holds k stations inside the circle it
+        covers, which guarantees none closer lies outside it.
+        """
+        total = len(self.lat) if where is None else int(np.count_nonzero(where))
+        k = min(k, total)
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        radius_km = self.cell_deg * KM_PER_DEGREE
+        while True:
+            candidates, dist = self._query_box(lat, lon, radius_km, where)
+            if np.count_nonzero(dist <= radius_km) >= k or radius_km > np.pi * EARTH_RADIUS_KM:
+                break
+            radius_km *= 2
+        top = np.argpartition(dist, k - 1)[:k] if len(dist) > k else np.arange(len(dist))
+        top = top[np.argsort(dist[top], kind='stable')]
+        return candidates[top], dist[top]
+
+    def nearest_each(self, lats, lons, where=None, batch=8192):
+        """Row position and distance (km) of the nearest station to each of many points
+        (-1 and inf when there is none), for all points at once.
+
+        Every point starts with a one-cell box. A point whose nearest candidate lies
+        outside the box's inscribed circle searches again with that distance as radius
+        (which then holds the answer); a point with no candidate doubles its box.
+        Points are handled batch at a time to bound the candidate arrays.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        if where is not None:
+            # Search the matching stations only, and map their rows back
+            rows = np.flatnonzero(where)
+            if not len(rows):
+                return np.full(len(lats), -1, dtype=np.int64), np.full(len(lats), np.inf)
+            subset = StationSpatialIndex(self.lat[rows], self.lon[rows], self.cell_deg)
+            found, dist = subset.nearest_each(lats, lons, batch=batch)
+            return np.where(found >= 0, rows[np.maximum(found, 0)], -1), dist
+        found = np.full(len(lats), -1, dtype=np.int64)
+        dist = np.full(len(lats), np.inf)
+        if not len(self.lat):
+            return found, dist
+        radius_km = np.full(len(lats), self.cell_deg * KM_PER_DEGREE)
+        pending = np.arange(len(lats))
+        while len(pending):
+            unresolved = []
+            for start in range(0, len(pending), batch):
+                points = pending[start:start + batch]
+                owner, candidates = self._candidates_each(lats[points], lons[points], radius_km[points])
+                d = haversine_km(lats[points][owner], lons[points][owner], self.lat[candidates], self.lon[candidates])
+                # Nearest candidate of each point that has any (pairs come grouped by point)
+                has = np.flatnonzero(np.bincount(owner, minlength=len(points)))
+                group_starts = np.searchsorted(owner, has)
+                best = np.minimum.reduceat(d, group_starts) if len(d) else np.empty(0)
+                at_best = np.flatnonzero(d == np.repeat(best, np.diff(np.append(group_starts, len(d)))))
+                first = at_best[np.unique(owner[at_best], return_index=True)[1]]
+                hit = points[has]
+                found[hit], dist[hit] = candidates[first], best
+                far = best > radius_km[hit]
+                radius_km[hit[far]] = best[far]
+                empty = np.setdiff1d(points, hit, assume_unique=True)
+                radius_km[empty] *= 2
+                unresolved += [hit[far], empty[radius_km[empty] <= 2 * np.pi * EARTH_RADIUS_KM]]
+            pending = np.concatenate(unresolved)
+        return found, dist
+
+    # Function to collect (point, station) candidate pairs in the lat/lon box around each point
+    def _candidates_each(self, lats, lons, radius_km):
+        dlat = radius_km / KM_PER_DEGREE
+        max_abs_lat = np.minimum(np.abs(lats) + dlat, 89.9)
+        dlon = np.minimum(radius_km / (KM_PER_DEGREE * np.cos(np.radians(max_abs_lat))), 180.0)
+        row0, row1 = self._cell_rows(lats - dlat), self._cell_rows(lats + dlat)
+        col0, col1 = self._cell_cols(lons - dlon), self._cell_cols(lons + dlon)
+        # One contiguous slice of stations per (point, row of cells)
+        n_rows = row1 - row0 + 1
+        point = np.repeat(np.arange(len(lats)), n_rows)
+        rows = (row0[point] + np.arange(n_rows.sum()) - np.repeat(np.cumsum(n_rows) - n_rows, n_rows)) * self.n_cols
+        starts = np.searchsorted(self.sorted_keys, rows + col0[point], side='left')
+        lengths = np.searchsorted(self.sorted_keys, rows + col1[point], side='right') - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return np.repeat(point, lengths), self.order[offsets + np.arange(lengths.sum())]
+
+    def along_route(self, route, where=None):
+        """Row positions, distances to the route (km) and distances along it (km) of the
+        stations within the corridor of a RouteSegmentIndex, ordered along the route.
+
+        Each station is measured against the segments of its own grid cell only;
+        where: optional boolean array over stations restricting the search.
+        """
+        if route.cell_deg != self.cell_deg:
+            raise ValueError("The route and the stations must be indexed on the same grid")
+        starts = np.searchsorted(self.sorted_keys, route.cells, side='left')
+        counts = np.searchsorted(self.sorted_keys, route.cells, side='right') - starts
+        # Every (station, segment) pair sharing a cell: pair p of cell c is station p // segments
+        # and segment p % segments of that cell's lists
+        pairs = counts * route.cell_counts
+        cell = np.repeat(np.arange(len(route.cells)), pairs)
+        offset = np.arange(pairs.sum()) - np.repeat(np.cumsum(pairs) - pairs, pairs)
+        station, segment = np.divmod(offset, route.cell_counts[cell])
+        stations = self.order[starts[cell] + station]
+        segments = route.cell_segments[route.cell_starts[cell] + segment]
+        if where is not None:
+            keep = where[stations]
+            stations, segments = stations[keep], segments[keep]
+
+        dist, along = route.measure(self.lat[stations], self.lon[stations], segments)
+        inside = dist <= route.width_km
+        stations, dist, along = stations[inside], dist[inside], along[inside]
+        # A station near several segments (or cells) keeps its nearest point on the route
+        nearest = np.lexsort((dist, stations))
+        first = np.unique(stations[nearest], return_index=True)[1]
+        best = nearest[first]
+        order = np.lexsort((dist[best], along[best]))
+        return stations[best][order], dist[best][order], along[best][order]
+
+
+# Function to simplify a polyline (Douglas-Peucker): returns the mask of the points to keep so that
+# no dropped point lies farther than tolerance_km from the simplified line. GPS tracks carry a
+# point every few metres; their jitter and straight stretches would otherwise become thousands
+# of tiny segments, each one matched against the stations of its cells.
+def simplify_line(lats, lons, tolerance_km):
+    scale = np.cos(np.radians(np.mean(lats))) * KM_PER_DEGREE
+    x, y = np.asarray(lons) * scale, np.asarray(lats) * KM_PER_DEGREE
+    keep = np.zeros(len(x), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(x) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+        # Distance to the chord as a segment, not a line, so an out-and-back route keeps its far end
+        t = np.clip((px * dx + py * dy) / max(dx * dx + dy * dy, 1e-12), 0.0, 1.0)
+        dist = np.hypot(px - t * dx, py - t * dy)
+        farthest = int(np.argmax(dist))
+        if dist[farthest] > tolerance_km:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack += [(first, split), (split, last)]
+    return keep
+
+
+class RouteSegmentIndex:
+    """Segments of a route (a polyline) indexed by the grid cells they pass within width_km of,
+    on the same grid as StationSpatialIndex.
+
+    The route is first simplified to within simplify_km (see simplify_line), and long
+    segments are cut into pieces no longer than a cell for indexing, so the box around
+    each piece only spans a few cells. Distances are measured on a local projection per
+    segment (longitudes scaled by the cosine of its mid latitude).
+    """
+
+    def __init__(self, lats, lons, width_km, cell_deg=0.05, simplify_km=0.01):
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        # Repeated points would make zero-length segments
+        keep = np.ones(len(lats), dtype=bool)
+        keep[1:] = (np.diff(lats) != 0) | (np.diff(lons) != 0)
+        lats, lons = lats[keep], lons[keep]
+        if len(lats) < 2:
+            raise ValueError("A route needs at least two distinct points")
+        if simplify_km:
+            keep = simplify_line(lats, lons, simplify_km)
+            lats, lons = lats[keep], lons[keep]
+        self.lats, self.lons = lats, lons
+        self.width_km = float(width_km)
+        self.cell_deg = cell_deg
+        self.lat0, self.lon0 = lats[:-1], lons[:-1]
+        self.dlat_km = np.diff(lats) * KM_PER_DEGREE
+        self.scale = np.cos(np.radians((lats[:-1] + lats[1:]) / 2)) * KM_PER_DEGREE
+        self.dlon_km = np.diff(lons) * self.scale
+        self.length_km = np.hypot(self.dlat_km, self.dlon_km)
+        self.start_km = np.cumsum(self.length_km) - self.length_km
+        self.total_km = float(self.length_km.sum())
+        self.bounds = (lats.min(), lats.max(), lons.min(), lons.max())
+        self._index_cells(lats, lons)
+
+    # Function to list, per grid cell within width_km of the route, the segments passing near it
+    def _index_cells(self, lats, lons):
+        n_cols = int(np.ceil(360.0 / self.cell_deg))
+        n_rows = int(np.ceil(180.0 / self.cell_deg))
+        pieces = np.maximum(np.ceil(self.length_km / (self.cell_deg * KM_PER_DEGREE)), 1).astype(np.int64)
+        segment = np.repeat(np.arange(len(pieces)), pieces)
+        step = np.arange(len(segment)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+        t0, t1 = step / pieces[segment], (step + 1) / pieces[segment]
+        dlat, dlon = np.diff(lats)[segment], np.diff(lons)[segment]
+        lat_a, lat_b = lats[segment] + t0 * dlat, lats[segment] + t1 * dlat
+        lon_a, lon_b = lons[segment] + t0 * dlon, lons[segment] + t1 * dlon
+
+        grow_lat = self.width_km / KM_PER_DEGREE
+        max_abs_lat = np.minimum(np.maximum(np.abs(lat_a), np.abs(lat_b)) + grow_lat, 89.9)
+        grow_lon = np.minimum(self.width_km / (KM_PER_DEGREE * np.cos(np.radians(max_abs_lat))), 180.0)
+        row0 = np.clip(((np.minimum(lat_a, lat_b) - grow_lat + 90.0) // self.cell_deg).astype(np.int64), 0, n_rows - 1)
+        row1 = np.clip(((np.maximum(lat_a, lat_b) + grow_lat + 90.0) // self.cell_deg).astype(np.int64), 0, n_rows - 1)
+        col0 = np.clip(((np.minimum(lon_a, lon_b) - grow_lon + 180.0) // self.cell_deg).astype(np.int64), 0, n_cols - 1)
+        col1 = np.clip(((np.maximum(lon_a, lon_b) + grow_lon + 180.0) // self.cell_deg).astype(np.int64), 0, n_cols - 1)
+
+        # Every cell of every piece's box, as (cell key, segment) pairs without repeats
+        widths = col1 - col0 + 1
+        sizes = (row1 - row0 + 1) * widths
+        piece = np.repeat(np.arange(len(sizes)), sizes)
+        offset = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        keys = (row0[piece] + offset // widths[piece]) * n_cols + col0[piece] + offset % widths[piece]
+        n_segments = len(self.length_km)
+        pairs = np.unique(keys * n_segments + segment[piece])
+        self.cells, self.cell_starts, self.cell_counts = np.unique(pairs // n_segments, return_index=True,
+                                                                   return_counts=True)
+        self.cell_segments = pairs % n_segments
+
+    def measure(self, lats, lons, segments):
+        """Distance (km) from each point to a segment of the route, and the distance along
+        the route (km) of the nearest point of that segment."""
+        px = (np.asarray(lons, dtype=float) - self.lon0[segments]) * self.scale[segments]
+        py = (np.asarray(lats, dtype=float) - self.lat0[segments]) * KM_PER_DEGREE
+        dx, dy, length = self.dlon_km[segments], self.dlat_km[segments], self.length_km[segments]
+        t = np.clip((px * dx + py * dy) / (length * length), 0.0, 1.0)
+        return np.hypot(px - t * dx, py - t * dy), self.start_km[segments] + t * length
+
+
+# Function to return station rows with a 'Distance (km)' column for query results
+def stations_with_distance(df, rows, dist):
+    result = df.iloc[rows].copy()
+    result.insert(0, 'Distance (km)', np.round(dist, 3))
+    return result
+
+
+# Function to build the optional restriction mask for "only these power per point categories"
+def power_category_mask(df, categories):
+    if not categories:
+        return None
+    return df['Power per Point Category'].isin(categories).to_numpy()
+
+
+# Function to answer "k nearest stations to a point" on a station DataFrame
+def nearest_stations(df, index, lat, lon, k=5, categories=None):
+    rows, dist = index.nearest(lat, lon, k, where=power_category_mask(df, categories))
+    return stations_with_distance(df, rows, dist)
+
+
+# Function to answer "all stations within radius_km of a point" on a station DataFrame
+def stations_within(df, index, lat, lon, radius_km, categories=None):
+    rows, dist = index.within(lat, lon, radius_km, where=power_category_mask(df, categories))
+    return stations_with_distance(df, rows, dist)
+
+
+# Function to answer "all stations within the route's corridor, in order along it" on a station
+# DataFrame (route: a RouteSegmentIndex on the index's grid)
+def stations_along_route(df, index, route, categories=None):
+    rows, dist, along = index.along_route(route, where=power_category_mask(df, categories))
+    result = stations_with_distance(df, rows, dist)
+    result.insert(0, 'Along route (km)', np.round(along, 2))
+    return result
+
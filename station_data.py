@@ -0,0 +1,289 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+from city_names import canonical_cities, default_resolver
+from connectors import ConnectorTable, connector_bits
+
+# Location of the processed stations file, relative to the workspace root
+DATA_FILE = os.path.join('data', 'postos_carregamento.json')
+# Dataset versions published by the refresh scheduler (refresh_scheduler.py): one folder per
+# version, never modified once written, and a pointer file naming the current one. Without a
+# pointer the dashboard reads DATA_FILE.
+VERSIONS_DIR = os.path.join('data', 'versions')
+CURRENT_VERSION_FILE = os.path.join('data', 'current_version.json')
+
+# Schema metadata key holding the version of the JSON file a snapshot was built from
+SNAPSHOT_VERSION_KEY = b'source_version'
+# Bumped whenever the snapshot's contents change meaning (e.g. how cities are canonicalized),
+# so snapshots written by older code are not used
+SNAPSHOT_FORMAT = 3
+
+# Bucket labels, in display order
+POWER_RANGES = ['0-50', '51-100', '100+']
+CHARGING_POINTS_OPTIONS = ['1 point', '2 points', '3-4 points', '5+ points']
+POWER_PER_POINT_CATEGORIES = ['< 7 kW', '7-22 kW (AC Normal/Fast)', '23-50 kW (DC Fast)',
+                              '> 50 kW (DC Ultra-Fast)', 'N/A']
+
+# Columns kept in the in-memory station table; anything else in the JSON is dropped
+STATION_COLUMNS = ['ID', 'Nome', 'Operador', 'Endereço', 'Cidade', 'Código Postal',
+                   'Latitude', 'Longitude', 'Número de Pontos', 'Potência Total (kW)',
+                   'Data Atualização', 'Potência por Ponto (kW)', 'Connector Flags']
+
+# Low-cardinality text columns stored as pandas categoricals
+CATEGORICAL_COLUMNS = ['Cidade', 'Operador', 'Data Atualização',
+                       'Power Range', 'Charging Points Category', 'Power per Point Category']
+
+
+# Function to identify the current version of the dataset on disk
+# (changes whenever the file is rewritten); None if the file is missing
+def dataset_version(path=DATA_FILE):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+# Function to read the published version the pointer file names; None without a pointer,
+# or if it names a version whose folder is gone
+def published_version(pointer_file=CURRENT_VERSION_FILE):
+    try:
+        with open(pointer_file, 'r', encoding='utf-8') as f:
+            version = json.load(f)['version']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return version if os.path.exists(version_file(version)) else None
+
+
+# Function to get the stations file of a published version
+def version_file(version):
+    return os.path.join(VERSIONS_DIR, str(version), os.path.basename(DATA_FILE))
+
+
+# Function to identify the dataset the dashboard should read now: the published version
+# (swapped atomically by the refresh scheduler), or else the version of DATA_FILE
+def current_dataset_version():
+    return published_version() or dataset_version(DATA_FILE)
+
+
+# Function to get the stations file of a version returned by current_dataset_version()
+def dataset_file(version):
+    path = version_file(version)
+    return path if version is not None and os.path.exists(path) else DATA_FILE
+
+
+# Function to get the columnar snapshot path that goes with a JSON file (same name, .arrow)
+def snapshot_path(json_path=DATA_FILE):
+    return os.path.splitext(json_path)[0] + '.arrow'
+
+
+# Function to get the path of the connector table's snapshot that goes with a JSON file
+def connectors_snapshot_path(json_path=DATA_FILE):
+    return os.path.splitext(json_path)[0] + '.connectors.arrow'
+
+
+# Function to normalize city names: the municipality name from the gazetteer, or the
+# name title-cased if it is not a known municipality (memoized by the resolver)
+def normalize_city_name(city):
+    return default_resolver().canonical_name(city)
+
+
+# Function to normalize a whole city column, resolving each distinct value only once
+def normalize_city_column(cities):
+    uniques = cities.dropna().unique()
+    mapping = {city: normalize_city_name(city) for city in uniques}
+    return cities.map(mapping).fillna('Not specified')
+
+
+# Function to get power range labels (NaN power falls through to '100+', as before)
+def power_range_labels(power):
+    ranges = pd.cut(power, bins=[-np.inf, 50, 100, np.inf], labels=POWER_RANGES, ordered=True)
+    return ranges.fillna('100+')
+
+
+# Function to get charging points labels
+def charging_points_labels(points):
+    values = points.to_numpy(dtype=float)
+    labels = np.select(
+        [values == 1, values == 2, values <= 4],
+        CHARGING_POINTS_OPTIONS[:3],
+        default=CHARGING_POINTS_OPTIONS[3]
+    )
+    return pd.Series(pd.Categorical(labels, categories=CHARGING_POINTS_OPTIONS, ordered=True), index=points.index)
+
+
+# Function to get power per point categories
+def power_per_point_categories(power_per_point):
+    ppp = power_per_point.to_numpy(dtype=float)
+    # NaN compares False everywhere, so only finite values reach a kW bucket
+    labels = np.select(
+        [~np.isfinite(ppp), ppp < 7, ppp <= 22, ppp <= 50],
+        ['N/A'] + POWER_PER_POINT_CATEGORIES[:3],
+        default=POWER_PER_POINT_CATEGORIES[3]
+    )
+    return pd.Series(pd.Categorical(labels, categories=POWER_PER_POINT_CATEGORIES), index=power_per_point.index)
+
+
+# Function to add the normalized city and the three bucket columns (runs once per dataset version);
+# cities already canonicalized (canonical_cities, or a database built by create_db.py) are kept,
+# with only the missing ones filled in
+def preprocess_stations(df, cities_canonical=False):
+    if cities_canonical:
+        df['Cidade'] = df['Cidade'].fillna('Not specified')
+    else:
+        with instrumentation.stage('normalize_cities'):
+            df['Cidade'] = normalize_city_column(df['Cidade'])
+    df['Power Range'] = power_range_labels(df['Potência Total (kW)'])
+    df['Charging Points Category'] = charging_points_labels(df['Número de Pontos'])
+    df['Power per Point Category'] = power_per_point_categories(df['Potência por Ponto (kW)'])
+    return df
+
+
+# Function to shrink the station table: prune unused columns, categorical text
+# columns, float32 coordinates and point counts (power stays float64 so sums are exact)
+def compact_stations(df):
+    df = df[[col for col in STATION_COLUMNS + CATEGORICAL_COLUMNS[3:] if col in df.columns]]
+    df = df.astype({col: 'category' for col in CATEGORICAL_COLUMNS if col in df.columns})
+    return df.astype({
+        'Latitude': np.float32,
+        'Longitude': np.float32,
+        'Número de Pontos': np.float32,
+        **({'Connector Flags': np.uint8} if 'Connector Flags' in df.columns else {}),
+    })
+
+
+# Function to build the row mask for the sidebar filters (empty selections do not filter)
+def filter_mask(df, city='All', power_ranges=(), charging_points=(), connectors=()):
+    mask = np.ones(len(df), dtype=bool)
+    if city != 'All':
+        mask &= (df['Cidade'] == city).to_numpy()
+    if power_ranges:
+        mask &= df['Power Range'].isin(power_ranges).to_numpy()
+    if charging_points:
+        mask &= df['Charging Points Category'].isin(charging_points).to_numpy()
+    if connectors:
+        mask &= (df['Connector Flags'].to_numpy() & connector_bits(connectors)) != 0
+    return mask
+
+
+# Function to apply the sidebar filters; returns the table itself when nothing is filtered out
+def filter_stations(df, city='All', power_ranges=(), charging_points=(), connectors=()):
+    mask = filter_mask(df, city, power_ranges, charging_points, connectors)
+    return df if mask.all() else df[mask]
+
+
+# Function to compare per-column memory of two versions of the station table
+def memory_report(before, after):
+    report = pd.DataFrame({
+        'before_bytes': before.memory_usage(index=True, deep=True),
+        'after_bytes': after.memory_usage(index=True, deep=True),
+        'before_dtype': before.dtypes.astype(str),
+        'after_dtype': after.dtypes.astype(str),
+    })
+    report.loc['TOTAL', ['before_bytes', 'after_bytes']] = report[['before_bytes', 'after_bytes']].sum()
+    report['ratio'] = report['after_bytes'] / report['before_bytes']
+    return report
+
+
+# Function to turn processed station records into the cleaned, preprocessed DataFrame
+def stations_from_records(data, compact=True):
+    # Convert to DataFrame early to calculate Power per Point
+    df = pd.DataFrame(data)
+
+    # Data Cleaning: Ensure numeric types where necessary
+    numeric_cols = ['Número de Pontos', 'Potência Total (kW)', 'Latitude', 'Longitude']
+    for col in numeric_cols:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # Calculate Power per Point, handle division by zero and NaN in Number of Points
+    df['Potência por Ponto (kW)'] = (df['Potência Total (kW)'] / df['Número de Pontos']).replace([np.inf, -np.inf], np.nan)
+    df.dropna(subset=['Latitude', 'Longitude'], inplace=True) # Drop rows with invalid coordinates
+
+    # Canonical municipality names, with the postcode and coordinates filling in missing or unknown cities
+    with instrumentation.stage('canonicalize_cities'):
+        df['Cidade'] = canonical_cities(df['Cidade'], df.get('Código Postal'),
+                                        df['Latitude'], df['Longitude']).to_numpy()
+
+    # Fill NaN operators with 'Unknown' for charting
+    df['Operador'] = df['Operador'].fillna('Unknown')
+
+    # Connector filters each station matches (bitmask, see connectors.CONNECTOR_FILTERS)
+    df['Connector Flags'] = ConnectorTable.from_records(data).flags(df['ID'].fillna(-1))
+
+    df = preprocess_stations(df, cities_canonical=True)
+    if not compact:
+        # Plain representation (object strings, float64), kept for memory comparisons
+        return df.astype({col: object for col in CATEGORICAL_COLUMNS[3:]})
+    return compact_stations(df)
+
+
+# Function to get the tag identifying what a snapshot was built from: the version of the JSON
+# file and the snapshot format
+def snapshot_tag(source_version):
+    return f"{source_version}/{SNAPSHOT_FORMAT}".encode()
+
+
+# Function to write the compact station table as an uncompressed Arrow IPC file (memory-mappable),
+# tagged with the version of the JSON file it was built from; written to .tmp and then swapped in
+def write_snapshot(df, source_version, path):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df)
+    metadata = {**(table.schema.metadata or {}), SNAPSHOT_VERSION_KEY: snapshot_tag(source_version)}
+    table = table.replace_schema_metadata(metadata)
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+# Function to memory-map a snapshot; None if pyarrow is missing or the snapshot is
+# missing, unreadable or was built from another version of the JSON file (or of this code)
+def load_snapshot(source_version, path):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    try:
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            if (reader.schema.metadata or {}).get(SNAPSHOT_VERSION_KEY) != snapshot_tag(source_version):
+                return None
+            # Names and addresses are nearly all distinct, so skip the string de-duplication pass
+            return reader.read_all().to_pandas(deduplicate_objects=False)
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+
+# Function to load the cleaned, preprocessed station table: from the columnar snapshot
+# when it matches the JSON file, otherwise by parsing the JSON
+def load_stations(path=DATA_FILE, compact=True, use_snapshot=True):
+    if compact and use_snapshot:
+        with instrumentation.stage('load_snapshot'):
+            df = load_snapshot(dataset_version(path), snapshot_path(path))
+        instrumentation.count('snapshot_loads', result='miss' if df is None else 'hit')
+        if df is not None:
+            return df
+
+    with instrumentation.stage('parse_json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    with instrumentation.stage('process_records'):
+        return stations_from_records(data, compact)
+
+
+# Function to load the connector table (one row per connector, see connectors.ConnectorTable):
+# from its snapshot when it matches the JSON file, otherwise from the JSON's connector lists
+def load_connectors(path=DATA_FILE, use_snapshot=True):
+    if use_snapshot:
+        frame = load_snapshot(dataset_version(path), connectors_snapshot_path(path))
+        if frame is not None:
+            return ConnectorTable(frame)
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return ConnectorTable.from_records(json.load(f))
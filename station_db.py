@@ -0,0 +1,307 @@
+import os
+import queue
+import sqlite3
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+import numpy as np
+import pandas as pd
+
+from analytics_cube import CUBE_MEASURES
+from connectors import CONNECTOR_COLUMNS, CONNECTOR_OPTIONS, ConnectorTable, connector_sql
+from spatial_index import KM_PER_DEGREE, StationSpatialIndex, haversine_km, stations_along_route
+from station_data import (charging_points_labels, compact_stations, dataset_version, normalize_city_column,
+                          normalize_city_name, preprocess_stations)
+
+# SQLite store built by create_db.py, relative to the workspace root
+DB_FILE = 'charging_stations.db'
+
+# Database columns and the names the dashboard uses for them (as in the JSON file)
+DB_COLUMNS = {
+    'id': 'ID',
+    'nome': 'Nome',
+    'operador': 'Operador',
+    'endereco': 'Endereço',
+    'cidade': 'Cidade',
+    'codigo_postal': 'Código Postal',
+    'latitude': 'Latitude',
+    'longitude': 'Longitude',
+    'numero_pontos': 'Número de Pontos',
+    'potencia_total_kw': 'Potência Total (kW)',
+    'data_atualizacao': 'Data Atualização',
+    'potencia_por_ponto_kw': 'Potência por Ponto (kW)',
+}
+
+# Bitmask of the connector filters a station matches (as the 'Connector Flags' column of
+# load_stations()), computed in one pass over the station's own connectors: a correlated
+# subquery on idx_connectors_station, so only the rows a query matches are looked at
+# (a subquery per bit lets SQLite scan every DC connector per station)
+CONNECTOR_FLAGS_SQL = ' + '.join(
+    f"{1 << bit} * COALESCE(MAX({connector_sql(label)}), 0)" for bit, label in enumerate(CONNECTOR_OPTIONS)
+)
+CONNECTOR_FLAGS_SUBQUERY = f"(SELECT {CONNECTOR_FLAGS_SQL} FROM connectors WHERE station_id = stations.id)"
+
+# SQL predicates for the bucket labels, with the same edges as station_data's
+# power_range_labels, charging_points_labels and power_per_point_categories
+POWER_RANGE_SQL = {
+    '0-50': 'potencia_total_kw <= 50',
+    '51-100': '(potencia_total_kw > 50 AND potencia_total_kw <= 100)',
+    '100+': '(potencia_total_kw > 100 OR potencia_total_kw IS NULL)',
+}
+CHARGING_POINTS_SQL = {
+    '1 point': 'numero_pontos = 1',
+    '2 points': 'numero_pontos = 2',
+    '3-4 points': '(numero_pontos <= 4 AND numero_pontos NOT IN (1, 2))',
+    '5+ points': '(numero_pontos > 4 OR numero_pontos IS NULL)',
+}
+POWER_PER_POINT_SQL = {
+    '< 7 kW': 'potencia_por_ponto_kw < 7',
+    '7-22 kW (AC Normal/Fast)': '(potencia_por_ponto_kw >= 7 AND potencia_por_ponto_kw <= 22)',
+    '23-50 kW (DC Fast)': '(potencia_por_ponto_kw > 22 AND potencia_por_ponto_kw <= 50)',
+    '> 50 kW (DC Ultra-Fast)': 'potencia_por_ponto_kw > 50',
+    'N/A': 'potencia_por_ponto_kw IS NULL',
+}
+
+
+# Function to identify the current version of the database on disk; with WAL the
+# latest writes live in the -wal file until a checkpoint, so both are included
+def database_version(path=DB_FILE):
+    version = dataset_version(path)
+    if version is None:
+        return None
+    return f"{version}/{dataset_version(path + '-wal')}"
+
+
+# Function to OR the SQL predicates of the selected labels (empty selection: no filter)
+def _labels_clause(selected, predicates):
+    if not selected:
+        return None
+    return '(' + ' OR '.join(predicates[label] for label in selected) + ')'
+
+
+class StationDatabase:
+    """Read-only access to charging_stations.db with the sidebar filters pushed down as SQL.
+
+    Connections are opened read-only and kept in a small pool shared by all
+    sessions; each one is used by a single thread at a time.
+    """
+
+    def __init__(self, path=DB_FILE, pool_size=4):
+        self.path = path
+        self.pool_size = pool_size
+        self._uri = f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+        self._pool = queue.LifoQueue()
+        # (database_version, schema facts) of the last schema check, see _schema
+        self._schema_cache = None
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+        try:
+            yield conn
+        finally:
+            if self._pool.qsize() < self.pool_size:
+                self._pool.put(conn)
+            else:
+                conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    # Function to read what the queries depend on from the schema, once per version of the
+    # database on disk (create_db.py can add the table and column below at any time)
+    def _schema(self):
+        version = database_version(self.path)
+        cached = self._schema_cache
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with self.connection() as conn:
+            sql = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'connectors'"
+            schema = {
+                'connectors': conn.execute(sql).fetchone() is not None,
+                'cities_canonical': any(row[1] == 'cidade_original'
+                                        for row in conn.execute("PRAGMA table_info(stations)")),
+            }
+        self._schema_cache = (version, schema)
+        return schema
+
+    # Function to check for the connectors table (databases built before it have none,
+    # until create_db.py runs again)
+    def _has_connectors(self):
+        return self._schema()['connectors']
+
+    # Function to check whether the stored cities are canonical already: databases built (or
+    # migrated) by create_db.py keep the raw spelling in cidade_original and the canonical
+    # name in cidade; older ones hold the raw spelling, normalized on reading
+    def _cities_canonical(self):
+        return self._schema()['cities_canonical']
+
+    # Function to get the mapping from a stored city to the name the dashboard shows
+    def _city_name(self):
+        return (lambda city: city) if self._cities_canonical() else normalize_city_name
+
+    # Function to get the SQL expression of a station's connector flags
+    def _flags_sql(self):
+        return CONNECTOR_FLAGS_SUBQUERY if self._has_connectors() else '0'
+
+    # Function to get the SELECT ... FROM of the station columns, with the connector flags
+    def _select(self):
+        return f"SELECT {', '.join(DB_COLUMNS)}, {self._flags_sql()} AS connector_flags FROM stations"
+
+    def _raw_cities(self):
+        with self.connection() as conn:
+            return [row[0] for row in conn.execute("SELECT DISTINCT cidade FROM stations WHERE removido = 0")]
+
+    def cities(self):
+        """Normalized city names of the active stations, sorted."""
+        city_name = self._city_name()
+        names = {city_name(city) for city in self._raw_cities() if city is not None}
+        return sorted(names)
+
+    # Function to build the WHERE clause and its parameters for a filter combination;
+    # the city is matched through every raw spelling that normalizes to it, so the
+    # cidade index is used, and the connector filters through the connectors table's indexes
+    def _where(self, city='All', power_ranges=(), charging_points=(), connectors=(), categories=()):
+        clauses, params = ['removido = 0'], []
+        if city != 'All':
+            city_name = self._city_name()
+            raw = [value for value in self._raw_cities() if value is not None and city_name(value) == city]
+            city_clause = f"cidade IN ({', '.join('?' * len(raw))})" if raw else '0'
+            if city == 'Not specified':
+                city_clause = f"({city_clause} OR cidade IS NULL)"
+            clauses.append(city_clause)
+            params.extend(raw)
+        for selected, predicates in [(power_ranges, POWER_RANGE_SQL),
+                                     (charging_points, CHARGING_POINTS_SQL),
+                                     (categories, POWER_PER_POINT_SQL)]:
+            clause = _labels_clause(selected, predicates)
+            if clause:
+                clauses.append(clause)
+        if connectors:
+            predicates = ' OR '.join(connector_sql(label) for label in connectors)
+            clauses.append(f"id IN (SELECT station_id FROM connectors WHERE {predicates})"
+                           if self._has_connectors() else '0')
+        return ' AND '.join(clauses), params
+
+    # Function to turn query rows into the same table load_stations() returns
+    def _to_frame(self, sql, params):
+        with self.connection() as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+        df = df.rename(columns={**DB_COLUMNS, 'connector_flags': 'Connector Flags'})
+        df['Operador'] = df['Operador'].fillna('Unknown')
+        return compact_stations(preprocess_stations(df, cities_canonical=self._cities_canonical()))
+
+    def stations(self, city='All', power_ranges=(), charging_points=(), connectors=()):
+        """Stations matching the sidebar filters, read without loading the rest."""
+        where, params = self._where(city, power_ranges, charging_points, connectors)
+        return self._to_frame(f"{self._select()} WHERE {where} ORDER BY id", params)
+
+    def stats(self, city='All', power_ranges=(), charging_points=(), connectors=()):
+        """Statistics panel values, aggregated by SQLite."""
+        where, params = self._where(city, power_ranges, charging_points, connectors)
+        sql = f''' SELECT COUNT(*), COALESCE(SUM(numero_pontos), 0), COALESCE(SUM(potencia_total_kw), 0),
+                          AVG(potencia_total_kw), AVG(potencia_por_ponto_kw)
+                   FROM stations WHERE {where} '''
+        with self.connection() as conn:
+            stations, points, power, avg_station, avg_point = conn.execute(sql, params).fetchone()
+        return {
+            'total_stations': int(stations),
+            'total_points': int(points),
+            'total_power': float(power),
+            'avg_power_station': np.nan if avg_station is None else avg_station,
+            'avg_power_point': np.nan if avg_point is None else avg_point,
+        }
+
+    def cube_cells(self):
+        """Analytics cube cells (see analytics_cube.StationCube) aggregated by SQLite, so
+        building the cube never loads individual stations."""
+        power_range = ' '.join(f"WHEN {predicate} THEN '{label}'" for label, predicate in POWER_RANGE_SQL.items())
+        sql = f''' SELECT cidade, CASE {power_range} END AS power_range, {self._flags_sql()} AS connector_flags,
+                          numero_pontos, potencia_por_ponto_kw,
+                          COUNT(*) AS stations, COALESCE(SUM(potencia_total_kw), 0) AS power,
+                          COUNT(potencia_total_kw) AS power_count
+                   FROM stations WHERE removido = 0 GROUP BY 1, 2, 3, 4, 5 '''
+        with self.connection() as conn:
+            groups = pd.read_sql_query(sql, conn)
+        cells = pd.DataFrame({
+            'Cidade': (groups['cidade'].fillna('Not specified') if self._cities_canonical()
+                       else normalize_city_column(groups['cidade'])),
+            'Power Range': groups['power_range'],
+            'Charging Points Category': charging_points_labels(groups['numero_pontos']),
+            'Connector Flags': groups['connector_flags'].astype(np.uint8),
+            'Número de Pontos': groups['numero_pontos'].astype(float),
+            'Potência por Ponto (kW)': groups['potencia_por_ponto_kw'].astype(float),
+        })
+        cells[CUBE_MEASURES] = groups[CUBE_MEASURES]
+        # Spellings of the same city fall into one cell once normalized
+        return cells.groupby(list(cells.columns[:6]), dropna=False, observed=True, sort=False).sum().reset_index()
+
+    def connector_table(self):
+        """Connectors of the active stations (see connectors.ConnectorTable)."""
+        if not self._has_connectors():
+            return ConnectorTable(pd.DataFrame(columns=CONNECTOR_COLUMNS))
+        sql = ''' SELECT station_id, tipo, corrente, potencia_kw, quantidade FROM connectors
+                  WHERE station_id IN (SELECT id FROM stations WHERE removido = 0) '''
+        with self.connection() as conn:
+            df = pd.read_sql_query(sql, conn)
+        df.columns = CONNECTOR_COLUMNS
+        return ConnectorTable(df)
+
+    # Function to fetch the stations in the lat/lon box around a point with their distances
+    def _box(self, lat, lon, radius_km, categories):
+        dlat = radius_km / KM_PER_DEGREE
+        dlon = min(radius_km / (KM_PER_DEGREE * np.cos(np.radians(min(abs(lat) + dlat, 89.9)))), 180.0)
+        where, params = self._where(categories=categories)
+        df = self._to_frame(
+            f"{self._select()} WHERE {where} "
+            "AND latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?",
+            params + [lat - dlat, lat + dlat, lon - dlon, lon + dlon]
+        )
+        dist = haversine_km(lat, lon, df['Latitude'].to_numpy(dtype=float), df['Longitude'].to_numpy(dtype=float))
+        return df, dist
+
+    # Function to sort query results by distance and add the 'Distance (km)' column
+    @staticmethod
+    def _with_distance(df, dist, keep):
+        order = np.argsort(dist, kind='stable')[:keep]
+        result = df.iloc[order].copy()
+        result.insert(0, 'Distance (km)', np.round(dist[order], 3))
+        return result
+
+    def within(self, lat, lon, radius_km, categories=None):
+        """Stations within radius_km of a point, nearest first."""
+        df, dist = self._box(lat, lon, radius_km, categories)
+        inside = dist <= radius_km
+        return self._with_distance(df[inside], dist[inside], None)
+
+    def nearest(self, lat, lon, k=5, categories=None, start_km=5.0):
+        """The k stations nearest to a point; the search box doubles until its
+        inscribed circle holds k stations (or it covers the globe)."""
+        radius_km = start_km
+        while True:
+            df, dist = self._box(lat, lon, radius_km, categories)
+            if np.count_nonzero(dist <= radius_km) >= k or radius_km > 180 * KM_PER_DEGREE:
+                return self._with_distance(df, dist, k)
+            radius_km *= 2
+
+    def along_route(self, route, categories=None):
+        """Stations within the corridor of a RouteSegmentIndex, in order along the route:
+        the box around the route is read from the database, and matched with a grid index."""
+        lat_min, lat_max, lon_min, lon_max = route.bounds
+        dlat = route.width_km / KM_PER_DEGREE
+        max_abs_lat = min(max(abs(lat_min), abs(lat_max)) + dlat, 89.9)
+        dlon = min(route.width_km / (KM_PER_DEGREE * np.cos(np.radians(max_abs_lat))), 180.0)
+        where, params = self._where(categories=categories)
+        df = self._to_frame(
+            f"{self._select()} WHERE {where} "
+            "AND latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?",
+            params + [lat_min - dlat, lat_max + dlat, lon_min - dlon, lon_max + dlon]
+        )
+        return stations_along_route(df, StationSpatialIndex.from_frame(df, route.cell_deg), route)
@@ -0,0 +1,321 @@
+import json
+
+import folium
+import numpy as np
+import pandas as pd
+from branca.element import Element, MacroElement
+from folium.plugins import FastMarkerCluster, HeatMap, MarkerCluster
+from folium.template import Template
+
+# Southwest / northeast corners used to frame the map on Portugal
+PORTUGAL_BOUNDS = [
+    [36.8, -9.5],  # Southwest corner
+    [42.2, -6.1]   # Northeast corner
+]
+
+# Distance to the nearest station (km) at which the charging gaps heatmap is at full intensity;
+# cells under a tenth of it are left out of the layer
+COVERAGE_CAP_KM = 20
+COVERAGE_GRADIENT = {'0.2': '#ffffb2', '0.5': '#fecc5c', '0.75': '#fd8d3c', '1.0': '#e31a1c'}
+
+# Round blue cluster bubble shared by every clustering mode
+CLUSTER_ICON_JS = """
+        function(cluster) {
+            return L.divIcon({
+                html: '<div style="background-color: #00C0F3; color: black; width: 30px; height: 30px; border-radius: 15px; display: flex; align-items: center; justify-content: center; border: 2px solid white;">' + cluster.getChildCount() + '</div>',
+                className: 'marker-cluster-custom',
+                iconSize: L.point(30, 30)
+            });
+        }
+        """
+
+# Browser-side marker factory for the bulk path: each data row is
+# [lat, lon, popup_html, tooltip] and becomes the same plug marker the loop builds
+MARKER_CALLBACK_JS = """
+        function (row) {
+            var icon = L.AwesomeMarkers.icon({
+                icon: 'plug', prefix: 'fa', markerColor: 'blue', iconColor: '#00C0F3'
+            });
+            var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+            marker.bindPopup(row[2], {maxWidth: 350});
+            marker.bindTooltip(row[3]);
+            return marker;
+        }
+        """
+
+
+# Browser-side factory for server-side cluster bubbles: each row is [lat, lon, count];
+# clicking a bubble zooms in on it, which makes the app send the next level
+CLUSTER_CALLBACK_JS = """
+        function (row) {
+            var icon = L.divIcon({
+                html: '<div style="background-color: #00C0F3; color: black; width: 30px; height: 30px; border-radius: 15px; display: flex; align-items: center; justify-content: center; border: 2px solid white;">' + row[2] + '</div>',
+                className: 'marker-cluster-custom',
+                iconSize: L.point(30, 30)
+            });
+            var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+            marker.on('click', function (e) {
+                e.target._map.setView(e.latlng, e.target._map.getZoom() + 2);
+            });
+            return marker;
+        }
+        """
+
+
+# Function to format a numeric column as strings, with a placeholder for NaN
+def _format_column(values, fmt, missing='N/A'):
+    values = pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+    out = np.char.mod(fmt, np.nan_to_num(values)).astype(object)
+    out[np.isnan(values)] = missing
+    return pd.Series(out, dtype=object)
+
+
+# Function to turn a text column into strings, with a placeholder for missing values
+def _text_column(values, missing='Not available'):
+    values = pd.Series(values, dtype=object).reset_index(drop=True)
+    values = values.where(values.notna() & (values != ''), missing)
+    return values.astype(str)
+
+
+# Function to build the popup HTML for every station at once (column-wise)
+def build_popup_html(df):
+    num_points = pd.to_numeric(df['Número de Pontos'], errors='coerce')
+    total_power = pd.to_numeric(df['Potência Total (kW)'], errors='coerce').reset_index(drop=True)
+    total_power_str = total_power.astype(str).where(total_power.notna(), 'N/A')
+
+    html = (
+        '<div><h4>' + _text_column(df['Nome'], missing='None') + '</h4>'
+        + '<b>Operator:</b> ' + _text_column(df['Operador']) + '<br>'
+        + '<b>Address:</b> ' + _text_column(df['Endereço']) + '<br>'
+        + '<b>City:</b> ' + _text_column(df['Cidade'], missing='Not specified') + '<br>'
+        + '<b>Postal Code:</b> ' + _text_column(df['Código Postal']) + '<br>'
+        + '<b>Latitude:</b> ' + _format_column(df['Latitude'], '%.5f') + '<br>'
+        + '<b>Longitude:</b> ' + _format_column(df['Longitude'], '%.5f') + '<br>'
+        + '<b>Number of Charging Points:</b> ' + _format_column(num_points, '%d') + '<br>'
+        + '<b>Total Power:</b> ' + total_power_str + ' kW<br>'
+        + '<b>Power per Point:</b> ' + _format_column(df['Potência por Ponto (kW)'], '%.2f') + ' kW<br>'
+        + '<b>Last Update:</b> ' + _text_column(df['Data Atualização'], missing='None') + '<br>'
+        + '</div>'
+    )
+    html.index = df.index
+    return html
+
+
+# Function to add one folium.Marker per station (original row-by-row path)
+def _add_markers_loop(df, marker_cluster):
+    for idx, station in df.iterrows():
+        # Check again for NaN just before creating marker
+        if pd.notna(station['Latitude']) and pd.notna(station['Longitude']):
+            power_per_point_str = f"{station['Potência por Ponto (kW)']:.2f}" if pd.notna(station['Potência por Ponto (kW)']) else 'N/A'
+            num_points_str = f"{int(station['Número de Pontos'])}" if pd.notna(station['Número de Pontos']) else 'N/A'
+            total_power_str = f"{station['Potência Total (kW)']}" if pd.notna(station['Potência Total (kW)']) else 'N/A'
+            html = f"""
+                <div>
+                    <h4>{station['Nome']}</h4>
+                    <b>Operator:</b> {station['Operador'] or 'Not available'}<br>
+                    <b>Address:</b> {station['Endereço'] or 'Not available'}<br>
+                    <b>City:</b> {station['Cidade']}<br>
+                    <b>Postal Code:</b> {station['Código Postal'] or 'Not available'}<br>
+                    <b>Latitude:</b> {station['Latitude']:.5f}<br>
+                    <b>Longitude:</b> {station['Longitude']:.5f}<br>
+                    <b>Number of Charging Points:</b> {num_points_str}<br>
+                    <b>Total Power:</b> {total_power_str} kW<br>
+                    <b>Power per Point:</b> {power_per_point_str} kW<br>
+                    <b>Last Update:</b> {station['Data Atualização']}<br>
+                </div>
+            """
+            folium.Marker(
+                location=[station['Latitude'], station['Longitude']],
+                popup=folium.Popup(html, max_width=350),
+                icon=folium.Icon(color='blue', icon_color='#00C0F3', icon='plug', prefix='fa'),
+                tooltip=station['Nome']
+            ).add_to(marker_cluster)
+
+
+# Script fragment emitted verbatim; branca would otherwise compile the text
+# as a Jinja template, which costs seconds for a large data array
+class _RawScript(Element):
+    def __init__(self, script):
+        super().__init__()
+        self.script = script
+
+    def render(self, **kwargs):
+        return self.script
+
+
+# FastMarkerCluster whose rows are written as a separate raw script
+# instead of being inlined through the Jinja template
+class BulkMarkerCluster(FastMarkerCluster):
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function(){
+                {{ this.callback }}
+
+                var data = {{ this.get_name() }}_data;
+                var cluster = L.markerClusterGroup({{ this.options|tojavascript }});
+                {%- if this.icon_create_function is not none %}
+                cluster.options.iconCreateFunction =
+                    {{ this.icon_create_function.strip() }};
+                {%- endif %}
+
+                for (var i = 0; i < data.length; i++) {
+                    var marker = callback(data[i]);
+                    marker.addTo(cluster);
+                }
+
+                cluster.addTo({{ this._parent.get_name() }});
+                return cluster;
+            })();
+        {% endmacro %}"""
+    )
+
+    def __init__(self, rows, **kwargs):
+        # FastMarkerCluster validates every row in Python; start empty and
+        # keep the already-clean rows aside
+        super().__init__([], **kwargs)
+        self._name = 'BulkMarkerCluster'
+        self.rows = rows
+
+    def render(self, **kwargs):
+        data = json.dumps(self.rows, ensure_ascii=False).replace('</', '<\\/')
+        self.get_root().script.add_child(
+            _RawScript(f'var {self.get_name()}_data = {data};'),
+            name=self.get_name() + '_data'
+        )
+        super().render(**kwargs)
+
+
+# Function to build the bulk marker layer: all rows are emitted as one JS array
+# and turned into markers in the browser by MARKER_CALLBACK_JS
+def _bulk_marker_cluster(df):
+    valid = df[df['Latitude'].notna() & df['Longitude'].notna()]
+    popups = build_popup_html(valid)
+    tooltips = _text_column(valid['Nome'], missing='')
+
+    rows = [
+        list(row) for row in zip(
+            # ~0.1 m precision; keeps float32 coordinates from printing as long decimals
+            valid['Latitude'].astype(float).round(6).tolist(),
+            valid['Longitude'].astype(float).round(6).tolist(),
+            popups.tolist(),
+            tooltips.tolist()
+        )
+    ]
+    return BulkMarkerCluster(
+        rows,
+        callback=MARKER_CALLBACK_JS.strip(),
+        name='Stations',
+        icon_create_function=CLUSTER_ICON_JS
+    )
+
+
+# Small marker layer with its rows inlined in the template. Used for the
+# viewport layer, which st_folium renders by calling the script macro directly.
+class InlineMarkers(MacroElement):
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            (function(){
+                {{ this.callback }}
+                var data = {{ this.rows|tojson }};
+                for (var i = 0; i < data.length; i++) {
+                    callback(data[i]).addTo({{ this._parent.get_name() }});
+                }
+            })();
+        {% endmacro %}"""
+    )
+
+    def __init__(self, rows, callback):
+        super().__init__()
+        self._name = 'InlineMarkers'
+        self.rows = rows
+        self.callback = f"var callback = {callback.strip()};"
+
+
+# Function to build the viewport layer from a GridClusterIndex query:
+# cluster bubbles plus plug markers for the stations shown on their own
+def viewport_layer(df, clusters, rows):
+    layer = folium.FeatureGroup(name='Stations')
+    cluster_rows = [
+        list(row) for row in zip(clusters['lat'].round(6).tolist(), clusters['lon'].round(6).tolist(),
+                                 clusters['count'].tolist())
+    ]
+    InlineMarkers(cluster_rows, CLUSTER_CALLBACK_JS).add_to(layer)
+
+    stations = df.iloc[rows]
+    station_rows = [
+        list(row) for row in zip(
+            stations['Latitude'].astype(float).round(6).tolist(),
+            stations['Longitude'].astype(float).round(6).tolist(),
+            build_popup_html(stations).tolist(),
+            _text_column(stations['Nome'], missing='').tolist()
+        )
+    ]
+    InlineMarkers(station_rows, MARKER_CALLBACK_JS).add_to(layer)
+    return layer
+
+
+# Function to build the charging gaps heatmap from a CoverageGrid (coverage.py): every land
+# cell weighs its distance to the nearest station (fast stations only if fast), up to cap_km
+def coverage_layer(coverage, fast=False, cap_km=COVERAGE_CAP_KM):
+    weight = np.minimum(coverage.distances(fast) / cap_km, 1.0)
+    keep = weight >= 0.1
+    rows = np.column_stack([coverage.lat[keep].round(4), coverage.lon[keep].round(4), weight[keep].round(3)])
+    return HeatMap(
+        rows.tolist(),
+        name=f"Distance to the nearest {'≥50 kW ' if fast else ''}station",
+        min_opacity=0.2,
+        radius=18,
+        blur=22,
+        gradient=COVERAGE_GRADIENT
+    )
+
+
+# Function to create the base map without any station layer
+def create_base_map(center_lat=39.5, center_lon=-8.0, zoom=7, fit_portugal=True):
+    m = folium.Map(
+        location=[center_lat, center_lon],
+        zoom_start=zoom,
+        tiles="OpenStreetMap"
+    )
+    if fit_portugal:
+        m.fit_bounds(PORTUGAL_BOUNDS)
+    return m
+
+
+# Function to create map
+# (coverage: optional CoverageGrid shown as a charging gaps heatmap under the stations)
+def create_map(df, center_lat=39.5, center_lon=-8.0, zoom=7, bulk=True, coverage=None, coverage_fast=False):
+    m = create_base_map(center_lat, center_lon, zoom)
+    if coverage is not None:
+        coverage_layer(coverage, coverage_fast).add_to(m)
+
+    if bulk:
+        _bulk_marker_cluster(df).add_to(m)
+    else:
+        marker_cluster = MarkerCluster(
+            name='Stations',
+            icon_create_function=CLUSTER_ICON_JS
+        ).add_to(m)
+        _add_markers_loop(df, marker_cluster)
+
+    if coverage is not None:
+        folium.LayerControl(collapsed=False).add_to(m)
+    return m
+
+
+# Function to create the map of a route (lists of latitudes and longitudes) and the
+# stations found along it
+def create_route_map(route_lats, route_lons, df):
+    m = create_base_map(fit_portugal=False)
+    folium.PolyLine(list(zip(route_lats, route_lons)), color='#00C0F3', weight=4, name='Route').add_to(m)
+    if not df.empty:
+        _bulk_marker_cluster(df).add_to(m)
+    m.fit_bounds([[min(route_lats), min(route_lons)], [max(route_lats), max(route_lons)]])
+    return m
+
+
+# Function to render a map to the standalone HTML document folium_static would embed
+def render_map_html(m):
+    return folium.Figure().add_child(m).render()
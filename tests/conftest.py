@@ -0,0 +1,40 @@
+import os
+import sys
+
+# The modules live at the top of the repository (flat scripts, no package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+# Connectors as they appear in processed station records (see connectors.connector_records),
+# including the odd ones: power as text or missing, no current, no quantity, zero quantity
+CONNECTOR_CHOICES = [
+    {'Tipo': 'Type 2 (Socket Only)', 'Corrente': 'AC (Three-Phase)', 'Potência (kW)': 22.0, 'Quantidade': 2},
+    {'Tipo': 'Type 2 (Tethered Connector)', 'Corrente': 'AC (Three-Phase)', 'Potência (kW)': '11', 'Quantidade': 1},
+    {'Tipo': 'CCS (Type 2)', 'Corrente': 'DC', 'Potência (kW)': 150.0, 'Quantidade': 1},
+    {'Tipo': 'CCS (Type 2)', 'Corrente': 'DC', 'Potência (kW)': 50, 'Quantidade': None},
+    {'Tipo': 'CCS (Type 1)', 'Corrente': 'DC', 'Potência (kW)': 350.0, 'Quantidade': 0},
+    {'Tipo': 'CHAdeMO', 'Corrente': 'DC', 'Potência (kW)': 50.0, 'Quantidade': 1},
+    {'Tipo': 'CHAdeMO', 'Corrente': 'DC', 'Potência (kW)': None, 'Quantidade': 1},
+    {'Tipo': 'Other', 'Corrente': None, 'Potência (kW)': 3.7, 'Quantidade': 1},
+]
+
+
+@pytest.fixture
+def station_records():
+    """Processed station records (as in postos_carregamento.json) with 0-3 connectors each,
+    and a few stations without a point count or a total power."""
+    from benchmarks.db_load import make_records
+    from connectors import CONNECTORS_KEY
+
+    rng = np.random.default_rng(21)
+    records = make_records(600)
+    for i, record in enumerate(records):
+        record[CONNECTORS_KEY] = [dict(CONNECTOR_CHOICES[c])
+                                  for c in rng.integers(0, len(CONNECTOR_CHOICES), rng.integers(0, 4))]
+        if i % 37 == 0:
+            record['Número de Pontos'] = None
+        if i % 41 == 0:
+            record['Potência Total (kW)'] = None
+    return records
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics_cube import StationCube, nice_bins
+from station_data import CHARGING_POINTS_OPTIONS, POWER_RANGES, filter_stations, stations_from_records
+
+FILTERS = [
+    {},
+    {'city': 'Lisboa'},
+    {'city': 'Porto', 'power_ranges': ['0-50']},
+    {'power_ranges': ['51-100', '100+'], 'charging_points': ['1 point', '5+ points']},
+    {'connectors': ['DC ≥ 50 kW']},
+    {'connectors': ['CCS', 'CHAdeMO'], 'charging_points': ['2 points']},
+    {'city': 'Nowhere'},
+]
+
+
+@pytest.fixture
+def stations(station_records):
+    return stations_from_records(station_records)
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_stats_match_the_filtered_frame(stations, filters):
+    selected = filter_stations(stations, **filters)
+    stats = StationCube.from_frame(stations).stats(**filters)
+
+    assert stats['total_stations'] == len(selected)
+    assert stats['total_points'] == selected['Número de Pontos'].sum()
+    assert stats['total_power'] == pytest.approx(selected['Potência Total (kW)'].sum())
+    assert stats['avg_power_station'] == pytest.approx(selected['Potência Total (kW)'].mean(), nan_ok=True)
+    assert stats['avg_power_point'] == pytest.approx(selected['Potência por Ponto (kW)'].mean(), nan_ok=True)
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+@pytest.mark.parametrize('col', ['Cidade', 'Power Range', 'Charging Points Category'])
+def test_counts_by_match_value_counts(stations, filters, col):
+    cube = StationCube.from_frame(stations)
+    counts = cube.counts_by(col, **filters)
+    expected = filter_stations(stations, **filters)[col].value_counts().reindex(counts.index, fill_value=0)
+
+    assert counts.to_dict() == expected.to_dict()
+
+
+def test_counts_by_keeps_the_display_order(stations):
+    cube = StationCube.from_frame(stations)
+    assert cube.counts_by('Power Range').index.tolist() == POWER_RANGES
+    assert cube.counts_by('Charging Points Category').index.tolist() == CHARGING_POINTS_OPTIONS
+
+
+@pytest.mark.parametrize('filters', FILTERS[:4])
+def test_avg_power_by_points_matches_a_groupby(stations, filters):
+    selected = filter_stations(stations, **filters)
+    expected = selected.groupby('Número de Pontos')['Potência Total (kW)'].mean()
+    result = StationCube.from_frame(stations).avg_power_by_points(**filters)
+
+    np.testing.assert_array_equal(result['Número de Pontos'], expected.index)
+    np.testing.assert_allclose(result['Average Total Power (kW)'], expected.to_numpy())
+
+
+# Vega-Lite's bin transform ({"bin": {"maxbins": N}}) on the same extents
+@pytest.mark.parametrize('extent, maxbins, expected', [
+    ((0, 100), 10, (0, 100, 10)),
+    ((0, 100), 20, (0, 100, 5)),
+    ((3.7, 350), 20, (0, 360, 20)),
+    ((22, 22), 20, (22, 24, 2)),
+])
+def test_nice_bins_match_vega_lite(extent, maxbins, expected):
+    start, stop, step = nice_bins(*extent, maxbins=maxbins)
+    assert (start, stop, step) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_ppp_histogram_matches_numpy(stations, filters):
+    ppp = filter_stations(stations, **filters)['Potência por Ponto (kW)'].dropna().to_numpy()
+    result = StationCube.from_frame(stations).ppp_histogram(**filters)
+    if not len(ppp):
+        assert result.empty
+        return
+
+    start, stop, step = nice_bins(ppp.min(), ppp.max())
+    counts, edges = np.histogram(ppp, bins=np.arange(start, stop + step / 2, step))
+    non_empty = counts > 0
+    np.testing.assert_allclose(result['bin_start'], edges[:-1][non_empty])
+    np.testing.assert_allclose(result['bin_end'], edges[1:][non_empty])
+    np.testing.assert_array_equal(result['count'], counts[non_empty])
+    assert result['count'].sum() == len(ppp)
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from city_names import CityResolver, canonical_cities, city_key, default_resolver, title_case
+
+
+@pytest.fixture(scope='module')
+def resolver():
+    return default_resolver()
+
+
+@pytest.mark.parametrize('city, expected', [
+    ('Lisboa', 'Lisboa'),
+    ('LISBOA', 'Lisboa'),
+    ('Lisbon', 'Lisboa'),
+    ('Lisboa - Alvalade', 'Lisboa'),
+    ('V.N. Gaia', 'Vila Nova de Gaia'),
+    ('V.N. de Gaia 4400-123', 'Vila Nova de Gaia'),
+    ('Arcozelo, Gaia', 'Vila Nova de Gaia'),
+    ('S. João da Madeira', 'São João da Madeira'),
+    ('Ponte Lima', 'Ponte de Lima'),
+    ('Idanha-a-Nova', 'Idanha-a-Nova'),
+    ('Vila Real de Santo António', 'Vila Real de Santo António'),
+])
+def test_spellings_resolve_to_the_gazetteer_name(resolver, city, expected):
+    assert resolver.match(city) == expected
+
+
+# Only whole keys match: no municipality is found inside an unrelated name
+@pytest.mark.parametrize('city', ['Gaiato', 'Portela', 'Pontevedra', 'Vila', 'Nova', '', None, np.nan])
+def test_unrelated_names_do_not_match(resolver, city):
+    assert resolver.match(city) is None
+
+
+def test_canonical_name_title_cases_unknown_spellings(resolver):
+    assert resolver.canonical_name('QUINTA DO CONDE') == 'Quinta do Conde'
+    assert resolver.canonical_name('lisbon') == 'Lisboa'
+
+
+def test_city_key_and_title_case():
+    assert city_key('V.N. de Gaia 4400') == 'vila nova de gaia'
+    assert city_key('São João') == 'sao joao'
+    assert title_case('ponte DE lima') == 'Ponte de Lima'
+
+
+def test_short_keys_pointing_to_two_municipalities_are_dropped():
+    resolver = CityResolver([
+        {'name': 'Vila do Porto', 'district': 'Açores'},
+        {'name': 'Vila Porto', 'district': 'Elsewhere'},
+        {'name': 'Ponte de Lima', 'district': 'Viana do Castelo'},
+    ])
+    # 'vila porto' is a full key of one of them, so it still wins over the other's short key
+    assert resolver.match('Vila Porto') == 'Vila Porto'
+    assert resolver.match('Vila do Porto') == 'Vila do Porto'
+    assert resolver.match('Ponte Lima') == 'Ponte de Lima'
+    assert resolver.match('PontedeLima') == 'Ponte de Lima'
+
+
+def test_postcode_fills_in_unknown_cities():
+    cities = ['Lisboa', 'Lisboa', 'Lisboa', 'Belém', None, 'Belém']
+    postcodes = ['1000-001', '1000-200', '1000', '1000-300', '1000-400', '9999-000']
+    assert canonical_cities(cities, postcodes).tolist() == [
+        'Lisboa', 'Lisboa', 'Lisboa', 'Lisboa', 'Lisboa', 'Belém']
+
+
+def test_postcode_needs_enough_stations_that_agree():
+    # Two resolved stations are below MIN_SUPPORT; a 2-2 split is below MIN_AGREEMENT
+    assert canonical_cities(['Lisboa', 'Lisboa', 'Belém'], ['1000-001', '1000-002', '1000-003']).tolist() == [
+        'Lisboa', 'Lisboa', 'Belém']
+    cities = ['Lisboa', 'Lisboa', 'Oeiras', 'Oeiras', 'Belém']
+    assert canonical_cities(cities, ['1400-001'] * 5).tolist() == cities
+
+
+def test_coordinates_fill_in_what_the_postcode_does_not():
+    cities = ['Porto', 'Porto', 'Porto', 'Foz', 'Foz']
+    postcodes = [None, None, None, None, 'not a postcode']
+    lats = [41.151, 41.152, 41.153, 41.154, 45.0]
+    lons = [-8.611, -8.612, -8.613, -8.614, -8.611]
+    assert canonical_cities(cities, postcodes, lats, lons).tolist() == ['Porto', 'Porto', 'Porto', 'Porto', 'Foz']
+
+
+def test_unknown_spellings_share_the_most_common_variant():
+    cities = ['QUINTA DO CONDE', 'quinta do conde', 'Quinta-do-Conde', None]
+    assert canonical_cities(cities).tolist() == ['Quinta do Conde'] * 3 + [None]
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from clustering import (CELL_PX, GridClusterIndex, lonlat_to_pixels, parse_leaflet_bounds,
+                        pixels_to_lonlat)
+
+WORLD = [[-85.0, -180.0], [85.0, 180.0]]
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(6)
+    # Dense clusters (cities) plus scattered stations over mainland Portugal
+    centres = np.array([[38.72, -9.14], [41.15, -8.61], [40.21, -8.43]])
+    dense = centres[rng.integers(0, 3, 300)] + rng.normal(0, 0.02, (300, 2))
+    sparse = np.column_stack([rng.uniform(37.0, 42.0, 200), rng.uniform(-9.5, -6.2, 200)])
+    lat, lon = np.vstack([dense, sparse]).T
+    return lat, lon
+
+
+# Function to group the points by their grid cell at a zoom, straight from the projection
+def brute_force_cells(lat, lon, zoom):
+    x, y = lonlat_to_pixels(lat, lon, zoom)
+    cells = pd.DataFrame({'cx': (x // CELL_PX).astype(np.int64), 'cy': (y // CELL_PX).astype(np.int64),
+                          'lat': lat, 'lon': lon})
+    return cells.groupby(['cx', 'cy']).agg(count=('lat', 'size'), lat=('lat', 'mean'), lon=('lon', 'mean'))
+
+
+def test_pixels_round_trip():
+    lat, lon = np.array([38.72, -33.9, 0.0, 60.0]), np.array([-9.14, 151.2, 0.0, -179.0])
+    back_lat, back_lon = pixels_to_lonlat(*lonlat_to_pixels(lat, lon, 12), 12)
+    np.testing.assert_allclose(back_lat, lat, atol=1e-9)
+    np.testing.assert_allclose(back_lon, lon, atol=1e-9)
+
+
+@pytest.mark.parametrize('zoom', [0, 5, 9, 13, 18])
+def test_levels_match_a_direct_grouping(points, zoom):
+    lat, lon = points
+    level = GridClusterIndex(lat, lon).levels[zoom]
+    expected = brute_force_cells(lat, lon, zoom)
+
+    keys = level['keys']
+    np.testing.assert_array_equal(keys >> 32, expected.index.get_level_values('cx'))
+    np.testing.assert_array_equal(keys & 0xFFFFFFFF, expected.index.get_level_values('cy'))
+    np.testing.assert_array_equal(level['count'], expected['count'])
+    np.testing.assert_allclose(level['lat'], expected['lat'])
+    np.testing.assert_allclose(level['lon'], expected['lon'])
+
+
+@pytest.mark.parametrize('zoom', [3, 8, 11, 16])
+def test_world_query_covers_every_station_once(points, zoom):
+    lat, lon = points
+    clusters, rows = GridClusterIndex(lat, lon).query(WORLD, zoom)
+
+    assert clusters['count'].sum() + len(rows) == len(lat)
+    assert (clusters['count'] > 1).all()
+    assert len(set(rows.tolist())) == len(rows)
+
+
+def test_single_station_cells_point_at_their_station(points):
+    lat, lon = points
+    _, rows = GridClusterIndex(lat, lon).query(WORLD, 18)
+    expected = brute_force_cells(lat, lon, 18)
+
+    assert len(rows) == (expected['count'] == 1).sum()
+    x, y = lonlat_to_pixels(lat[rows], lon[rows], 18)
+    cells = set(zip((x // CELL_PX).astype(int), (y // CELL_PX).astype(int)))
+    assert cells == set(expected.index[expected['count'] == 1])
+
+
+@pytest.mark.parametrize('zoom', [7, 10, 13])
+def test_viewport_query_returns_the_cells_it_overlaps(points, zoom):
+    lat, lon = points
+    bounds = [[38.5, -9.4], [39.0, -8.9]]
+    clusters, rows = GridClusterIndex(lat, lon).query(bounds, zoom)
+
+    # Cells the viewport overlaps, found by projecting its corners
+    x0, y0 = lonlat_to_pixels(bounds[1][0], bounds[0][1], zoom)
+    x1, y1 = lonlat_to_pixels(bounds[0][0], bounds[1][1], zoom)
+    expected = brute_force_cells(lat, lon, zoom)
+    cx, cy = expected.index.get_level_values('cx'), expected.index.get_level_values('cy')
+    expected = expected[(cx >= x0 // CELL_PX) & (cx <= x1 // CELL_PX) & (cy >= y0 // CELL_PX) & (cy <= y1 // CELL_PX)]
+
+    assert clusters['count'].sum() + len(rows) == expected['count'].sum()
+    assert len(clusters) == (expected['count'] > 1).sum()
+
+
+def test_parse_leaflet_bounds():
+    bounds = {'_southWest': {'lat': 38.5, 'lng': -200.0}, '_northEast': {'lat': 39.0, 'lng': -8.9}}
+    assert parse_leaflet_bounds(bounds) == [[38.5, -180.0], [39.0, -8.9]]
+    assert parse_leaflet_bounds(None) is None
+    assert parse_leaflet_bounds({'_southWest': {'lat': None, 'lng': 0}, '_northEast': {'lat': 1, 'lng': 1}}) is None
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from connectors import (CONNECTOR_FILTERS, CONNECTOR_OPTIONS, CONNECTORS_KEY, ConnectorTable, connector_bits,
+                        connector_records)
+
+
+# Function to check one connector against a filter spec, the plain way
+def connector_matches(conn, current=None, min_power=None, types=None):
+    power = pd.to_numeric(conn.get('Potência (kW)'), errors='coerce')
+    quantity = 1 if conn.get('Quantidade') is None else conn['Quantidade']
+    return (quantity > 0
+            and (current is None or conn.get('Corrente') == current)
+            and (min_power is None or (power is not None and power >= min_power))
+            and (types is None or conn.get('Tipo') in types))
+
+
+def test_flags_match_a_loop_over_each_station(station_records):
+    table = ConnectorTable.from_records(station_records)
+    ids = [record['ID'] for record in station_records] + [10 ** 9]  # the last one has no connectors
+    flags = table.flags(ids)
+
+    for record, station_flags in zip(station_records, flags):
+        expected = 0
+        for bit, spec in enumerate(CONNECTOR_FILTERS.values()):
+            if any(connector_matches(conn, **spec) for conn in record[CONNECTORS_KEY]):
+                expected |= 1 << bit
+        assert station_flags == expected, record
+    assert flags[-1] == 0
+
+
+def test_count_and_max_power_match_a_loop_over_each_station(station_records):
+    table = ConnectorTable.from_records(station_records)
+    ids = [record['ID'] for record in station_records]
+    counts = table.count(ids, current='DC', min_power=50)
+    max_dc = table.max_power(ids, current='DC')
+
+    for record, count, power in zip(station_records, counts, max_dc):
+        dc = [conn for conn in record[CONNECTORS_KEY] if conn['Corrente'] == 'DC']
+        assert count == sum(1 if conn['Quantidade'] is None else conn['Quantidade']
+                            for conn in dc if connector_matches(conn, 'DC', 50))
+        powers = [conn['Potência (kW)'] for conn in dc if conn['Potência (kW)'] is not None]
+        if powers:
+            assert power == max(powers)
+        else:
+            assert np.isnan(power)
+
+
+def test_connector_bits():
+    assert connector_bits([]) == 0
+    assert connector_bits(['DC ≥ 50 kW']) == 1
+    assert connector_bits(['CCS', 'Type 2', 'CCS']) == (1 << CONNECTOR_OPTIONS.index('CCS')) | \
+        (1 << CONNECTOR_OPTIONS.index('Type 2'))
+
+
+def test_connector_records_from_the_api():
+    connections = [{'ConnectionTypeID': 33, 'CurrentTypeID': 30, 'PowerKW': 150, 'Quantity': None},
+                   {'ConnectionTypeID': 999, 'CurrentTypeID': None, 'PowerKW': None, 'Quantity': 2}]
+    assert connector_records(connections) == [
+        {'Tipo': 'CCS (Type 2)', 'Corrente': 'DC', 'Potência (kW)': 150, 'Quantidade': 1},
+        {'Tipo': 'Other', 'Corrente': None, 'Potência (kW)': None, 'Quantidade': 2},
+    ]
+    assert connector_records(None) == []
+
+
+def test_round_trip_through_a_frame(station_records):
+    table = ConnectorTable.from_records(station_records)
+    again = ConnectorTable(table.to_frame())
+    ids = [record['ID'] for record in station_records]
+    np.testing.assert_array_equal(again.flags(ids), table.flags(ids))
+
+
+def test_empty_table():
+    table = ConnectorTable.from_records([{'ID': 1, CONNECTORS_KEY: []}])
+    assert table.flags([1, 2]).tolist() == [0, 0]
+    assert np.isnan(table.max_power([1])).all()
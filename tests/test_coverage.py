@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from connectors import connector_bits
+from coverage import (COVERAGE_BOUNDS, COVERAGE_COLUMNS, MAINLAND_OUTLINE, CoverageGrid, fast_charging_mask,
+                      hex_grid, inside_polygon, land_cells)
+from spatial_index import haversine_km
+
+
+# Function to test one point against a polygon, the textbook way (even-odd rule)
+def point_in_polygon(lat, lon, polygon):
+    inside = False
+    for (x1, y1), (x2, y2) in zip(polygon, polygon[1:] + polygon[:1]):
+        if (y1 > lat) != (y2 > lat) and lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+
+@pytest.fixture
+def stations():
+    rng = np.random.default_rng(25)
+    n = 400
+    return pd.DataFrame({
+        'Latitude': np.append(rng.uniform(37, 42, n), np.nan),
+        'Longitude': np.append(rng.uniform(-9.4, -6.3, n), -8.0),
+        'Potência por Ponto (kW)': np.append(rng.choice([3.7, 11, 22, 50, 150, np.nan], n), 150),
+        'Connector Flags': np.append(rng.choice([0, connector_bits(['DC ≥ 50 kW']), connector_bits(['Type 2'])], n),
+                                     0).astype(np.uint8),
+    })
+
+
+def test_inside_polygon_matches_a_loop():
+    rng = np.random.default_rng(3)
+    south, west, north, east = COVERAGE_BOUNDS
+    lats, lons = rng.uniform(south, north, 3000), rng.uniform(west, east, 3000)
+    inside = inside_polygon(lats, lons, MAINLAND_OUTLINE)
+    assert inside.tolist() == [point_in_polygon(lat, lon, MAINLAND_OUTLINE) for lat, lon in zip(lats, lons)]
+
+
+@pytest.mark.parametrize('lat, lon, expected', [
+    (38.72, -9.14, True),    # Lisboa
+    (41.15, -8.61, True),    # Porto
+    (40.2, -7.5, True),      # Serra da Estrela
+    (39.5, -9.8, False),     # Atlantic
+    (40.42, -3.70, False),   # Madrid
+    (38.5, -6.5, False),     # Badajoz side of the border
+])
+def test_inside_mainland(lat, lon, expected):
+    assert inside_polygon([lat], [lon], MAINLAND_OUTLINE)[0] == expected
+
+
+def test_hex_grid_spacing():
+    lat, lon = hex_grid((38.0, -9.0, 38.2, -8.8), radius_km=2.0)
+    # Neighbouring centres of cells of radius r are r * sqrt(3) apart
+    nearest = [np.partition(haversine_km(a, b, lat, lon), 1)[1] for a, b in zip(lat, lon)]
+    np.testing.assert_allclose(nearest, 2.0 * np.sqrt(3), rtol=0.01)
+
+
+def test_land_cells_are_inside_the_outline():
+    lat, lon = land_cells(radius_km=10.0)
+    grid_lat, grid_lon = hex_grid(COVERAGE_BOUNDS, 10.0)
+    assert len(lat) == inside_polygon(grid_lat, grid_lon, MAINLAND_OUTLINE).sum()
+    assert inside_polygon(lat, lon, MAINLAND_OUTLINE).all()
+
+
+def test_fast_charging_mask(stations):
+    fast = fast_charging_mask(stations)
+    expected = [(ppp >= 50) or bool(flags & connector_bits(['DC ≥ 50 kW']))
+                for ppp, flags in zip(stations['Potência por Ponto (kW)'], stations['Connector Flags'])]
+    assert fast.tolist() == expected
+    assert fast_charging_mask(stations.drop(columns='Connector Flags')).tolist() == \
+        (stations['Potência por Ponto (kW)'] >= 50).tolist()
+
+
+def test_distances_match_brute_force(stations):
+    grid = CoverageGrid.from_frame(stations, radius_km=10.0)
+    located = stations.dropna(subset=['Latitude', 'Longitude'])
+    fast = located[fast_charging_mask(located)]
+
+    for lat, lon, nearest, nearest_fast in zip(grid.lat, grid.lon, grid.nearest_km, grid.nearest_fast_km):
+        assert nearest == pytest.approx(haversine_km(lat, lon, located['Latitude'], located['Longitude']).min())
+        assert nearest_fast == pytest.approx(haversine_km(lat, lon, fast['Latitude'], fast['Longitude']).min())
+
+
+def test_share_beyond_and_frame(stations):
+    grid = CoverageGrid.from_frame(stations, radius_km=10.0)
+    assert grid.share_beyond(20) == pytest.approx(np.mean(grid.nearest_km > 20))
+    assert grid.share_beyond(20, fast=True) >= grid.share_beyond(20)
+    assert grid.to_frame().columns.tolist() == COVERAGE_COLUMNS
+
+
+def test_no_fast_stations_leaves_every_cell_beyond_reach(stations):
+    slow = stations.assign(**{'Potência por Ponto (kW)': 11.0, 'Connector Flags': np.uint8(0)})
+    grid = CoverageGrid.from_frame(slow, radius_km=10.0)
+    assert np.isinf(grid.nearest_fast_km).all()
+    assert grid.share_beyond(1000, fast=True) == 1.0
@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+
+import create_db
+
+
+def station(station_id, updated='2025-01-01 10:00:00', power=22.0):
+    return {
+        'ID': station_id, 'Nome': f'Posto {station_id}', 'Operador': 'EDP', 'Endereço': 'Rua A',
+        'Cidade': 'Lisboa', 'Código Postal': '1000-001', 'Latitude': 38.72, 'Longitude': -9.14,
+        'Número de Pontos': 2, 'Potência Total (kW)': power, 'Data Atualização': updated,
+    }
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'stations.db')
+    create_db.create_table(conn)
+    yield conn
+    conn.close()
+
+
+def test_reload_with_new_timestamps_changes_nothing(conn):
+    create_db.refresh_station_data(conn, [station(1), station(2)])
+    _, counts = create_db.refresh_station_data(conn, [station(1, '2025-02-01 10:00:00'),
+                                                      station(2, '2025-02-01 10:00:00')])
+
+    assert counts == {'inserido': 0, 'atualizado': 0, 'removido': 0, 'reposto': 0}
+    # The stored date stays the one of the last real change
+    assert {row[0] for row in conn.execute("SELECT data_atualizacao FROM stations")} == {'2025-01-01 10:00:00'}
+
+
+def test_reload_with_changed_content_updates_the_date(conn):
+    create_db.refresh_station_data(conn, [station(1), station(2)])
+    refresh_id, counts = create_db.refresh_station_data(conn, [station(1, '2025-02-01 10:00:00', power=50.0),
+                                                               station(2, '2025-02-01 10:00:00')])
+
+    assert counts['atualizado'] == 1
+    assert create_db.changes_since(conn, refresh_id - 1) == {1: 'atualizado'}
+    assert conn.execute("SELECT data_atualizacao FROM stations WHERE id = 1").fetchone()[0] == '2025-02-01 10:00:00'
+
+
+@pytest.mark.parametrize('loader', [create_db.insert_station_data, create_db.bulk_insert_station_data])
+def test_refresh_after_initial_load_changes_nothing(conn, loader):
+    loader(conn, [station(1), station(2)])
+    _, counts = create_db.refresh_station_data(conn, [station(1, '2025-02-01 10:00:00'),
+                                                      station(2, '2025-02-01 10:00:00')])
+
+    assert counts == {'inserido': 0, 'atualizado': 0, 'removido': 0, 'reposto': 0}
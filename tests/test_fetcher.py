@@ -0,0 +1,163 @@
+import json
+
+import pytest
+import requests
+
+import fetcher
+from fetcher import COUNTRY_BOUNDS, FetchError, iter_json_array, iter_pois, request_with_retry
+
+
+def chunked(text, size=7):
+    data = text.encode('utf-8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_items_split_across_chunks():
+    items = [{'ID': i, 'Title': 'Posto São João'} for i in range(20)]
+    assert list(iter_json_array(chunked(json.dumps(items)))) == items
+
+
+def test_empty_array():
+    assert list(iter_json_array([b' [ ] \n'])) == []
+
+
+@pytest.mark.parametrize('text', [
+    '[{"ID":1},{"ID":2},{"ID":3',     # cut inside an object
+    '[{"ID":1},{"ID":2}',             # cut before the closing bracket
+    '[{"ID":1},',                     # cut after a comma
+])
+def test_truncated_array_raises(text):
+    items = []
+    with pytest.raises(ValueError):
+        for item in iter_json_array(chunked(text)):
+            items.append(item)
+    assert len(items) <= 2
+
+
+@pytest.mark.parametrize('text', [
+    '[{"ID":1},{"ID":2} garbage',
+    '[{"ID":1},<html>error</html>]',
+    '[{"ID":1}{"ID":2}]',
+    '[{"ID":1}] trailing',
+    '<html>Bad gateway</html>',
+    '',
+])
+def test_garbage_raises(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunked(text)))
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200, headers=None):
+        self.body = body.encode('utf-8')
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'HTTP {self.status_code}')
+
+    def iter_content(self, size):
+        return [self.body[i:i + size] for i in range(0, len(self.body), size)]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    def __init__(self, bodies):
+        # Each body is the text of a 200 answer, or a FakeResponse
+        self.responses = [body if isinstance(body, FakeResponse) else FakeResponse(body) for body in bodies]
+
+    def get(self, url, **kwargs):
+        return self.responses.pop(0)
+
+
+def test_truncated_response_is_retried(monkeypatch):
+    session = FakeSession(['[{"ID":1},{"ID":2},{"ID":3', '[{"ID":1},{"ID":2},{"ID":3}]'])
+    monkeypatch.setattr(fetcher, '_session', lambda pool_size: session)
+    stats = {}
+
+    pois = request_with_retry('http://api', {}, stream=True, backoff_base=0, stats=stats)
+
+    assert [poi['ID'] for poi in pois] == [1, 2, 3]
+    assert stats['retries'] == 1
+
+
+def test_truncated_response_fails_after_the_retries(monkeypatch):
+    monkeypatch.setattr(fetcher, '_session', lambda pool_size: FakeSession(['[{"ID":1},{"ID"'] * 3))
+    with pytest.raises(FetchError):
+        request_with_retry('http://api', {}, stream=True, max_retries=2, backoff_base=0)
+
+
+def poi(poi_id, lat, lon):
+    return {'ID': poi_id, 'AddressInfo': {'Latitude': lat, 'Longitude': lon}}
+
+
+def test_every_poi_once_including_those_outside_the_country_box(monkeypatch):
+    south, west, north, east = COUNTRY_BOUNDS['PT']
+    inside = [poi(i, south + (north - south) * i / 40, west + (east - west) * (i % 7) / 6) for i in range(40)]
+    # Returned by every request, whatever the box: outside the country box, and without coordinates
+    stray = [poi(100, 50.0, -8.0), {'ID': 101, 'AddressInfo': {}}]
+
+    def fake_request(url, params, *args, **kwargs):
+        lat1, lon1, lat2, lon2 = map(float, params['boundingbox'].replace('(', '').replace(')', '').split(','))
+        found = [p for p in inside if lat1 <= p['AddressInfo']['Latitude'] <= lat2
+                 and lon1 <= p['AddressInfo']['Longitude'] <= lon2]
+        return (found + stray)[:params['maxresults']]
+
+    monkeypatch.setattr(fetcher, 'request_with_retry', fake_request)
+    stats = {}
+    ids = [p['ID'] for p in iter_pois(('PT',), page_size=12, workers=2, stats=stats)]
+
+    assert sorted(ids) == list(range(40)) + [100, 101]
+    assert stats['tiles_split'] > 0
+    assert stats['outside_bounds'] == 2
+
+
+def test_stream_mode_caps_the_tile_size(monkeypatch):
+    sizes = []
+
+    def fake_request(url, params, *args, **kwargs):
+        sizes.append(params['maxresults'])
+        return []
+
+    monkeypatch.setattr(fetcher, 'request_with_retry', fake_request)
+    list(iter_pois(('PT',), page_size=5000, stream=True))
+    list(iter_pois(('PT',), page_size=5000, stream=False))
+
+    assert sizes == [fetcher.STREAM_PAGE_SIZE, 5000]
+
+
+@pytest.mark.parametrize('retry_after, expected', [('3600', fetcher.MAX_RETRY_AFTER), ('2', 2.0)])
+def test_retry_after_is_clamped(monkeypatch, retry_after, expected):
+    session = FakeSession([FakeResponse('', 429, {'Retry-After': retry_after}), '[]'])
+    monkeypatch.setattr(fetcher, '_session', lambda pool_size: session)
+    delays = []
+    monkeypatch.setattr(fetcher.time, 'sleep', delays.append)
+
+    assert request_with_retry('http://api', {}, stream=True) == []
+    assert delays == [expected]
+
+
+def test_client_error_closes_the_streamed_response(monkeypatch):
+    response = FakeResponse('{"error": "forbidden"}', 403)
+    monkeypatch.setattr(fetcher, '_session', lambda pool_size: FakeSession([response]))
+
+    with pytest.raises(requests.HTTPError):
+        request_with_retry('http://api', {}, stream=True)
+    assert response.closed
+
+
+def test_fetch_pois_keeps_every_poi_without_an_id(monkeypatch):
+    pois = [poi(2, 38.7, -9.1), {'AddressInfo': {}}, poi(1, 38.8, -9.2), {'ID': None, 'AddressInfo': {}}]
+    monkeypatch.setattr(fetcher, 'iter_pois', lambda *args, **kwargs: iter(pois))
+
+    assert fetcher.fetch_pois() == [pois[2], pois[0], pois[1], pois[3]]
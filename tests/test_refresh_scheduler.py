@@ -0,0 +1,36 @@
+import pytest
+
+import get_charging_stations as stations
+from refresh_scheduler import RefreshError, RefreshScheduler, refresh
+
+
+@pytest.fixture
+def no_api_key(monkeypatch):
+    monkeypatch.setattr(stations, 'API_KEY', None)
+
+    def download(*args, **kwargs):
+        raise AssertionError("nothing should be downloaded without an API key")
+
+    monkeypatch.setattr(stations, 'fetch_updates', download)
+
+
+def test_refresh_fails_without_api_key(no_api_key):
+    with pytest.raises(RefreshError, match='OPENCHARGE_API_KEY'):
+        refresh()
+
+
+def test_scheduler_does_not_start_without_api_key(no_api_key):
+    scheduler = RefreshScheduler(3600).start(run_now=True)
+
+    assert scheduler._thread is None
+    assert 'OPENCHARGE_API_KEY' in scheduler.last_error
+
+
+def test_scheduler_with_own_refresh_needs_no_key(no_api_key):
+    scheduler = RefreshScheduler(3600, refresh_func=lambda: 'v1').start()
+    try:
+        assert scheduler._thread is not None
+        assert scheduler.run_once() == 'v1'
+        assert scheduler.last_error is None
+    finally:
+        scheduler.stop()
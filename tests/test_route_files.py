@@ -0,0 +1,54 @@
+import json
+
+import numpy as np
+import pytest
+
+from route_files import RouteFileError, read_route
+
+GPX = """<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">
+  <wpt lat="40.0" lon="-8.0"><name>Start</name></wpt>
+  {body}
+</gpx>"""
+
+
+def test_gpx_track_points():
+    body = '<trk><trkseg><trkpt lat="38.72" lon="-9.14"/><trkpt lat="41.15" lon="-8.61"/></trkseg></trk>'
+    lats, lons = read_route(GPX.format(body=body).encode('utf-8'), 'ride.gpx')
+    np.testing.assert_allclose(lats, [38.72, 41.15])
+    np.testing.assert_allclose(lons, [-9.14, -8.61])
+
+
+def test_gpx_route_points_when_there_is_no_track():
+    body = '<rte><rtept lat="38.72" lon="-9.14"/><rtept lat="39.0" lon="-9.0"/><rtept lat="41.15" lon="-8.61"/></rte>'
+    lats, _ = read_route(GPX.format(body=body), 'plan.xml')
+    np.testing.assert_allclose(lats, [38.72, 39.0, 41.15])
+
+
+def test_geojson_lines_are_joined_in_order():
+    collection = {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'properties': {}, 'geometry': {'type': 'Point', 'coordinates': [0, 0]}},
+        {'type': 'Feature', 'properties': {}, 'geometry': {
+            'type': 'MultiLineString', 'coordinates': [[[-9.14, 38.72, 10.0], [-9.0, 39.0]], [[-8.61, 41.15]]]}},
+    ]}
+    # With a byte order mark, as some editors save it
+    lats, lons = read_route(b'\xef\xbb\xbf' + json.dumps(collection).encode('utf-8'), 'route.geojson')
+    np.testing.assert_allclose(lats, [38.72, 39.0, 41.15])
+    np.testing.assert_allclose(lons, [-9.14, -9.0, -8.61])
+
+
+@pytest.mark.parametrize('data, name, message', [
+    ('<gpx><trk>', 'broken.gpx', 'Invalid GPX'),
+    (GPX.format(body='<trk><trkseg><trkpt lat="north" lon="-9.1"/></trkseg></trk>'), 'x.gpx', 'Invalid route'),
+    ('{"type": "LineString", "coordinates": [[-9.1, 38.7], ', 'cut.geojson', 'Invalid route'),
+    ('{"type": "LineString", "coordinates": [[-9.1], [-8.6]]}', 'short.geojson', 'Invalid route'),
+    (b'\xff\xfe not utf-8', 'binary.geojson', 'Invalid route'),
+    ('{"type": "LineString", "coordinates": [[-9.1, 38.7]]}', 'point.geojson', 'no line'),
+    ('{"type": "Polygon", "coordinates": [[[-9.1, 38.7], [-8.6, 41.1], [-8.0, 40.0]]]}', 'area.geojson', 'no line'),
+    ('[[-9.1, 38.7], [-8.6, 41.1]]', 'list.json', 'no line'),
+    (GPX.format(body=''), 'waypoint.gpx', 'no line'),
+    ('{"type": "LineString", "coordinates": [[38.7, -9.1], [41.1, -95.0]]}', 'swapped.geojson', 'outside'),
+])
+def test_read_route_errors(data, name, message):
+    with pytest.raises(RouteFileError, match=message):
+        read_route(data, name)
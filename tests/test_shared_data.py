@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from shared_data import freeze_frame
+from station_data import stations_from_records
+
+
+@pytest.fixture
+def frame():
+    records = [{'ID': i, 'Nome': f'Posto {i}', 'Operador': 'EDP', 'Endereço': 'Rua A', 'Cidade': 'Lisboa',
+                'Código Postal': '1000-001', 'Latitude': 38.7 + i / 100, 'Longitude': -9.1,
+                'Número de Pontos': 2, 'Potência Total (kW)': 22.0 * (i + 1),
+                'Data Atualização': '2025-01-01 10:00:00'} for i in range(5)]
+    return stations_from_records(records)
+
+
+@pytest.mark.parametrize('write', [
+    lambda df: df.iloc.__setitem__((0, 0), 99),
+    lambda df: df.loc.__setitem__((df.index[0], 'Latitude'), 0.0),
+    lambda df: df.loc.__setitem__((df.index[0], 'Nome'), 'Outro'),
+    lambda df: df.loc.__setitem__((df.index[0], 'Power Range'), '100+'),
+    lambda df: df['Potência Total (kW)'].to_numpy().__setitem__(0, 0.0),
+    lambda df: df['Connector Flags'].values.__setitem__(0, 1),
+])
+def test_writes_into_a_frozen_frame_raise(frame, write):
+    frozen = freeze_frame(frame)
+    with pytest.raises(ValueError, match='read-only'):
+        write(frozen)
+    pd.testing.assert_frame_equal(frozen, frame)
+
+
+def test_freezing_copies_nothing(frame):
+    frozen = freeze_frame(frame)
+    pd.testing.assert_frame_equal(frozen, frame)
+    assert np.shares_memory(frozen['Latitude'].to_numpy(), frame['Latitude'].to_numpy())
+    assert np.shares_memory(frozen['Cidade'].array.codes, frame['Cidade'].array.codes)
+
+
+def test_selections_of_a_frozen_frame_are_writable(frame):
+    selected = freeze_frame(frame)[frame['Potência Total (kW)'].to_numpy() > 50]
+    selected.iloc[0, 0] = 99
+    assert selected.iloc[0, 0] == 99
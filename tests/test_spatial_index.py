@@ -0,0 +1,152 @@
+import numpy as np
+import pytest
+
+from spatial_index import RouteSegmentIndex, StationSpatialIndex, haversine_km, simplify_line
+
+
+@pytest.fixture
+def stations():
+    rng = np.random.default_rng(7)
+    lat = np.concatenate([rng.uniform(36.9, 42.2, 2000), 38.72 + rng.normal(0, 0.01, 300)])
+    lon = np.concatenate([rng.uniform(-9.6, -6.1, 2000), -9.14 + rng.normal(0, 0.01, 300)])
+    return lat, lon
+
+
+QUERY_POINTS = [(38.72, -9.14), (41.15, -8.61), (37.02, -7.93), (42.5, -8.0), (39.5, -12.0)]
+
+
+def test_haversine_known_distance():
+    # Lisboa to Porto, about 274 km as the crow flies
+    assert haversine_km(38.7223, -9.1393, np.array([41.1579]), np.array([-8.6291]))[0] == pytest.approx(274, abs=2)
+
+
+@pytest.mark.parametrize('lat, lon', QUERY_POINTS)
+@pytest.mark.parametrize('radius_km', [0.5, 5, 40])
+def test_within_matches_brute_force(stations, lat, lon, radius_km):
+    index = StationSpatialIndex(*stations)
+    rows, dist = index.within(lat, lon, radius_km)
+
+    all_dist = haversine_km(lat, lon, *stations)
+    assert set(rows.tolist()) == set(np.flatnonzero(all_dist <= radius_km).tolist())
+    np.testing.assert_allclose(dist, all_dist[rows])
+    assert (np.diff(dist) >= 0).all()
+
+
+@pytest.mark.parametrize('lat, lon', QUERY_POINTS)
+@pytest.mark.parametrize('k', [1, 5, 50])
+def test_nearest_matches_brute_force(stations, lat, lon, k):
+    index = StationSpatialIndex(*stations)
+    rows, dist = index.nearest(lat, lon, k)
+
+    expected = np.sort(haversine_km(lat, lon, *stations))[:k]
+    np.testing.assert_allclose(dist, expected)
+    np.testing.assert_allclose(haversine_km(lat, lon, stations[0][rows], stations[1][rows]), dist)
+
+
+def test_nearest_with_a_restriction(stations):
+    index = StationSpatialIndex(*stations)
+    where = np.zeros(len(stations[0]), dtype=bool)
+    where[::97] = True
+    rows, dist = index.nearest(38.72, -9.14, 3, where=where)
+
+    assert where[rows].all()
+    expected = np.sort(haversine_km(38.72, -9.14, stations[0][where], stations[1][where]))[:3]
+    np.testing.assert_allclose(dist, expected)
+
+
+def test_nearest_returns_what_there_is(stations):
+    where = np.zeros(len(stations[0]), dtype=bool)
+    where[[3, 4]] = True
+    index = StationSpatialIndex(*stations)
+    assert len(index.nearest(38.72, -9.14, 5, where=where)[0]) == 2
+    assert len(index.nearest(38.72, -9.14, 5, where=np.zeros_like(where))[0]) == 0
+
+
+def test_nearest_each_matches_brute_force(stations):
+    index = StationSpatialIndex(*stations)
+    rng = np.random.default_rng(8)
+    lats, lons = rng.uniform(36.0, 43.0, 500), rng.uniform(-11.0, -5.0, 500)
+    found, dist = index.nearest_each(lats, lons, batch=64)
+
+    expected = np.array([haversine_km(lat, lon, *stations).min() for lat, lon in zip(lats, lons)])
+    np.testing.assert_allclose(dist, expected)
+    found_dist = [haversine_km(lat, lon, stations[0][row], stations[1][row]) for lat, lon, row in zip(lats, lons, found)]
+    np.testing.assert_allclose(found_dist, dist)
+
+
+def test_nearest_each_with_a_restriction_and_without_stations(stations):
+    index = StationSpatialIndex(*stations)
+    where = np.zeros(len(stations[0]), dtype=bool)
+    where[::250] = True
+    found, dist = index.nearest_each([38.72, 41.15], [-9.14, -8.61], where=where)
+
+    assert where[found].all()
+    expected = [haversine_km(lat, lon, stations[0][where], stations[1][where]).min()
+                for lat, lon in [(38.72, -9.14), (41.15, -8.61)]]
+    np.testing.assert_allclose(dist, expected)
+
+    found, dist = StationSpatialIndex([], []).nearest_each([38.72], [-9.14])
+    assert found.tolist() == [-1] and np.isinf(dist).all()
+    found, dist = index.nearest_each([38.72], [-9.14], where=np.zeros(len(stations[0]), dtype=bool))
+    assert found.tolist() == [-1] and np.isinf(dist).all()
+
+
+# Route from Lisboa to Porto with a detour inland, densified like a GPS track
+ROUTE = np.array([(38.72, -9.14), (39.23, -8.68), (39.60, -8.0), (40.21, -8.43), (41.15, -8.61)])
+
+
+def gps_track(points, per_segment=200):
+    t = np.linspace(0, 1, per_segment, endpoint=False)[:, None]
+    track = np.vstack([a + t * (b - a) for a, b in zip(points[:-1], points[1:])] + [points[-1:]])
+    return track[:, 0], track[:, 1]
+
+
+@pytest.mark.parametrize('width_km', [1, 5, 20])
+def test_along_route_matches_brute_force(stations, width_km):
+    route = RouteSegmentIndex(*gps_track(ROUTE), width_km)
+    rows, dist, along = StationSpatialIndex(*stations).along_route(route)
+
+    # Every station against every segment of the (simplified) route
+    lat, lon = stations
+    n_segments = len(route.length_km)
+    station = np.repeat(np.arange(len(lat)), n_segments)
+    segment = np.tile(np.arange(n_segments), len(lat))
+    all_dist, all_along = route.measure(lat[station], lon[station], segment)
+    all_dist, all_along = all_dist.reshape(len(lat), n_segments), all_along.reshape(len(lat), n_segments)
+    nearest = all_dist.argmin(axis=1)
+    best = all_dist[np.arange(len(lat)), nearest]
+    expected = np.flatnonzero(best <= width_km)
+
+    assert sorted(rows.tolist()) == expected.tolist()
+    np.testing.assert_allclose(dist, best[rows])
+    np.testing.assert_allclose(along, all_along[rows, nearest[rows]])
+    assert (np.diff(along) >= 0).all()
+
+
+def test_route_simplification_keeps_the_shape():
+    lats, lons = gps_track(ROUTE)
+    route = RouteSegmentIndex(lats, lons, 5)
+
+    assert len(route.lats) == len(ROUTE)
+    expected_km = sum(haversine_km(a[0], a[1], np.array([b[0]]), np.array([b[1]]))[0]
+                      for a, b in zip(ROUTE[:-1], ROUTE[1:]))
+    assert route.total_km == pytest.approx(expected_km, rel=0.01)
+    assert simplify_line(lats, lons, 0.01).sum() == len(ROUTE)
+
+
+def test_along_route_with_a_restriction(stations):
+    route = RouteSegmentIndex(*gps_track(ROUTE), 10)
+    index = StationSpatialIndex(*stations)
+    where = np.zeros(len(stations[0]), dtype=bool)
+    where[::5] = True
+
+    rows, _, _ = index.along_route(route, where=where)
+    all_rows, _, _ = index.along_route(route)
+    assert sorted(rows.tolist()) == sorted(set(all_rows.tolist()) & set(np.flatnonzero(where).tolist()))
+
+
+def test_route_errors(stations):
+    with pytest.raises(ValueError, match='two distinct points'):
+        RouteSegmentIndex([38.7, 38.7], [-9.1, -9.1], 5)
+    with pytest.raises(ValueError, match='same grid'):
+        StationSpatialIndex(*stations).along_route(RouteSegmentIndex(*gps_track(ROUTE), 5, cell_deg=0.1))
@@ -0,0 +1,45 @@
+import sqlite3
+
+import pytest
+
+from station_db import StationDatabase
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    # Schema of a database built before the connectors table and the canonical cities
+    path = tmp_path / 'stations.db'
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE stations (id INTEGER PRIMARY KEY, nome TEXT, cidade TEXT)')
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def test_schema_is_read_once_per_database_version(db_file, monkeypatch):
+    db = StationDatabase(db_file)
+    opened = []
+    connection = db.connection
+    monkeypatch.setattr(db, 'connection', lambda: opened.append(1) or connection())
+
+    for _ in range(3):
+        assert not db._has_connectors()
+        assert not db._cities_canonical()
+    assert len(opened) == 1
+    db.close()
+
+
+def test_schema_is_read_again_after_the_database_changes(db_file):
+    db = StationDatabase(db_file)
+    assert not db._has_connectors()
+    assert not db._cities_canonical()
+
+    conn = sqlite3.connect(db_file)
+    conn.execute('CREATE TABLE connectors (station_id INTEGER, tipo TEXT)')
+    conn.execute('ALTER TABLE stations ADD COLUMN cidade_original TEXT')
+    conn.commit()
+    conn.close()
+
+    assert db._has_connectors()
+    assert db._cities_canonical()
+    db.close()